@@ -0,0 +1,38 @@
+"""Measure the time of aggregating paragraphs of long clauses
+using `SentenceAggregator.synt_aggregation()` in the pairwise
+and in the bucketed mode.
+
+Each clause differs from the previous one in one complement
+so every pair of neighbours is compared (and most of them are combined).
+
+Usage: python benchmarks/aggregation.py [number of clauses]
+
+"""
+
+import sys
+import timeit
+
+from nlglib.aggregation import SentenceAggregator
+from nlglib.microplanning import *
+
+
+def get_clause(i, n_modifiers=8):
+    modifiers = [PP('near', NP('the', 'depot %d' % j)) for j in range(n_modifiers)]
+    return Clause(NP('the', 'truck'),
+                  VP('move', NP('the', 'crate %d' % i), postmodifiers=modifiers))
+
+
+def main(n=32, repeat=3):
+    aggregator = SentenceAggregator()
+    for bucketed in (False, True):
+        for size in (n // 4, n // 2, n):
+            clauses = [get_clause(i) for i in range(size)]
+            elapsed = min(timeit.repeat(
+                lambda: aggregator.synt_aggregation(clauses, bucketed=bucketed),
+                number=1, repeat=repeat))
+            print('%-8s %4d clauses: %.3fs (%.1fms per clause)'
+                  % ('bucketed' if bucketed else 'pairwise', size, elapsed, 1000 * elapsed / size))
+
+
+if __name__ == '__main__':
+    main(*[int(x) for x in sys.argv[1:2]])
@@ -0,0 +1,50 @@
+"""Measure the overhead of the instrumentation (`nlglib.metrics`).
+
+The script lexicalises, aggregates and realises a number of documents
+with the instrumentation disabled, recording into a `MemorySink` and
+recording the allocations as well, and prints the totals of the last run.
+
+Usage: python benchmarks/instrumentation.py [number of documents]
+
+"""
+
+import sys
+import timeit
+
+from nlglib import metrics
+from nlglib.aggregation import SentenceAggregator
+from nlglib.lexicalisation import Lexicaliser
+from nlglib.macroplanning import expr, formula_to_rst
+from nlglib.microplanning import *
+from nlglib.pipeline import Pipeline
+from nlglib.realisation.basic import Realiser
+
+
+templates = {
+    'Move': Clause(NP('the', Var(0)), VP('move', NP('the', Var(1)), PP('to', NP('the', Var(2))))),
+    'Happy': Clause(NP(Var(0)), VP('be', AdjP('happy'))),
+}
+
+
+def main(n=500, repeat=3):
+    pipeline = Pipeline(formula_to_rst, Lexicaliser(templates=templates),
+                        SentenceAggregator(), Realiser())
+    formulas = [expr('Move(truck%d, crate%d, depot) & Happy(driver%d)' % (i, i, i))
+                for i in range(n)]
+
+    def run():
+        for f in formulas:
+            pipeline(f)
+
+    baseline = min(timeit.repeat(run, number=1, repeat=repeat))
+    print('%-12s %.3fs' % ('disabled', baseline))
+    for name, allocations in (('enabled', False), ('allocations', True)):
+        with metrics.recording(allocations=allocations) as sink:
+            elapsed = min(timeit.repeat(run, number=1, repeat=repeat))
+        print('%-12s %.3fs (%+.1f%%)' % (name, elapsed, 100 * (elapsed / baseline - 1)))
+    print()
+    print(sink.report())
+
+
+if __name__ == '__main__':
+    main(*[int(x) for x in sys.argv[1:2]])
@@ -0,0 +1,44 @@
+"""Measure the time of decoding elements from JSON using `ElementDecoder`.
+
+The script decodes chains of nested prepositional phrases of increasing
+depth (the time should grow linearly with the depth) and a list of clauses.
+
+Usage: python benchmarks/json_decoding.py [largest depth]
+
+"""
+
+import json
+import sys
+import timeit
+
+from nlglib.microplanning import *
+
+
+def get_chain(depth):
+    e = Noun('depot')
+    for _ in range(depth):
+        e = PP('in', NP('the', 'box', e))
+    return e
+
+
+def get_clauses(n):
+    return ElementList([Clause(NP('the', 'truck %d' % i), VP('move', PP('to', NP('the', 'depot'))))
+                        for i in range(n)])
+
+
+def decode(s):
+    return json.loads(s, cls=ElementDecoder)
+
+
+def main(depth=80, repeat=3):
+    for d in (depth // 8, depth // 4, depth // 2, depth):
+        s = get_chain(d).to_json()
+        elapsed = min(timeit.repeat(lambda: decode(s), number=1, repeat=repeat))
+        print('chain of depth %4d: %7.1fms' % (d, 1000 * elapsed))
+    s = get_clauses(1000).to_json()
+    elapsed = min(timeit.repeat(lambda: decode(s), number=1, repeat=repeat))
+    print('1000 clauses:        %7.1fms' % (1000 * elapsed))
+
+
+if __name__ == '__main__':
+    main(*[int(x) for x in sys.argv[1:2]])
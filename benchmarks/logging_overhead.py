@@ -0,0 +1,53 @@
+"""Measure the throughput of the lexicalisation, aggregation and (basic)
+realisation pipeline at the default log level and with debug logging.
+
+Logging should not slow the pipeline down unless the messages
+are actually emitted. The debug messages only reach the `NullHandler`
+of the library so they are created but never formatted.
+
+Usage: python benchmarks/logging_overhead.py [number of documents]
+
+"""
+
+import logging
+import sys
+import timeit
+
+from nlglib.aggregation import SentenceAggregator
+from nlglib.lexicalisation import Lexicaliser
+from nlglib.macroplanning import Paragraph, expr, formula_to_rst
+from nlglib.microplanning import *
+from nlglib.realisation.basic import Realiser
+
+templates = {
+    'john': NNP(Male('John')),
+    'paul': NNP(Male('Paul')),
+    'guitar': Noun('guitar'),
+    'bass': Noun('bass guitar'),
+    'Play': Clause(NP(Var(0)), VP('play', NP(Var(1)))),
+}
+
+formulas = ['Play(john, guitar)', 'Play(paul, guitar)', 'Play(john, bass)', 'Play(paul, bass)']
+
+
+def run(n):
+    lexicalise = Lexicaliser(templates=templates)
+    aggregator = SentenceAggregator()
+    realise = Realiser()
+    for _ in range(n):
+        sentences = [lexicalise(formula_to_rst(expr(f))) for f in formulas]
+        realise(Paragraph(*aggregator.synt_aggregation(sentences)))
+
+
+def main(n=200, repeat=3):
+    logger = logging.getLogger('nlglib')
+    logger.propagate = False
+    for level in (logging.WARNING, logging.DEBUG):
+        logger.setLevel(level)
+        elapsed = min(timeit.repeat(lambda: run(n), number=1, repeat=repeat))
+        print('%-7s %d documents: %.3fs (%.0f documents per second)'
+              % (logging.getLevelName(level), n, elapsed, n / elapsed))
+
+
+if __name__ == '__main__':
+    main(*[int(x) for x in sys.argv[1:2]])
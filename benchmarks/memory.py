@@ -0,0 +1,41 @@
+"""Measure the memory used by element trees.
+
+The script builds a number of copies of a typical clause and prints
+the number of bytes allocated per tree and per element (node).
+
+Usage: python benchmarks/memory.py [number of trees]
+
+"""
+
+import gc
+import sys
+import tracemalloc
+
+from nlglib.microplanning import *
+
+
+def build():
+    return Clause(NP('the', 'big', 'red', 'truck'),
+                  VP('move', NP('the', 'heavy', 'crate'),
+                     PP('to', NP('the', 'old', 'depot')), PP('near', NP('the', 'river'))),
+                  postmodifiers=[AdvP('quickly'), PP('in', NP('the', 'morning'))])
+
+
+def main(n=1000):
+    build()  # intern the features and warm up the caches
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    trees = [build() for _ in range(n)]
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    stats = after.compare_to(before, 'filename')
+    size = sum(st.size_diff for st in stats) / n
+    blocks = sum(st.count_diff for st in stats) / n
+    nodes = sum(1 for _ in trees[0].elements(recursive=True, itself='first'))
+    print('%d trees of %d elements: %d bytes (%d blocks) per tree, %d bytes per element'
+          % (n, nodes, size, blocks, size / nodes))
+
+
+if __name__ == '__main__':
+    main(*[int(x) for x in sys.argv[1:2]])
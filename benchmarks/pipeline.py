@@ -0,0 +1,56 @@
+"""Measure the throughput of generating documents from formulas
+by a `Pipeline` run in this process, in threads and in processes.
+
+Each input is a conjunction of a few predicates that goes through
+`formula_to_rst`, `Lexicaliser`, `SentenceAggregator` and the basic `Realiser`.
+The processes use all cores of the machine (the speed-up therefore
+depends on their number).
+
+Usage: python benchmarks/pipeline.py [number of documents]
+
+"""
+
+import os
+import sys
+import time
+
+from nlglib.aggregation import SentenceAggregator
+from nlglib.lexicalisation import Lexicaliser
+from nlglib.macroplanning import expr, formula_to_rst
+from nlglib.microplanning import *
+from nlglib.pipeline import Pipeline
+from nlglib.realisation.basic import Realiser
+
+
+templates = {
+    'Move': Clause(NP('the', Var(0)), VP('move', NP('the', Var(1)), PP('to', NP('the', Var(2))))),
+    'Happy': Clause(NP(Var(0)), VP('be', AdjP('happy'))),
+}
+
+
+def get_formulas(n):
+    return [expr('Move(truck%d, crate%d, depot) & Move(van, crate%d, depot) & Happy(driver%d)'
+                 % (i, i, i + 1, i)) for i in range(n)]
+
+
+def main(n=2000):
+    pipeline = Pipeline(formula_to_rst, Lexicaliser(templates=templates),
+                        SentenceAggregator(), Realiser())
+    formulas = get_formulas(n)
+    workers = os.cpu_count()
+    for executor, chunksize, ordered in ((None, 1, True),
+                                         ('thread', 50, True),
+                                         ('process', 1, True),
+                                         ('process', 50, True),
+                                         ('process', 50, False)):
+        start = time.perf_counter()
+        errors = sum(1 for r in pipeline.run(formulas, executor=executor, chunksize=chunksize,
+                                             ordered=ordered) if r.error)
+        elapsed = time.perf_counter() - start
+        print('%-8s workers %2d  chunks %3d  %-9s %6.2fs  %7.0f documents/s  errors %d'
+              % (executor or 'serial', 1 if executor is None else workers, chunksize,
+                 'ordered' if ordered else 'unordered', elapsed, n / elapsed, errors))
+
+
+if __name__ == '__main__':
+    main(*[int(x) for x in sys.argv[1:2]])
@@ -0,0 +1,49 @@
+"""Compare the binary codec (`nlglib.codec`) with pickle and JSON.
+
+The script encodes and decodes a list of lexicalised clauses and prints
+the size of the payload and the time of encoding and decoding.
+
+Usage: python benchmarks/serialisation.py [number of clauses]
+
+"""
+
+import json
+import pickle
+import sys
+import timeit
+
+from nlglib import codec
+from nlglib.microplanning import *
+
+
+def get_clause(i):
+    return Clause(
+        NP('the', 'big', 'truck %d' % i, features={'NUMBER': 'plural'}),
+        VP('move', NP('the', 'heavy', 'crate'), PP('to', NP('the', 'old', 'depot')),
+           features={'TENSE': 'past'}),
+        front_modifiers=['yesterday'],
+        postmodifiers=[Adverb('quickly'), PP('in', NP('the', 'morning'))],
+    )
+
+
+FORMATS = (
+    ('codec', codec.dumps, codec.loads),
+    ('pickle', lambda x: pickle.dumps(x, pickle.HIGHEST_PROTOCOL), pickle.loads),
+    ('json', lambda x: json.dumps(x, cls=ElementEncoder),
+     lambda s: json.loads(s, cls=ElementDecoder)),
+)
+
+
+def main(n=1000, repeat=3):
+    clauses = [get_clause(i) for i in range(n)]
+    for name, dumps, loads in FORMATS:
+        payload = dumps(clauses)
+        assert loads(payload) == clauses
+        encoding = min(timeit.repeat(lambda: dumps(clauses), number=1, repeat=repeat))
+        decoding = min(timeit.repeat(lambda: loads(payload), number=1, repeat=repeat))
+        print('%-6s %9d bytes (%4d per clause)  encode %7.1fms  decode %7.1fms'
+              % (name, len(payload), len(payload) / n, 1000 * encoding, 1000 * decoding))
+
+
+if __name__ == '__main__':
+    main(*[int(x) for x in sys.argv[1:2]])
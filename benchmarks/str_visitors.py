@@ -0,0 +1,48 @@
+"""Measure the time of converting long coordinations and large documents
+to strings using `SimpleStrVisitor` (used by `str(element)`) and `StrVisitor`.
+
+The time should grow linearly with the size of the input;
+the script prints the time per thousand leaves for increasing sizes.
+
+Usage: python benchmarks/str_visitors.py [largest number of coordinates]
+
+"""
+
+import sys
+import timeit
+
+from nlglib.microplanning import *
+
+
+def get_coordination(n):
+    return Coordination(*[NP('the', 'truck %d' % i) for i in range(n)], conj='and')
+
+
+def get_document(n):
+    return ElementList([Clause(NP('the', 'truck %d' % i), VP('move', PP('to', NP('the', 'depot'))))
+                        for i in range(n)])
+
+
+def visit(element, visitor_class):
+    v = visitor_class()
+    for e in (element if isinstance(element, ElementList) else [element]):
+        e.accept(v)
+    return str(v)
+
+
+def main(n=16000, repeat=3):
+    sizes = [n // 8, n // 4, n // 2, n]
+    for name, factory in (('coordination', get_coordination), ('document', get_document)):
+        for visitor_class in (SimpleStrVisitor, StrVisitor):
+            for size in sizes:
+                element = factory(size)
+                leaves = sum(1 for e in element.elements(recursive=True)
+                             if isinstance(e, (Word, String)))
+                elapsed = min(timeit.repeat(lambda: visit(element, visitor_class),
+                                            number=1, repeat=repeat))
+                print('%-12s %-16s %6d leaves: %.3fs (%.1fms per 1000 leaves)'
+                      % (name, visitor_class.__name__, leaves, elapsed, 1000 * 1000 * elapsed / leaves))
+
+
+if __name__ == '__main__':
+    main(*[int(x) for x in sys.argv[1:2]])
@@ -0,0 +1,83 @@
+"""Compare loading templates from a pickled dict and from a `TemplateLibrary`.
+
+The script saves a number of templates, loads them the way a worker process
+would and looks up a few of them. It prints the time of loading
+and lookups and the memory allocated by the process (the memory of a
+memory-mapped file is not included as it is shared by all processes).
+
+Usage: python benchmarks/templates.py [number of templates]
+
+"""
+
+import os
+import pickle
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from nlglib.lexicalisation import TemplateLibrary
+from nlglib.microplanning import *
+
+
+def get_templates(n):
+    return {
+        'msg%d' % i: Clause(NP('the', 'big', 'truck %d' % i), VP('move', Var('arg_object'),
+                            PP('to', NP('the', Var('arg_place')))),
+                            postmodifiers=[PP('in', NP('the', 'morning'))])
+        for i in range(n)
+    }
+
+
+def measure(name, load, keys):
+    start = time.perf_counter()
+    templates = load()
+    loaded = time.perf_counter()
+    for key in keys:
+        templates[key].clone()
+    end = time.perf_counter()
+    close(templates)
+    tracemalloc.start()
+    templates = load()
+    for key in keys:
+        templates[key].clone()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    close(templates)
+    print('%-16s load %7.1fms  %d lookups %6.1fms  memory %8.1fkB'
+          % (name, 1000 * (loaded - start), len(keys), 1000 * (end - loaded), size / 1024))
+
+
+def close(templates):
+    if isinstance(templates, TemplateLibrary):
+        templates.close()
+
+
+def main(n=5000):
+    templates = get_templates(n)
+    keys = ['msg%d' % i for i in range(0, n, n // 10)]
+    fd, pickled = tempfile.mkstemp()
+    os.close(fd)
+    fd, library = tempfile.mkstemp()
+    os.close(fd)
+    try:
+        with open(pickled, 'wb') as f:
+            pickle.dump(templates, f, pickle.HIGHEST_PROTOCOL)
+        TemplateLibrary(templates).save(library)
+        print('%d templates: pickle %dkB, library %dkB'
+              % (n, os.path.getsize(pickled) / 1024, os.path.getsize(library) / 1024))
+
+        def load_pickle():
+            with open(pickled, 'rb') as f:
+                return pickle.load(f)
+
+        measure('pickled dict', load_pickle, keys)
+        measure('library', lambda: TemplateLibrary.load(library), keys)
+        measure('library (mmap)', lambda: TemplateLibrary.load(library, mmap=True), keys)
+    finally:
+        os.remove(pickled)
+        os.remove(library)
+
+
+if __name__ == '__main__':
+    main(*[int(x) for x in sys.argv[1:2]])
@@ -0,0 +1,60 @@
+"""Measure the time of converting a large document to SimpleNLG XML
+with and without the memoised feature-to-attribute encoder.
+
+Usage: python benchmarks/xml_serialisation.py [number of sentences]
+
+"""
+
+import sys
+import timeit
+
+from nlglib.features import TENSE, NUMBER, ASPECT
+from nlglib.microplanning import *
+from nlglib.microplanning import visitors
+
+
+def get_document(n):
+    sentences = []
+    for i in range(n):
+        sentences.append(Clause(
+            NP('the', 'truck %d' % i, features={NUMBER.plural}),
+            VP('move', PP('to', NP('the', 'depot')), features={TENSE.past, ASPECT.progressive})
+        ))
+        sentences.append(Coordination(
+            Clause(NNP('John'), VP('be', AdjP('happy'))),
+            Clause(NNP('Paul'), VP('play', NP('a', 'guitar'))),
+            conj='and'
+        ))
+    return ElementList(sentences)
+
+
+def serialise(document):
+    v = XmlVisitor(compact=True)
+    for sentence in document:
+        sentence.accept(v)
+    return v.xml
+
+
+def uncached(cat, features, feature_map):
+    return visitors.encode_xml_attributes(cat, features, feature_map)
+
+
+def main(n=2000, repeat=5):
+    document = get_document(n)
+    encoder = visitors.xml_attribute_encoder
+    try:
+        visitors.xml_attribute_encoder = uncached
+        before = min(timeit.repeat(lambda: serialise(document), number=1, repeat=repeat))
+        expected = serialise(document)
+    finally:
+        visitors.xml_attribute_encoder = encoder
+    after = min(timeit.repeat(lambda: serialise(document), number=1, repeat=repeat))
+    assert expected == serialise(document)
+    print('sentences: %d, XML size: %d characters' % (2 * n, len(expected)))
+    print('uncached attributes: %.3fs' % before)
+    print('memoised attributes: %.3fs (%.1fx, %d cached attribute strings)'
+          % (after, before / after, len(encoder)))
+
+
+if __name__ == '__main__':
+    main(*[int(x) for x in sys.argv[1:2]])
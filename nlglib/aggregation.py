@@ -6,9 +6,10 @@ put together to create 'Roman is programming and singing.'
 """
 
 import logging
-from copy import deepcopy
+from copy import copy, deepcopy
 
-from nlglib.features import NUMBER, category
+from nlglib import metrics
+from nlglib.features import NUMBER, NON_COMPARABLE_FEATURES, category
 from nlglib.macroplanning import Document, Paragraph
 from nlglib.microplanning import *
 
@@ -45,7 +46,7 @@ class SentenceAggregator:
 
         """
         cat = msg.category if hasattr(msg, 'category') else type(msg).__name__
-        self.logger.debug('Aggregating {0}: {1}'.format(cat, repr(msg)))
+        self.logger.debug('Aggregating %s: %r', cat, msg)
 
         if msg is None:
             return None
@@ -57,11 +58,13 @@ class SentenceAggregator:
         attribute = cat.lower()
         if hasattr(self, attribute):
             fn = getattr(self, attribute)
-            return fn(msg, **kwargs)
         elif isinstance(msg, (list, set, tuple)):
-            return self.element_list(msg, **kwargs)
+            fn = self.element_list
         else:
             return msg
+        if metrics.sink is not None:
+            return metrics.call(type(self).__name__ + '.' + fn.__name__, fn, msg, **kwargs)
+        return fn(msg, **kwargs)
 
     def document(self, doc, **kwargs):
         """ Perform aggregation on a document - possibly before lexicalisation. """
@@ -83,14 +86,14 @@ class SentenceAggregator:
         elements = []
         if len(element) > 1:
             elements = self.synt_aggregation([self.aggregate(x, **kwargs) for x in element],
-                                             marker=marker)
+                                             marker=marker, **kwargs)
         elif len(element) == 1:
             elements.append(self.aggregate(element[0]))
         return elements
 
     def clause(self, clause, **kwargs):
         """Check if clause contains a coordinated element and if so, aggregate. """
-        self.logger.debug('Aggregating a clause:\n' + repr(clause))
+        self.logger.debug('Aggregating a clause:\n%r', clause)
         subj = self.aggregate(clause.subject, **kwargs)
         obj = self.aggregate(clause.complements, **kwargs)
         vp = self.aggregate(clause.predicate, **kwargs)
@@ -98,8 +101,8 @@ class SentenceAggregator:
         c = deepcopy(clause)
         c.subject = subj
         c.predicate = vp
-        c.complements = obj
-        self.logger.debug('...result:\n' + repr(c))
+        c.complements = ElementList(obj)
+        self.logger.debug('...result:\n%r', c)
         return c
 
     def coordination(self, cc, **kwargs):
@@ -151,34 +154,58 @@ class SentenceAggregator:
         """ Attempt to combine two elements into one by replacing the differing
         elements by a conjunction.
 
+        The elements are combined if they are equal except for one constituent
+        (as returned by `sentence_iterator()`) at the same position.
+        The combined element is created only after a match is found.
+
         """
         del kwargs  # unused for now
 
         if sent1 is None or sent2 is None:
             return None
 
-        replacement = Var("REPLACEMENT", "REPLACEMENT")
+        # The trees are compared with the replaced constituents masked out
+        # instead of comparing copies where the constituents were replaced.
+        # Only the constituents at the same position can be masked out
+        # in both trees so each candidate from `sent1` is tried with the first
+        # candidate from `sent2` at the position of the replacement.
+        paths1 = replacement_paths(sent1)
+        paths2 = replacement_paths(sent2)
+        candidates = {}
+        for e2 in sentence_iterator(sent2):
+            candidates.setdefault(paths2.get(e2), e2)
+
         for e1 in sentence_iterator(sent1):
-            s1 = deepcopy(sent1)
-            s1.replace(e1, replacement)  # replace one element
-
-            for e2 in sentence_iterator(sent2):
-                s2 = deepcopy(sent2)
-                s2.replace(e2, replacement)  # replace one element
-
-                if s1 == s2:
-                    self.logger.debug('Aggregating:\n\t%s\n\t%s' % (str(s1), str(s2)))
-                    cc = self.add_elements(e1, e2, conj=marker)
-                    s1.replace(replacement, cc)
-                    self.logger.debug('Result of aggregation:\n%s' % repr(s1))
-                    return s1
+            path = paths1.get(e1)
+            if path not in candidates:
+                continue
+            if path is None:
+                # nothing is replaced so the sentences have to be equal
+                if sent1 != sent2:
+                    continue
+            elif not equal_except(sent1, sent2, path):
+                continue
+            e2 = candidates[path]
+            self.logger.debug('Aggregating:\n\t%s\n\t%s', sent1, sent2)
+            cc = self.add_elements(e1, e2, conj=marker)
+            rv = deepcopy(sent1)
+            if path:
+                rv.replace_at(path, cc)
+            self.logger.debug('Result of aggregation:\n%r', rv)
+            return rv
         return None
 
-    def synt_aggregation(self, elements, max=3, marker='and', **kwargs):
+    def synt_aggregation(self, elements, max=3, marker='and', bucketed=False, window=1,
+                         **kwargs):
         """ Take a list of elements and combine elements that are synt. similar.
 
         elements - a list of elements to combine
         max      - a maximum number of elements to aggregate
+        bucketed - bucket the elements by their skeleton signatures
+                   (see `skeleton_signature()`) instead of trying to combine
+                   each pair of adjacent elements
+        window   - in the bucketed mode, an element can be combined with any
+                   of the preceding `window` elements (None for no limit)
 
         The algorithm relies on shared structure of the elements. If, for
         example, two elements share the subject, combine the VPs into
@@ -187,7 +214,7 @@ class SentenceAggregator:
         """
         if elements is None: return
         if len(elements) < 2: return elements
-        self.logger.debug('performing synt. aggr on:\n' + repr(elements))
+        self.logger.debug('performing synt. aggr on:\n%r', elements)
         aggregated = []
         # first try partial syntax aggregation  (e.g., clause + adj, etc)
         # assume format [clause, mod, mod, clause, clause, mod, clause, mod, mod...]
@@ -210,25 +237,91 @@ class SentenceAggregator:
             i += 1
         if len(new_elements) < 2:
             return new_elements
-        i = 0
-        while i < len(new_elements):
-            msg, increment = self._do_aggregate(new_elements, i, max, marker, **kwargs)
+        if bucketed:
+            aggregated = self._aggregate_in_buckets(new_elements, max, marker, window)
+        else:
+            i = 0
+            while i < len(new_elements):
+                msg, increment = self._do_aggregate(new_elements, i, max, marker, **kwargs)
+                aggregated.append(msg)
+                i += increment
+        for msg in aggregated:
             if isinstance(msg, Clause):
                 if ('PROPER', 'true') in msg.subject.features:
                     msg.predicate['NUMBER'] = 'SINGULAR'
-            aggregated.append(msg)
-            i += increment
+        return aggregated
+
+    def _aggregate_in_buckets(self, elements, max, marker='and', window=1):
+        """Combine the elements in one pass by looking up the preceding
+        elements with the same skeleton signature.
 
+        Each element is combined with the nearest preceding element
+        (or a result of previous aggregation) within `window` that differs
+        from it only in one constituent.
+
+        """
+        aggregated = []
+        buckets = {}
+        for j, e in enumerate(elements):
+            signatures = self._skeleton_signatures(e, max)
+            group = None
+            for path, signature in signatures:
+                for g in reversed(buckets.get(signature, ())):
+                    if window is not None and j - g.last > window:
+                        continue
+                    if equal_except(g.element, e, path):
+                        group = g
+                        break
+                if group is not None:
+                    break
+            if group is None:
+                group = _Group(len(aggregated), e)
+                aggregated.append(e)
+            else:
+                self.logger.debug('Aggregating:\n\t%s\n\t%s', group.element, e)
+                cc = self.add_elements(constituent_at(group.element, path),
+                                       constituent_at(e, path), conj=marker)
+                if not group.aggregated:
+                    group.element = deepcopy(group.element)
+                    group.aggregated = True
+                group.element.replace_at(path, cc)
+                aggregated[group.position] = group.element
+                # the signatures of the combined element have changed
+                for _, signature in group.signatures:
+                    buckets[signature].remove(group)
+                signatures = self._skeleton_signatures(group.element, max)
+            group.last = j
+            group.signatures = signatures
+            for _, signature in signatures:
+                buckets.setdefault(signature, []).append(group)
         return aggregated
 
+    def _skeleton_signatures(self, element, max):
+        """Return a list of (path, signature) pairs for the constituents
+        of `element` that could be replaced by aggregation
+        or an empty list if `element` cannot be aggregated.
+
+        """
+        if element is None or not self._can_aggregate(element, max):
+            return []
+        paths = replacement_paths(element)
+        rv = []
+        for part in sentence_iterator(element):
+            path = paths.get(part)
+            if path is not None and all(path != p for p, _ in rv):
+                rv.append((path, skeleton_signature(element, path)))
+        return rv
+
     def _do_aggregate(self, elements, i, max, marker='and', **kwargs):
         del kwargs  # unused for now
 
         lhs = elements[i]
         j = i + 1
         increment = 1
+        log_lhs = self.logger.isEnabledFor(logging.DEBUG)
         while j < len(elements) and self._can_aggregate(lhs, max):
-            self.logger.debug('LHS = %s' % lhs)
+            if log_lhs:
+                self.logger.debug('LHS = %s', lhs)
             rhs = elements[j]
             if self._can_aggregate(rhs, max):
                 tmp = self.try_to_aggregate(lhs, rhs, marker)
@@ -267,6 +360,208 @@ class SentenceAggregator:
         return elements[j] is None
 
 
+class _Group:
+    """An element in `SentenceAggregator._aggregate_in_buckets()`
+    that other elements can be combined with.
+
+    """
+
+    def __init__(self, position, element):
+        self.position = position
+        self.element = element
+        self.aggregated = False
+        self.last = None
+        self.signatures = []
+
+
+def replacement_path(element, one):
+    """Return the path (see `Element.argument_paths()`) of the constituent
+    that `element.replace(one, ...)` would replace or None if there is none.
+
+    """
+    for field, index, o in _replacement_slots(element):
+        if o == one:
+            return ((field, index),)
+        rv = replacement_path(o, one)
+        if rv is not None:
+            return ((field, index),) + rv
+    return None
+
+
+def replacement_paths(element):
+    """Return a dict mapping the constituents of `element` to their paths
+    as returned by `replacement_path()`.
+
+    The paths of all constituents are collected in one walk.
+
+    """
+    rv = {}
+    # the constituents are visited in pre-order as in `replacement_path()`
+    stack = [(((field, index),), o) for field, index, o in _replacement_slots(element)]
+    stack.reverse()
+    while stack:
+        path, node = stack.pop()
+        rv.setdefault(node, path)
+        stack.extend(reversed([(path + ((field, index),), o)
+                               for field, index, o in _replacement_slots(node)]))
+    return rv
+
+
+def _replacement_slots(element):
+    """Yield the (field, index, constituent) triples of `element`
+    in the order in which `replace()` searches them.
+
+    """
+    if isinstance(element, Coordination):
+        for i, o in enumerate(element._coords):
+            yield '_coords', i, o
+        return
+    if not isinstance(element, Phrase):
+        return
+    if isinstance(element, Clause):
+        yield '_subject', None, _field(element, '_subject')
+        yield '_predicate', None, element._predicate
+    elif isinstance(element, NounPhrase):
+        yield '_spec', None, element._spec
+    for i, o in enumerate(element._premodifiers):
+        yield '_premodifiers', i, o
+    if not isinstance(element, Clause):
+        yield '_head', None, element._head
+    for i, o in enumerate(element._complements):
+        yield '_complements', i, o
+    for i, o in enumerate(element._postmodifiers):
+        yield '_postmodifiers', i, o
+
+
+def _field(element, field):
+    """Return the value of `field` of `element` as in a deep copy of `element`."""
+    value = getattr(element, field)
+    if field == '_subject' and value.category == category.ELEMENT:
+        # a deep copy of a clause raises an empty subject to a noun phrase
+        return raise_to_np(copy(value))
+    return value
+
+
+def _compared_fields(element):
+    """Return the constituent fields of `element` compared by `__eq__`."""
+    if isinstance(element, Clause):
+        return ('_front_modifiers', '_premodifiers', '_subject', '_predicate',
+                '_complements', '_postmodifiers')
+    if isinstance(element, NounPhrase):
+        return '_premodifiers', '_head', '_complements', '_postmodifiers', '_spec'
+    if isinstance(element, Phrase):
+        return '_premodifiers', '_head', '_complements', '_postmodifiers'
+    if isinstance(element, Coordination):
+        return '_conj', '_coords'
+    return ()
+
+
+def _comparable_features(element, excluded):
+    return {f for f in element.features if f.name not in excluded}
+
+
+def equal_except(lhs, rhs, path):
+    """Return True if `lhs` and `rhs` would be equal if the constituents
+    at `path` in both of them were replaced by the same element.
+
+    This is equivalent to replacing the constituents in copies of the elements
+    and comparing the copies but nothing is copied. The constituents
+    outside of the path are compared by `==`.
+
+    """
+    excluded = {f.name for f in NON_COMPARABLE_FEATURES}
+    for field, index in path:
+        if lhs.id != rhs.id or lhs.category != rhs.category:
+            return False
+        fields = _compared_fields(lhs)
+        if fields != _compared_fields(rhs):
+            return False
+        lhs_child = _field(lhs, field)
+        rhs_child = _field(rhs, field)
+        if index is not None:
+            if len(lhs_child) != len(rhs_child):
+                return False
+            lhs_child = lhs_child[index]
+            rhs_child = rhs_child[index]
+        if field == '_head':
+            # replacing the head removes its features from the phrase
+            lhs_features = _comparable_features(
+                lhs, excluded.union(lhs_child.features.keys()))
+            rhs_features = _comparable_features(
+                rhs, excluded.union(rhs_child.features.keys()))
+        else:
+            lhs_features = _comparable_features(lhs, excluded)
+            rhs_features = _comparable_features(rhs, excluded)
+        if lhs_features != rhs_features:
+            return False
+        for f in fields:
+            if f != field:
+                if _field(lhs, f) != _field(rhs, f):
+                    return False
+            elif index is not None:
+                lhs_list = getattr(lhs, f)
+                rhs_list = getattr(rhs, f)
+                if any(x != y for i, (x, y) in enumerate(zip(lhs_list, rhs_list)) if i != index):
+                    return False
+        lhs, rhs = lhs_child, rhs_child
+    return True
+
+
+def constituent_at(element, path):
+    """Return the constituent at `path` in `element`
+    (see `replacement_path()`).
+
+    """
+    for field, index in path:
+        element = _field(element, field)
+        if index is not None:
+            element = element[index]
+    return element
+
+
+def _features_signature(features):
+    try:
+        return hash(frozenset((f.name, f.value) for f in features))
+    except TypeError:  # some feature values are not hashable
+        return hash(frozenset(f.name for f in features))
+
+
+def skeleton_signature(element, path):
+    """Return a hash of `element` with the constituent at `path` left out.
+
+    If `equal_except(lhs, rhs, path)` is True, `lhs` and `rhs` have
+    the same signature so the signatures can be used for finding
+    the candidates for aggregation without comparing each pair.
+
+    """
+    excluded = {f.name for f in NON_COMPARABLE_FEATURES}
+    parts = []
+    for field, index in path:
+        child = _field(element, field)
+        length = None
+        if index is not None:
+            length = len(child)
+            child = child[index]
+        if field == '_head':
+            features = _comparable_features(element, excluded.union(child.features.keys()))
+        else:
+            features = _comparable_features(element, excluded)
+        others = []
+        for f in _compared_fields(element):
+            if f != field:
+                value = _field(element, f)
+                if isinstance(value, ElementList):
+                    others.append(tuple(map(hash, value)))
+                else:
+                    others.append(hash(value))
+            elif index is not None:
+                others.extend(hash(x) for i, x in enumerate(getattr(element, f)) if i != index)
+        parts.append((element.category, element.id, field, index, length,
+                      _features_signature(features), tuple(others)))
+        element = child
+    return hash(tuple(parts))
+
+
 class DifficultyEstimator:
     """Most basic difficulty estimator that returns 0 for any structure,
     resulting in always aggregating syntax trees if possible.
@@ -0,0 +1,589 @@
+"""This module contains a compact binary serialisation of element trees.
+
+The codec covers the elements (`Element`, `ElementList`, `Coordination`,
+phrases and clauses), feature sets and the macroplanning structures
+(`Document`, `Paragraph`, `RhetRel` and `MsgSpec`) as well as the plain
+Python values they contain (None, booleans, numbers, strings, bytes,
+lists, tuples and dicts). It is meant for passing trees between processes:
+the payload is much smaller than JSON or pickle and it is faster to produce
+and to read.
+
+Example:
+
+    data = codec.dumps(document)
+    document = codec.loads(data)
+
+The payload starts with `MAGIC` and the version of the format (`VERSION`)
+followed by a single value. Each value starts with a one-byte tag:
+
+* classes from the library have fixed tags (see `_TYPES`); other
+  subclasses of the supported classes are written by module and name
+  once and get the next free tag,
+* each string is written once; its further occurrences refer to it
+  by its position in the table of strings,
+* features are interned the same way, so a feature set is a list
+  of small integers,
+* an object (element, list of elements or macroplanning structure)
+  that occurs more than once is written once and its other occurrences
+  are back-references, so decoding preserves shared subtrees (including
+  the constituents shared by copy-on-write clones).
+
+Neither the parents nor the cached hashes are written; the decoder sets
+the parents while it reads the tree (in a single pass) and the hashes
+are computed on demand. The encoder reads the fields of the elements
+directly so it neither modifies the tree nor gives clones private copies
+of their constituents. Both the encoder and the decoder use an explicit
+stack so the depth of the tree is not limited by the recursion limit.
+
+Decoding imports the modules of the classes named in the payload
+so only decode data from trusted sources.
+
+"""
+
+import importlib
+import struct
+
+from nlglib.features import Feature, FeatureSet
+from nlglib.microplanning.struct import (
+    Element, ElementList, Var, String, Word, Coordination, Phrase, NounPhrase,
+    VerbPhrase, PrepositionPhrase, AdjectivePhrase, AdverbPhrase, Clause,
+    _NO_ELEMENTS, _slot_names,
+)
+from nlglib.macroplanning.struct import (
+    Document, Paragraph, RhetRel, MsgSpec, StringMsg, PredicateMsg,
+)
+
+__all__ = ['dumps', 'loads', 'dump', 'load', 'Encoder', 'Decoder', 'DecodeError',
+           'MAGIC', 'VERSION']
+
+MAGIC = b'NLG'
+VERSION = 1
+
+# tags of values
+_NONE = 0
+_TRUE = 1
+_FALSE = 2
+_INT = 3
+_FLOAT = 4
+_STR = 5
+_STR_REF = 6
+_BYTES = 7
+_LIST = 8
+_TUPLE = 9
+_DICT = 10
+_FEATURE = 11
+_FEATURES = 12
+_REF = 13
+_CLASS = 14
+_EMPTY_ELEMENTS = 15
+_UNSET = 16
+# the tag of the first class in `_TYPES`
+_TYPE_BASE = 32
+
+# the classes with fixed tags; new classes can only be appended
+# (changing the order requires a new version of the format)
+_TYPES = (
+    Element, ElementList, Var, String, Word, Coordination, Phrase, NounPhrase,
+    VerbPhrase, PrepositionPhrase, AdjectivePhrase, AdverbPhrase, Clause,
+    Document, Paragraph, RhetRel, MsgSpec, StringMsg, PredicateMsg,
+)
+
+# the kinds of objects (the way their state is written)
+_ELEMENT = 0  # features, id and the slots (see `_fields()`)
+_ELEMENT_LIST = 1  # features and the elements
+_OBJECT = 2  # the instance dictionary
+
+# the supported base classes and the kinds of their instances
+_BASES = ((Element, _ELEMENT), (ElementList, _ELEMENT_LIST), (Document, _OBJECT),
+          (Paragraph, _OBJECT), (RhetRel, _OBJECT), (MsgSpec, _OBJECT))
+
+# flags of elements and lists of elements
+_HAS_FEATURES = 1
+_HAS_ID = 2
+_SHARED = 4  # the element shares its constituents with a clone
+_HAS_EXTRAS = 8  # the element has attributes in `__dict__`
+
+# the slots not written by the codec
+_SKIPPED_SLOTS = frozenset(['_features', 'parent', '_id', 'hash', '_cow'])
+# the attributes of `ElementList` not written as extras
+_LIST_ATTRIBUTES = frozenset(['data', 'parent', 'features'])
+
+_double = struct.Struct('>d')
+# the types written by `Encoder._write_scalar()` (except str)
+_SCALAR_TYPES = frozenset([type(None), bool, int, float, bytes])
+
+# a marker for slots without a value
+_unset = object()
+
+
+class DecodeError(ValueError):
+    """Exception raised for malformed or unsupported payloads."""
+    pass
+
+
+def dumps(obj):
+    """Return the binary representation of `obj` (`bytes`)."""
+    return Encoder().encode(obj)
+
+
+def loads(data):
+    """Return the object encoded in `data` (`bytes` or a buffer)."""
+    return Decoder(data).decode()
+
+
+def dump(obj, fp):
+    """Write the binary representation of `obj` to the binary file `fp`."""
+    fp.write(dumps(obj))
+
+
+def load(fp):
+    """Read an object from the binary file `fp`."""
+    return loads(fp.read())
+
+
+def _kind(cls):
+    """Return the kind of the instances of `cls` or None if they are not supported."""
+    for base, kind in _BASES:
+        if issubclass(cls, base):
+            return kind
+    return None
+
+
+_fields_cache = {}
+
+
+def _fields(cls):
+    """Return the names of the slots of the element class `cls` that are written."""
+    rv = _fields_cache.get(cls)
+    if rv is None:
+        rv = tuple(n for n in _slot_names(cls) if n not in _SKIPPED_SLOTS)
+        _fields_cache[cls] = rv
+    return rv
+
+
+def _write_uint(buf, n):
+    """Append the unsigned integer `n` to `buf` as a varint."""
+    while n > 0x7f:
+        buf.append((n & 0x7f) | 0x80)
+        n >>= 7
+    buf.append(n)
+
+
+def _read_uint(data, pos):
+    """Return the varint at `pos` in `data` and the position after it."""
+    b = data[pos]
+    pos += 1
+    rv = b & 0x7f
+    shift = 7
+    while b & 0x80:
+        b = data[pos]
+        pos += 1
+        rv |= (b & 0x7f) << shift
+        shift += 7
+    return rv, pos
+
+
+class Encoder(object):
+    """Encoder of a single object; use `dumps()` instead of using it directly. """
+
+    def __init__(self):
+        self.buf = bytearray(MAGIC)
+        self.buf.append(VERSION)
+        self._strings = {}
+        self._features = {}
+        self._objects = {}  # id -> the position of the object
+        self._keep_alive = []  # the objects in `_objects`
+        self._classes = {cls: (bytes([_TYPE_BASE + i]), _kind(cls))
+                         for i, cls in enumerate(_TYPES)}
+
+    def encode(self, obj):
+        """Return the payload representing `obj`. """
+        buf = self.buf
+        append = buf.append
+        write_str, write_scalar = self._write_str, self._write_scalar
+        objects = self._objects
+        stack = [obj]
+        pop, push = stack.pop, stack.append
+        while stack:
+            value = pop()
+            t = type(value)
+            if t is str:
+                write_str(value)
+            elif t in _SCALAR_TYPES:
+                write_scalar(value)
+            elif t is list or t is tuple:
+                append(_LIST if t is list else _TUPLE)
+                _write_uint(buf, len(value))
+                stack.extend(reversed(value))
+            elif t is dict:
+                append(_DICT)
+                _write_uint(buf, len(value))
+                for k, v in reversed(list(value.items())):
+                    push(v)
+                    push(k)
+            elif value is _unset:
+                append(_UNSET)
+            elif value is _NO_ELEMENTS:
+                append(_EMPTY_ELEMENTS)
+            elif id(value) in objects:
+                append(_REF)
+                _write_uint(buf, objects[id(value)])
+            elif t is FeatureSet:
+                append(_FEATURES)
+                self._write_features(value)
+            elif t is Feature:
+                append(_FEATURE)
+                self._write_feature(value)
+            else:
+                self._write_object(value, push)
+        return bytes(buf)
+
+    def _write_str(self, s):
+        buf = self.buf
+        i = self._strings.get(s)
+        if i is None:
+            self._strings[s] = len(self._strings)
+            b = s.encode('utf-8')
+            buf.append(_STR)
+            _write_uint(buf, len(b))
+            buf += b
+        else:
+            buf.append(_STR_REF)
+            _write_uint(buf, i)
+
+    def _write_scalar(self, value):
+        """Write a value that is not a container (e.g., the value of a feature)."""
+        buf = self.buf
+        t = type(value)
+        if t is str:
+            self._write_str(value)
+        elif value is None:
+            buf.append(_NONE)
+        elif t is bool:
+            buf.append(_TRUE if value else _FALSE)
+        elif t is int:
+            buf.append(_INT)
+            _write_uint(buf, value << 1 if value >= 0 else ((-value) << 1) - 1)
+        elif t is float:
+            buf.append(_FLOAT)
+            buf += _double.pack(value)
+        elif t is bytes:
+            buf.append(_BYTES)
+            _write_uint(buf, len(value))
+            buf += value
+        else:
+            msg = 'Cannot encode the value {!r}.'
+            raise TypeError(msg.format(value))
+
+    def _write_feature(self, f):
+        # 0 introduces a new feature; other codes are the position of the feature + 1
+        code = self._features.get(f)
+        if code is None:
+            self._features[f] = len(self._features) + 1
+            self.buf.append(0)
+            self._write_str(f.name)
+            self._write_scalar(f.value)
+        else:
+            _write_uint(self.buf, code)
+
+    def _write_features(self, fs):
+        _write_uint(self.buf, len(fs))
+        for f in fs:
+            self._write_feature(f)
+
+    def _class_record(self, cls):
+        """Return the tag and the kind of `cls`, writing its name if it is new."""
+        kind = _kind(cls)
+        if kind is None:
+            msg = 'Cannot encode objects of type "{}".'
+            raise TypeError(msg.format(cls.__qualname__))
+        tag = _TYPE_BASE + len(self._classes)
+        if tag > 0xff:
+            raise ValueError('Too many classes to encode.')
+        self._classes[cls] = (bytes([tag]), kind)
+        # the first instance follows the name of the class instead of the tag
+        self.buf.append(_CLASS)
+        self._write_str(cls.__module__)
+        self._write_str(cls.__qualname__)
+        return b'', kind
+
+    def _write_object(self, value, push):
+        cls = type(value)
+        record = self._classes.get(cls)
+        if record is None:
+            record = self._class_record(cls)
+        tag, kind = record
+        buf = self.buf
+        buf += tag
+        self._objects[id(value)] = len(self._keep_alive)
+        self._keep_alive.append(value)
+        if kind == _ELEMENT:
+            features, id_ = value._features, value._id
+            extras = value.__dict__
+            flags = ((_HAS_FEATURES if features else 0) | (_HAS_ID if id_ is not None else 0) |
+                     (_SHARED if value._cow else 0) | (_HAS_EXTRAS if extras else 0))
+            buf.append(flags)
+            if features:
+                self._write_features(features)
+            if extras:
+                push(dict(extras))
+            for name in reversed(_fields(cls)):
+                push(getattr(value, name, _unset))
+            if id_ is not None:
+                push(id_)
+        elif kind == _ELEMENT_LIST:
+            features = value.features
+            extras = {k: v for k, v in value.__dict__.items() if k not in _LIST_ATTRIBUTES}
+            buf.append((_HAS_FEATURES if features else 0) | (_HAS_EXTRAS if extras else 0))
+            if features:
+                self._write_features(features)
+            _write_uint(buf, len(value.data))
+            if extras:
+                push(extras)
+            for x in reversed(value.data):
+                push(x)
+        else:
+            push(dict(value.__dict__))
+
+
+class Decoder(object):
+    """Decoder of a single payload; use `loads()` instead of using it directly. """
+
+    def __init__(self, data):
+        self.data = data
+        self._strings = []
+        self._features = []
+        self._objects = []
+        self._classes = [(cls, _kind(cls)) for cls in _TYPES]
+
+    def decode(self):
+        """Return the object encoded in the payload. """
+        data = self.data
+        n = len(MAGIC)
+        if bytes(data[:n]) != MAGIC:
+            raise DecodeError('The data are not an encoded element.')
+        if len(data) <= n or data[n] != VERSION:
+            version = data[n] if len(data) > n else None
+            raise DecodeError('Unsupported version of the format: {}'.format(version))
+        try:
+            rv, pos = self._decode(n + 1)
+        except (IndexError, UnicodeDecodeError, struct.error) as e:
+            raise DecodeError('Malformed data ({}).'.format(e)) from e
+        if pos != len(data):
+            raise DecodeError('Unexpected data after the encoded object.')
+        return rv
+
+    # The methods reading the parts of the payload take the position
+    # of the part and return the value and the position after it.
+
+    def _str(self, pos):
+        data = self.data
+        tag = data[pos]
+        n, pos = _read_uint(data, pos + 1)
+        if tag == _STR_REF:
+            return self._strings[n], pos
+        if tag != _STR:
+            raise DecodeError('Expected a string but found tag {}.'.format(tag))
+        rv = str(data[pos:pos + n], 'utf-8')
+        self._strings.append(rv)
+        return rv, pos + n
+
+    def _scalar(self, pos):
+        """Read a value that is not a container."""
+        data = self.data
+        tag = data[pos]
+        if tag == _STR or tag == _STR_REF:
+            return self._str(pos)
+        pos += 1
+        if tag == _NONE:
+            return None, pos
+        if tag == _TRUE:
+            return True, pos
+        if tag == _FALSE:
+            return False, pos
+        if tag == _INT:
+            n, pos = _read_uint(data, pos)
+            return (-((n + 1) >> 1) if n & 1 else n >> 1), pos
+        if tag == _FLOAT:
+            return _double.unpack(data[pos:pos + 8])[0], pos + 8
+        if tag == _BYTES:
+            n, pos = _read_uint(data, pos)
+            return bytes(data[pos:pos + n]), pos + n
+        raise DecodeError('Unexpected tag {}.'.format(tag))
+
+    def _feature(self, pos):
+        code, pos = _read_uint(self.data, pos)
+        if code:
+            return self._features[code - 1], pos
+        name, pos = self._str(pos)
+        value, pos = self._scalar(pos)
+        rv = Feature(name, value)
+        self._features.append(rv)
+        return rv, pos
+
+    def _feature_set(self, pos):
+        n, pos = _read_uint(self.data, pos)
+        rv = FeatureSet()
+        for _ in range(n):
+            f, pos = self._feature(pos)
+            rv.add(f)
+        return rv, pos
+
+    def _class(self, pos):
+        module_name, pos = self._str(pos)
+        qualname, pos = self._str(pos)
+        try:
+            rv = importlib.import_module(module_name)
+            for name in qualname.split('.'):
+                rv = getattr(rv, name)
+        except (ImportError, AttributeError) as e:
+            msg = 'Cannot find the class {}.{}.'
+            raise DecodeError(msg.format(module_name, qualname)) from e
+        kind = _kind(rv) if isinstance(rv, type) else None
+        if kind is None:
+            msg = 'The class {}.{} cannot be decoded.'
+            raise DecodeError(msg.format(module_name, qualname))
+        self._classes.append((rv, kind))
+        return (rv, kind), pos
+
+    def _decode(self, pos):
+        # Each frame on the stack is a list describing an unfinished container:
+        # [kind, container, names or number of values, position, extra]
+        # The element frames list the names of the slots; the other frames
+        # count the values (the dict frames count keys and values).
+        # `extra` is True if a list of elements has extra attributes
+        # and the last key read by a dict frame.
+        data = self.data
+        strings, objects, classes = self._strings, self._objects, self._classes
+        stack = []
+        while True:
+            tag = data[pos]
+            if tag == _STR_REF:
+                n = data[pos + 1]
+                pos += 2
+                if n & 0x80:
+                    n, pos = _read_uint(data, pos - 1)
+                value = strings[n]
+            elif tag >= _TYPE_BASE or tag == _CLASS:
+                if tag == _CLASS:
+                    (cls, kind), pos = self._class(pos + 1)
+                else:
+                    pos += 1
+                    try:
+                        cls, kind = classes[tag - _TYPE_BASE]
+                    except IndexError:
+                        raise DecodeError('Unknown class tag {}.'.format(tag)) from None
+                obj = cls.__new__(cls)
+                objects.append(obj)
+                if kind == _ELEMENT:
+                    obj._init_fields()
+                    flags = data[pos]
+                    pos += 1
+                    if flags & _HAS_FEATURES:
+                        features, pos = self._feature_set(pos)
+                        obj.features = features
+                    else:
+                        obj.features = FeatureSet()
+                    if flags & _SHARED:
+                        obj._cow = True
+                    names = _fields(cls)
+                    if flags & _HAS_ID:
+                        names = ('_id',) + names
+                    if flags & _HAS_EXTRAS:
+                        names += ('__dict__',)
+                    if names:
+                        stack.append([_ELEMENT, obj, names, 0, None])
+                        continue
+                elif kind == _ELEMENT_LIST:
+                    obj.data = []
+                    obj.parent = self._container(stack)
+                    flags = data[pos]
+                    pos += 1
+                    if flags & _HAS_FEATURES:
+                        obj.features, pos = self._feature_set(pos)
+                    else:
+                        obj.features = FeatureSet()
+                    n, pos = _read_uint(data, pos)
+                    if n or flags & _HAS_EXTRAS:
+                        stack.append([_ELEMENT_LIST, obj, n, 0, bool(flags & _HAS_EXTRAS)])
+                        continue
+                else:
+                    stack.append([_OBJECT, obj, 1, 0, None])
+                    continue
+                value = obj
+            elif tag <= _BYTES:
+                value, pos = self._scalar(pos)
+            elif tag <= _DICT:
+                n, pos = _read_uint(data, pos + 1)
+                if n:
+                    if tag == _DICT:
+                        stack.append([tag, {}, 2 * n, 0, None])
+                    else:
+                        stack.append([tag, [], n, 0, None])
+                    continue
+                value = {} if tag == _DICT else [] if tag == _LIST else ()
+            elif tag == _REF:
+                n, pos = _read_uint(data, pos + 1)
+                value = objects[n]
+            elif tag == _FEATURES:
+                value, pos = self._feature_set(pos + 1)
+            elif tag == _FEATURE:
+                value, pos = self._feature(pos + 1)
+            elif tag == _EMPTY_ELEMENTS:
+                value = _NO_ELEMENTS
+                pos += 1
+            elif tag == _UNSET:
+                value = _unset
+                pos += 1
+            else:
+                raise DecodeError('Unknown tag {}.'.format(tag))
+            # pass the value to the unfinished containers
+            while stack:
+                frame = stack[-1]
+                kind, obj, n, i, extra = frame
+                if kind == _ELEMENT:
+                    name = n[i]
+                    if value is not _unset:
+                        if name == '__dict__':
+                            obj.__dict__.update(value)
+                        else:
+                            object.__setattr__(obj, name, value)
+                            if isinstance(value, Element) and name in obj._constituents:
+                                value.parent = obj
+                    done = i + 1 == len(n)
+                elif kind == _ELEMENT_LIST:
+                    if i < n:
+                        if isinstance(value, Element):
+                            value.parent = obj.parent
+                        obj.data.append(value)
+                    else:
+                        obj.__dict__.update(value)
+                    done = i + 1 == n + extra
+                elif kind == _OBJECT:
+                    obj.__dict__.update(value)
+                    done = True
+                elif kind == _DICT:
+                    if i & 1:
+                        obj[extra] = value
+                    else:
+                        frame[4] = value
+                    done = i + 1 == n
+                else:
+                    obj.append(value)
+                    done = i + 1 == n
+                if not done:
+                    frame[3] = i + 1
+                    break
+                stack.pop()
+                value = tuple(obj) if kind == _TUPLE else obj
+            else:
+                return value, pos
+
+    @staticmethod
+    def _container(stack):
+        """Return the element whose constituent is being decoded or None."""
+        if stack:
+            kind, obj, names, i, _ = stack[-1]
+            if kind == _ELEMENT and names[i] in obj._constituents:
+                return obj
+        return None
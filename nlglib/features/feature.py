@@ -7,18 +7,60 @@ not found in others.
 
 """
 
-import copy
-from collections import MutableSet
+import weakref
+
+from collections.abc import MutableSet
 
 __all__ = ['Feature', 'FeatureGroup', 'FeatureSet']
 
 
 class Feature(object):
-    """Represents individual features -- a pair of feature group name + value"""
+    """Represents individual features -- a pair of feature group name + value
+
+    Features are immutable and interned: creating a feature with the same
+    name and value returns the same instance, so `Feature('NUMBER', 'plural')`
+    is `NUMBER.plural`. Comparisons of identical features are therefore
+    resolved by identity. The registry holds the features weakly, so
+    a feature with an arbitrary value (eg an id) is released when it is
+    no longer used; the features of feature groups live as long as the groups.
+
+    """
+    __slots__ = ('name', 'value', '_lower_name', '_hash', '__weakref__')
+
+    # registry of interned features
+    _registry = weakref.WeakValueDictionary()
+
+    def __new__(cls, name, value):
+        key = (cls, name, value.__class__, value)
+        try:
+            rv = cls._registry.get(key)
+        except TypeError:  # unhashable value -- create a private instance
+            key, rv = None, None
+        if rv is None:
+            rv = super().__new__(cls)
+            object.__setattr__(rv, 'name', name)
+            object.__setattr__(rv, 'value', value)
+            object.__setattr__(rv, '_lower_name', name.lower())
+            object.__setattr__(rv, '_hash', hash(name))
+            if key is not None:
+                cls._registry[key] = rv
+        return rv
 
-    def __init__(self, name, value):
-        self.name = name
-        self.value = value
+    def __setattr__(self, key, value):
+        raise AttributeError('Feature instances are immutable.')
+
+    def __delattr__(self, item):
+        raise AttributeError('Feature instances are immutable.')
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        # unpickling goes through __new__ and therefore returns the interned instance
+        return self.__class__, (self.name, self.value)
 
     def __str__(self):
         return '{0}: {1}'.format(self.name, self.value)
@@ -31,16 +73,18 @@ class Feature(object):
         or if it is a `FeatureGroup` with the same name
 
         """
+        if self is other:
+            return True
         if isinstance(other, Feature):
-            return self.name.lower() == other.name.lower() and self.value == other.value
+            return self._lower_name == other._lower_name and self.value == other.value
         elif isinstance(other, FeatureGroup):
-            return self.name.lower() == other.name.lower()
+            return self._lower_name == other.name.lower()
         else:
             return False
 
     def __hash__(self):
         # hash uses only the name so that we can compare with FeatureGroup
-        return hash(self.name)
+        return self._hash
 
 
 class FeatureGroup(object):
@@ -119,27 +163,62 @@ class FeatureGroup(object):
         return super(FeatureGroup, self).__getattribute__(item)
 
 
+# storage shared by empty feature sets until a feature is added (never modified)
+_NO_FEATURES = {}
+
+
 class FeatureSet(MutableSet):
-    """Represents a set of features"""
-    __slots__ = ['__s']
+    """Represents a set of features
+
+    The features are stored in a dict keyed by the feature group name
+    so that lookup, replacement and removal of a group are constant time.
+    Each group maps to a tuple of features -- usually just one, but `add()`
+    allows several values of the same group to be present.
+
+    The attribute `on_change` can be set to a callable taking no arguments;
+    it is called whenever the set is modified. Elements use it to invalidate
+    their cached hash. The callback is not copied or pickled.
+
+    Empty sets share one empty dict; a set gets a dict of its own
+    when the first feature is added.
+
+    """
+    __slots__ = ['__d', 'on_change']
 
     def __init__(self, seq=()):
-        self.__s = set(seq)
+        self.__d = _NO_FEATURES
+        self.on_change = None
+        for f in seq:
+            self.add(f)
+
+    def __copy__(self):
+        return self.copy()
+
+    def __deepcopy__(self, memo):
+        # features are immutable so copying the container is sufficient
+        return self.copy()
+
+    def __reduce__(self):
+        return self.__class__, (tuple(self),)
 
     def __repr__(self):
-        return '<FeatureSet {0}>'.format(str(self.__s))
+        return '<FeatureSet {0}>'.format(str(set(self)))
 
     def __str__(self):
-        features = sorted(self.__s, key=lambda f: (f.name, f.value))
+        features = sorted(self, key=lambda f: (f.name, f.value))
         return '{' + ', '.join(
             '{k}: {v}'.format(k=repr(f.name), v=repr(f.value)) for f in features
         ) + '}'
 
     def __len__(self):
-        return len(self.__s)
+        return sum(len(fs) for fs in self.__d.values())
+
+    def __bool__(self):
+        return bool(self.__d)
 
     def __iter__(self):
-        return iter(self.__s)
+        for fs in self.__d.values():
+            yield from fs
 
     def __contains__(self, x):
         """Return True if the feature set contains either given feature or given feature group
@@ -158,8 +237,13 @@ class FeatureSet(MutableSet):
 
         """
         if isinstance(x, str):
-            x = FeatureGroup(x)
-        return x in self.__s
+            return x in self.__d
+        elif isinstance(x, FeatureGroup):
+            return x.name in self.__d
+        elif isinstance(x, Feature):
+            return x in self.__d.get(x.name, ())
+        else:
+            return False
 
     def __getitem__(self, feature):
         """Return the value of the corresponding feature group (eg NUMBER or TENSE) or None
@@ -170,10 +254,8 @@ class FeatureSet(MutableSet):
 
         """
         name = feature if isinstance(feature, str) else feature.name
-        for f in self.__s:
-            if name == f.name:
-                return f
-        return None
+        fs = self.__d.get(name)
+        return fs[0] if fs else None
 
     def __setitem__(self, key, value):
         """Add the given `value` using `self.replace`; `key` is used only if `value` is a string.
@@ -201,7 +283,18 @@ class FeatureSet(MutableSet):
         '<FeatureSet {<Feature NUMBER: plural>, <Feature NUMBER: singular>}>'
 
         """
-        self.__s.add(value)
+        d = self.__d
+        if d is _NO_FEATURES:
+            d = self.__d = {}
+        fs = d.get(value.name)
+        if fs is None:
+            d[value.name] = (value,)
+        elif value not in fs:
+            d[value.name] = fs + (value,)
+        else:
+            return
+        if self.on_change is not None:
+            self.on_change()
 
     def replace(self, value):
         """Add a feature into the set, replacing other feature(s) of the same group
@@ -214,26 +307,33 @@ class FeatureSet(MutableSet):
         """
         if not value:
             return
-        self.discard(value)
-        self.add(value)
+        if self.__d is _NO_FEATURES:
+            self.__d = {}
+        self.__d[value.name] = (value,)
+        if self.on_change is not None:
+            self.on_change()
 
     def discard(self, value):
         """Discard a given value from the set (doesn't raise KeyError if not found)
 
+        Note that all features of the group are discarded, not just `value`.
+
         >>> fs = FeatureSet([Feature('NUMBER', 'singular')])
         >>> fs.discard(Feature('NUMBER', 'plural'))
         {<Feature NUMBER: singular>}
         >>> repr(fs)
-        '<FeatureSet {<Feature NUMBER: singular>}>'
-        >>> fs.discard(FeatureGroup('NUMBER'))
-        >>> repr(fs)
         '<FeatureSet set()>'
 
         """
-        feature = value if isinstance(value, str) else value.name
-        to_del = set(x for x in self.__s if x.name == feature)
-        self.__s -= to_del
-        return to_del
+        if not self.__d:
+            return set()
+        name = value if isinstance(value, str) else value.name
+        removed = self.__d.pop(name, None)
+        if not removed:
+            return set()
+        if self.on_change is not None:
+            self.on_change()
+        return set(removed)
 
     def get(self, feature, default=None):
         """Get the value of a given feature group or return `default` if it is not present
@@ -245,7 +345,8 @@ class FeatureSet(MutableSet):
         'some-default'
 
         """
-        return self[feature] if self[feature] is not None else default
+        rv = self[feature]
+        return rv if rv is not None else default
 
     def as_dict(self):
         """Return given feature set as a dictionary;
@@ -253,18 +354,18 @@ class FeatureSet(MutableSet):
         The method is assuming that each feature belongs to a different group.
 
         """
-        return {f.name: f.value for f in self.__s}
+        return {f.name: f.value for f in self}
 
     def keys(self):
-        for f in self.__s:
+        for f in self:
             yield f.name
 
     def values(self):
-        for f in self.__s:
+        for f in self:
             yield f.value
 
     def items(self):
-        for f in self.__s:
+        for f in self:
             yield (f.name, f.value)
 
     def update(self, other):
@@ -274,7 +375,7 @@ class FeatureSet(MutableSet):
             for k, v in other.items():
                 self.replace(Feature(k, v))
         elif isinstance(other, FeatureSet):
-            for f in other.__s:
+            for f in other:
                 self.replace(f)
         elif isinstance(other, (list, tuple, set)):
             for x in other:
@@ -289,5 +390,7 @@ class FeatureSet(MutableSet):
 
     def copy(self):
         rv = FeatureSet()
-        rv.__s = copy.copy(self.__s)
+        # the tuples are immutable so a shallow copy is sufficient
+        if self.__d:
+            rv.__d = self.__d.copy()
         return rv
@@ -1,14 +1,18 @@
 """This module contains classes and functions for performing lexicalisation."""
 
 import logging
+import mmap
 
+from collections.abc import Mapping
 from copy import deepcopy
+from struct import Struct
 
+from nlglib import codec, metrics
 from nlglib.microplanning import *
 from nlglib.macroplanning import *
 from nlglib.features import category, NEGATED
 
-__all__ = ['Lexicaliser']
+__all__ = ['Lexicaliser', 'TemplateLibrary']
 
 
 class Lexicaliser(object):
@@ -27,13 +31,21 @@ class Lexicaliser(object):
     def __init__(self, templates=None, logger=None):
         """Create a new lexicaliser.
         
-        :param templates: a dict with templates for lexicalising elements
+        :param templates: a dict or a `TemplateLibrary` with templates
+                          for lexicalising elements
         
         """
         self.logger = logger or logging.getLogger(__name__)
-        self.templates = self.default_templates.copy()
-        if templates:
-            self.templates.update(templates)
+        if isinstance(templates, TemplateLibrary):
+            # use the library directly so that only the templates in use are decoded
+            self.templates = templates
+        else:
+            self.templates = self.default_templates.copy()
+            if templates:
+                self.templates.update(templates)
+        # template key -> (template, hash of the template, argument paths)
+        self._compiled = {}
+        self.compile_templates()
 
     def __call__(self, msg, **kwargs):
         return self.lexicalise(msg, **kwargs)
@@ -49,7 +61,7 @@ class Lexicaliser(object):
 
         """
         cat = msg.category if hasattr(msg, 'category') else type(msg).__name__
-        self.logger.debug('Lexicalising {0}: {1}'.format(cat, repr(msg)))
+        self.logger.debug('Lexicalising %s: %r', cat, msg)
 
         if msg is None:
             return None
@@ -61,42 +73,46 @@ class Lexicaliser(object):
         attribute = cat.lower()
         if hasattr(self, attribute):
             fn = getattr(self, attribute)
-            return fn(msg, **kwargs)
         elif cat in category.element_category:
-            return self.element(msg, **kwargs)
+            fn = self.element
         elif isinstance(msg, (list, set, tuple)):
-            return self.element_list(msg, **kwargs)
+            fn = self.element_list
         else:
             return String(msg)
+        if metrics.sink is not None:
+            return metrics.call(type(self).__name__ + '.' + fn.__name__, fn, msg, **kwargs)
+        return fn(msg, **kwargs)
 
     def element_list(self, element, **kwargs):
         self.logger.warning('This should not be called???')
         return ElementList([self(x, **kwargs) for x in element])
 
     def element(self, element, **kwargs):
-        """Return a deep copy of `element` with variables replaced.
+        """Return a copy of `element` with variables replaced.
         
         The replacement is looked up in self.templates and kwargs['templates']
         using the `key` of the argument (`Var` instance).
+        The copy is a copy-on-write clone (see `Element.clone()`).
         
         """
-        rv = deepcopy(element)
+        rv = element.clone() if isinstance(element, Element) else deepcopy(element)
         # find arguments
-        args = rv.arguments()
+        replacements = []
+        log_replacements = self.logger.isEnabledFor(logging.INFO)
         # if there are any variables, replace them by values from templates
-        for arg in args:
+        for path, arg in rv.argument_paths():
             template = self.get_template(arg, **kwargs)
             if template is None:
                 continue
-            msg = 'Replacing\n{0} in \n{1} by \n{2}.'
-            self.logger.info(msg.format(repr(arg), repr(rv), repr(template)))
+            if log_replacements:
+                self.logger.info('Replacing\n%r in \n%r by \n%r.', arg, rv, template)
             # avoid infinite recursion of lexicalising args (Var instances)?
-            if rv == arg:
+            if not path:
                 return template
             else:
                 # allow nested templates
-                lexicalised_arg = self.lexicalise(template, **kwargs)
-                rv.replace(arg, lexicalised_arg)
+                replacements.append((path, self.lexicalise(template, **kwargs)))
+        self._replace_arguments(rv, replacements)
         return rv
 
     def message_specification(self, msg, **kwargs):
@@ -115,26 +131,29 @@ class Lexicaliser(object):
             return None
         template = None
         try:
-            template = self.get_template(msg, **kwargs)
-            args = template.arguments()
+            template, paths = self._get_template(msg, **kwargs)
+            if paths is None:
+                paths = template.argument_paths()
+            replacements = []
+            log_replacements = self.logger.isEnabledFor(logging.INFO)
             # if there are any arguments, replace them by values from the msg
-            for arg in args:
-                self.logger.info(
-                    'Replacing argument\n{0} in \n{1}.'.format(str(arg), repr(template))
-                )
+            for path, arg in paths:
+                if log_replacements:
+                    self.logger.info('Replacing argument\n%s in \n%r.', arg, template)
                 val = msg.value_for(arg.id)
                 # check if value is a template and if so, look it up
                 if isinstance(val, (str, String)):
                     val = self.get_template(val, **kwargs)
                 lex_val = self(val, **kwargs)
-                log_msg = 'Replacement value for {0}: {1}'
-                self.logger.info(log_msg.format(str(arg), repr(lex_val)))
-                template.replace(arg, lex_val)
+                if log_replacements:
+                    self.logger.info('Replacement value for %s: %r', arg, lex_val)
+                replacements.append((path, lex_val))
+            self._replace_arguments(template, replacements)
             return template
         except Exception as e:
             self.logger.exception('Error in lexicalising MsgSpec: %s', e)
-            self.logger.info('\tmsg: ' + repr(msg))
-            self.logger.info('\ttemplate: ' + repr(template))
+            self.logger.info('\tmsg: %r', msg)
+            self.logger.info('\ttemplate: %r', template)
         return String(msg)
 
     def rst_relation(self, rel, **kwargs):
@@ -162,7 +181,7 @@ class Lexicaliser(object):
         if relation in ('conjunction', 'disjunction'):
             result = Coordination(*nuclei, conj=rel.marker, features=features)
         elif relation == 'imply':
-            self.logger.debug('RST Implication: ' + repr(rel))
+            self.logger.debug('RST Implication: %r', rel)
             subj = raise_to_phrase(nucleus)
             compl = raise_to_phrase(satellite)
             compl['COMPLEMENTISER'] = 'then'
@@ -215,7 +234,7 @@ class Lexicaliser(object):
                 result.coords[0].add_front_modifier(String(front_mod), pos=0)
             else:
                 result.premodifiers.insert(0, String(front_mod))
-            self.logger.debug('Result:\n' + repr(result))
+            self.logger.debug('Result:\n%r', result)
         elif relation == 'negation':
             result = Clause(Pronoun('it'), VP('is', NP('the', 'case'), features=(NEGATED.true,)))
             cl = raise_to_phrase(nucleus)
@@ -263,6 +282,46 @@ class Lexicaliser(object):
         :return: a template or String(str(element))
         :rtype: Element
 
+        """
+        return self._get_template(item, templates=templates, **kwargs)[0]
+
+    def compile_templates(self):
+        """Record the paths to the arguments of the templates in `self.templates`.
+
+        Filling a compiled template replaces the arguments at the recorded
+        positions instead of searching the template for each of them.
+        The templates are compiled when the lexicaliser is created
+        and recompiled on use when they (or their structure) change.
+        The templates of a `TemplateLibrary` are compiled when they are first used.
+
+        """
+        if isinstance(self.templates, TemplateLibrary):
+            return
+        for key, template in self.templates.items():
+            if isinstance(template, Element):
+                self._argument_paths(key, template)
+
+    def _argument_paths(self, key, template):
+        """Return the argument paths of the template registered under `key`."""
+        # the structural hash covers all constituents and it is reset by every
+        # change of the tree so a template changed in place is compiled again
+        entry = self._compiled.get(key)
+        if entry is None or entry[0] is not template or entry[1] != hash(template):
+            entry = (template, hash(template), template.argument_paths())
+            self._compiled[key] = entry
+        return entry[2]
+
+    @staticmethod
+    def _replace_arguments(template, replacements):
+        """Replace the arguments at given paths by the corresponding values."""
+        # start from the end so that removing a constituent does not shift the paths
+        for path, value in reversed(replacements):
+            template.replace_at(path, value)
+
+    def _get_template(self, item, templates=None, **kwargs):
+        """Return the template for `item` (see `get_template()`)
+        and its argument paths or None if they were not precomputed.
+
         """
         available_templates = templates or self.templates
         if isinstance(item, str):
@@ -271,7 +330,17 @@ class Lexicaliser(object):
             key = item.value
         else:
             key = item.id
-        template = deepcopy(available_templates.get(key))
+        template = available_templates.get(key)
+        if template is None and available_templates is self.templates:
+            template = self.default_templates.get(key)
+        paths = None
+        # templates are instantiated often so only copy the parts that change
+        if isinstance(template, Element):
+            if available_templates is self.templates:
+                paths = self._argument_paths(key, template)
+            template = template.clone()
+        else:
+            template = deepcopy(template)
         if template is None:
             self.logger.warning('No template for key "%s" (item %s)', key, item)
             rv = String(item)
@@ -279,8 +348,7 @@ class Lexicaliser(object):
             # noinspection PyCallingNonCallable
             template = template(item, templates=templates, **kwargs)
             if template is None:
-                msg = 'Function for template "%s" returned None'
-                self.logger.warning(msg % key)
+                self.logger.warning('Function for template "%s" returned None', key)
                 rv = String(item)
             else:
                 rv = template
@@ -296,7 +364,7 @@ class Lexicaliser(object):
         if 'features' in kwargs:
             rv.features.update(kwargs['features'])
 
-        return rv
+        return rv, paths
 
     def items_as_element_list(self, items, features=None):
         """Flatten items into an ElementList, optionally updating features."""
@@ -311,3 +379,180 @@ class Lexicaliser(object):
             else:
                 raise Exception('Unexpected type "{}".'.format(type(item)))
         return rv
+
+
+class TemplateLibrary(Mapping):
+    """A read-only collection of templates that can be saved and loaded quickly.
+
+    A library is created from a dict of templates and then frozen:
+    each template is encoded using `nlglib.codec` and the library keeps
+    only the encoded templates. A template is decoded when it is first
+    looked up and the decoded template is kept for further lookups,
+    so a process decodes only the templates it uses.
+
+    A frozen library can be saved to a file and loaded (or memory-mapped)
+    by other processes. Processes that memory-map the file share the pages
+    holding the templates, and so do the processes forked after the library
+    was loaded. Pickling a frozen library (e.g., to send it to a worker
+    process) pickles the encoded templates.
+
+    The keys of the templates are usually strings (e.g., `MsgSpec.name`).
+    Templates have to be elements; callable templates cannot be encoded.
+
+    Example:
+
+        TemplateLibrary(templates).save('templates.nlg')
+        lexicaliser = Lexicaliser(templates=TemplateLibrary.load('templates.nlg', mmap=True))
+
+    """
+
+    MAGIC = b'NLGT'
+    VERSION = 1
+    # magic, version and the length of the index
+    _header = Struct('>4sBI')
+
+    def __init__(self, templates=None):
+        """Create a new library with the given templates (a dict).
+
+        The library can be modified until it is frozen (see `freeze()`).
+
+        """
+        self._templates = dict(templates or {})
+        self._data = None  # the encoded library once frozen
+        self._mmap = None
+        self._index = None  # key -> (offset, length) of the encoded template
+        self._offset = 0  # the position of the first template in `_data`
+        self._decoded = {}
+
+    @property
+    def frozen(self):
+        return self._data is not None
+
+    def __repr__(self):
+        state = 'frozen, ' if self.frozen else ''
+        return '<TemplateLibrary ({}{} templates)>'.format(state, len(self))
+
+    def __len__(self):
+        return len(self._index) if self.frozen else len(self._templates)
+
+    def __iter__(self):
+        return iter(self._index if self.frozen else self._templates)
+
+    def __contains__(self, key):
+        return key in (self._index if self.frozen else self._templates)
+
+    def __getitem__(self, key):
+        if not self.frozen:
+            return self._templates[key]
+        rv = self._decoded.get(key)
+        if rv is None:
+            offset, length = self._index[key]
+            start = self._offset + offset
+            rv = codec.loads(self._data[start:start + length])
+            self._decoded[key] = rv
+        return rv
+
+    def __setitem__(self, key, template):
+        if self.frozen:
+            raise TypeError('A frozen template library cannot be modified.')
+        self._templates[key] = template
+
+    def __delitem__(self, key):
+        if self.frozen:
+            raise TypeError('A frozen template library cannot be modified.')
+        del self._templates[key]
+
+    def __reduce__(self):
+        if self.frozen:
+            return self.__class__.from_bytes, (self.to_bytes(),)
+        return self.__class__, (self._templates,)
+
+    def freeze(self):
+        """Encode the templates and make the library read-only; return `self`."""
+        if not self.frozen:
+            self._load(self.to_bytes())
+            self._templates = None
+        return self
+
+    def to_bytes(self):
+        """Return the encoded library (the content of the file written by `save()`)."""
+        if self.frozen:
+            return bytes(self._data)
+        index = []
+        parts = []
+        offset = 0
+        for key, template in self._templates.items():
+            if not isinstance(template, Element):
+                msg = 'The template "{}" is not an element and cannot be encoded.'
+                raise TypeError(msg.format(key))
+            data = codec.dumps(template)
+            index.append((key, offset, len(data)))
+            parts.append(data)
+            offset += len(data)
+        index = codec.dumps(index)
+        header = self._header.pack(self.MAGIC, self.VERSION, len(index))
+        return b''.join([header, index] + parts)
+
+    @classmethod
+    def from_bytes(cls, data):
+        """Return a frozen library encoded in `data` (see `to_bytes()`)."""
+        rv = cls()
+        rv._load(data)
+        return rv
+
+    def save(self, path):
+        """Write the (encoded) library to a file."""
+        with open(path, 'wb') as f:
+            f.write(self.to_bytes())
+
+    @classmethod
+    def load(cls, path, mmap=False):
+        """Return a frozen library read from a file written by `save()`.
+
+        :param mmap: if True, the file is memory-mapped instead of being read
+                     (call `close()` to unmap it)
+
+        """
+        if not mmap:
+            with open(path, 'rb') as f:
+                return cls.from_bytes(f.read())
+        rv = cls()
+        with open(path, 'rb') as f:
+            rv._mmap = _mmap_file(f)
+        try:
+            rv._load(memoryview(rv._mmap))
+        except Exception:
+            rv.close()
+            raise
+        return rv
+
+    def close(self):
+        """Unmap the file of a library loaded with `mmap=True`.
+
+        The templates that were not decoded yet cannot be looked up afterwards.
+
+        """
+        if self._mmap is not None:
+            self._data.release()
+            self._mmap.close()
+            self._mmap = None
+
+    def _load(self, data):
+        n = self._header.size
+        if len(data) < n:
+            raise codec.DecodeError('The data are not a template library.')
+        magic, version, length = self._header.unpack(data[:n])
+        if magic != self.MAGIC:
+            raise codec.DecodeError('The data are not a template library.')
+        if version != self.VERSION:
+            msg = 'Unsupported version of the template library: {}'
+            raise codec.DecodeError(msg.format(version))
+        self._index = {key: (offset, size)
+                       for key, offset, size in codec.loads(data[n:n + length])}
+        self._offset = n + length
+        self._data = data
+        self._decoded = {}
+
+
+def _mmap_file(f):
+    return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
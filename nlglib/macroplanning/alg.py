@@ -3,6 +3,7 @@ import itertools
 import nltk
 from nltk.sem.logic import *
 
+from nlglib import metrics
 from nlglib.features import NEGATED
 from nlglib.macroplanning.struct import RhetRel, PredicateMsg, StringMsg, Document
 from nlglib.microplanning import NounPhrase, Word, Var
@@ -10,6 +11,7 @@ from nlglib.microplanning import NounPhrase, Word, Var
 expr = nltk.sem.Expression.fromstring
 
 
+@metrics.instrumented
 def preprocess_content(data, **_):
     if isinstance(data, str):
         formulas = [expr(f) for f in data.split(';') if f.strip()]
@@ -21,6 +23,7 @@ def preprocess_content(data, **_):
     return rv
 
 
+@metrics.instrumented
 def select_content(formulas, **_):
     rv = []
     for item in formulas:
@@ -28,6 +31,7 @@ def select_content(formulas, **_):
     return rv
 
 
+@metrics.instrumented
 def aggregate_content(items, **_):
     if isinstance(items, (list, tuple)):
         if len(items) > 1:
@@ -52,6 +56,7 @@ def aggregate_content(items, **_):
     return rv
 
 
+@metrics.instrumented
 def structure_content(items, **_):
     if isinstance(items, (list, tuple)):
         rv = Document(None, *items)
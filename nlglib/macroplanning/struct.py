@@ -2,6 +2,7 @@ import inspect
 
 from nlglib.features import category, NEGATED
 from nlglib.microplanning import String, Element
+from nlglib.microplanning.traversal import iter_elements
 
 
 class SignatureError(Exception):
@@ -20,6 +21,8 @@ class Document:
     """
 
     category = category.DOCUMENT
+    # traversed but not yielded by `elements()`
+    _transparent = True
 
     def __init__(self, title, *sections):
         """Create a new `Document` with `title` and zero or more `sections`.
@@ -69,16 +72,14 @@ class Document:
 
     def elements(self, recursive=False, itself=None):
         """ Return a generator to iterate through the elements. """
-        if self.title is not None:
-            if recursive:
-                yield from self.title.elements(recursive, itself)
-            else:
-                yield self.title
-        for s in self.sections:
-            if recursive:
-                yield from s.elements(recursive, itself)
-            else:
-                yield s
+        if recursive:
+            return iter_elements(self, itself)
+        return iter(self._children())
+
+    def _children(self):
+        rv = [] if self.title is None else [self.title]
+        rv.extend(self.sections)
+        return rv
 
     # TODO: use visitor and match with simplenlg?
     def to_xml(self, depth=0, indent='  '):
@@ -109,6 +110,7 @@ class Paragraph:
     """
 
     category = category.PARAGRAPH
+    _transparent = True
 
     def __init__(self, *sentences):
         """Create a new `Paragraph` with zero or more `sentences`.
@@ -144,11 +146,12 @@ class Paragraph:
 
     def elements(self, recursive=False, itself=None):
         """ Return a generator to iterate through the elements. """
-        for s in self.sentences:
-            if recursive:
-                yield from s.elements(recursive, itself)
-            else:
-                yield s
+        if recursive:
+            return iter_elements(self, itself)
+        return iter(list(self.sentences))
+
+    def _children(self):
+        return list(self.sentences)
 
     # TODO: use visitor and match with simplenlg?
     def to_xml(self, depth=0, indent='  '):
@@ -181,6 +184,7 @@ class RhetRel:
     """
 
     category = category.RST
+    _transparent = True
     phrases = ['']
     element_order = ['nucleus', 'satellite']
     is_abstract = True  # subclasses should override this
@@ -233,8 +237,16 @@ class RhetRel:
         return self.nuclei[0]
 
     def elements(self, recursive=False, itself=None):
+        if recursive:
+            return iter_elements(self, itself)
+        return self._elements(itself)
+
+    def _elements(self, itself):
         for x in self.order:
-            yield from x.elements(recursive, itself)
+            yield from x.elements(False, itself)
+
+    def _children(self):
+        return list(self.order)
 
     def to_xml(self, lvl=0, indent='  '):
         spaces = indent * lvl
@@ -331,6 +343,9 @@ class MsgSpec:
         if recursive or itself:
             yield self
 
+    def _children(self):
+        return None
+
 
 class StringMsg(MsgSpec):
     """ Use this as a simple message that contains canned text. """
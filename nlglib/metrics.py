@@ -0,0 +1,341 @@
+"""This module contains the instrumentation of the library.
+
+When enabled, the library records the wall time, the number of calls
+and (optionally) the memory allocated by
+
+* the macroplanning functions (eg `preprocess_content` or `select_content`),
+* the dispatch targets of `Lexicaliser`, `SentenceAggregator` and
+  the realisers (eg `Lexicaliser.rst_relation` or `Realiser.element`),
+* the stages of a `nlglib.pipeline.Pipeline` (by the name of the stage) and
+* the requests sent to the SimpleNLG server (`SimplenlgClient.xml_request`
+  and `AsyncSimplenlgClient.xml_request`); the number of requests, retries
+  and bytes sent and received are counted as `simplenlg.requests`,
+  `simplenlg.retries`, `simplenlg.bytes_sent` and `simplenlg.bytes_received`;
+  the time a SimpleNLG server took to start accepting connections
+  is recorded as `SimpleNLGServer.startup`.
+
+The measurements are passed to a sink -- an instance of `MetricsSink`.
+The module provides `MemorySink` (keeps totals), `LoggingSink` (logs each
+measurement) and `PrometheusSink` (keeps totals and writes them to a file
+in the Prometheus text format, eg for the textfile collector of node_exporter).
+
+Example:
+
+    with metrics.recording() as sink:
+        realise(lex(formula_to_rst(expr('Play(john, guitar)'))))
+    print(sink.report())
+
+The instrumentation is disabled by default; the instrumented code then only
+checks that `metrics.sink` is None. The sink is global (shared by all threads)
+but not by processes: each worker process of a pipeline records into
+its own copy of the sink.
+
+The time of a call includes the time of the calls it makes. A recursive
+call (eg `Lexicaliser.rst_relation` lexicalising a nested relation)
+is counted but its time is included only in the outermost call.
+The allocated memory is the difference of the memory traced by `tracemalloc`
+before and after the call (ie the memory retained by the call, such as its
+result). Tracing the allocations slows the program down considerably so it
+has to be enabled explicitly.
+
+"""
+
+import functools
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+import tracemalloc
+
+from contextlib import contextmanager
+
+__all__ = ['MetricsSink', 'MemorySink', 'LoggingSink', 'PrometheusSink', 'Timing',
+           'enable', 'disable', 'recording', 'call', 'instrumented', 'increment']
+
+# the current sink or None if the instrumentation is disabled
+sink = None
+# True if the allocations are measured
+_allocations = False
+# True if `enable()` started tracemalloc (and `disable()` should stop it)
+_started_tracing = False
+# the names of the calls in progress in the current thread (name -> depth)
+_local = threading.local()
+
+
+class MetricsSink(object):
+    """The interface of sinks; the methods do nothing. """
+
+    def observe(self, name, seconds, allocated=None, recursive=False):
+        """Record a call of `name` that took `seconds`.
+
+        :param allocated: the number of bytes allocated by the call
+            or None if allocations are not measured
+        :param recursive: True if the call was made (directly or indirectly)
+            by another call of `name`; its time and allocations are
+            included in the outer call
+
+        """
+
+    def increment(self, name, value=1):
+        """Add `value` to the counter `name`. """
+
+    def flush(self):
+        """Write the recorded data (if the sink writes them somewhere). """
+
+
+class Timing(object):
+    """The totals of the calls of one name. """
+
+    __slots__ = ('calls', 'seconds', 'allocated')
+
+    def __init__(self):
+        self.calls = 0
+        self.seconds = 0.0
+        self.allocated = 0
+
+    def __repr__(self):
+        return '<Timing calls={0} seconds={1:.6f} allocated={2}>'.format(
+            self.calls, self.seconds, self.allocated)
+
+
+class MemorySink(MetricsSink):
+    """A sink that keeps the totals in memory.
+
+    `timings` maps the names of calls to `Timing` instances
+    and `counters` maps the names of counters to their values.
+
+    """
+
+    def __init__(self):
+        self.timings = {}
+        self.counters = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name, seconds, allocated=None, recursive=False):
+        with self._lock:
+            timing = self.timings.get(name)
+            if timing is None:
+                timing = self.timings[name] = Timing()
+            timing.calls += 1
+            if not recursive:
+                timing.seconds += seconds
+                if allocated is not None:
+                    timing.allocated += allocated
+
+    def increment(self, name, value=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def clear(self):
+        with self._lock:
+            self.timings.clear()
+            self.counters.clear()
+
+    def snapshot(self):
+        """Return a copy of the totals as a pair of dicts
+        (name -> (calls, seconds, allocated), name -> value).
+
+        """
+        with self._lock:
+            timings = {name: (t.calls, t.seconds, t.allocated) for name, t in self.timings.items()}
+            return timings, dict(self.counters)
+
+    def report(self):
+        """Return a table of the totals ordered by time (and the counters). """
+        timings, counters = self.snapshot()
+        timings = sorted(timings.items(), key=lambda x: (-x[1][1], x[0]))
+        counters = sorted(counters.items())
+        width = max([len(name) for name, _ in timings + counters] + [4])
+        lines = ['{0:<{w}} {1:>10} {2:>12} {3:>14}'.format(
+            'name', 'calls', 'seconds', 'allocated', w=width)]
+        for name, (calls, seconds, allocated) in timings:
+            lines.append('{0:<{w}} {1:>10} {2:>12.6f} {3:>14}'.format(
+                name, calls, seconds, allocated, w=width))
+        for name, value in counters:
+            lines.append('{0:<{w}} {1:>10}'.format(name, value, w=width))
+        return '\n'.join(lines)
+
+
+class LoggingSink(MetricsSink):
+    """A sink that logs each measurement. """
+
+    def __init__(self, logger=None, level=logging.INFO):
+        self.logger = logger or logging.getLogger(__name__)
+        self.level = level
+
+    def observe(self, name, seconds, allocated=None, recursive=False):
+        if not self.logger.isEnabledFor(self.level):
+            return
+        if allocated is None:
+            self.logger.log(self.level, '%s took %.6fs%s',
+                            name, seconds, ' (recursive)' if recursive else '')
+        else:
+            self.logger.log(self.level, '%s took %.6fs and allocated %d bytes%s',
+                            name, seconds, allocated, ' (recursive)' if recursive else '')
+
+    def increment(self, name, value=1):
+        self.logger.log(self.level, '%s += %s', name, value)
+
+
+class PrometheusSink(MemorySink):
+    """A sink that keeps the totals in memory and writes them to the file
+    `path` in the Prometheus text format when `flush()` is called.
+
+    The calls are exposed as `<prefix>_calls_total`, `<prefix>_seconds_total`
+    and `<prefix>_allocated_bytes_total` with the label `name`;
+    each counter is exposed as `<prefix>_<name>_total` (with the characters
+    that are not allowed in metric names replaced by underscores).
+
+    """
+
+    def __init__(self, path, prefix='nlglib'):
+        super().__init__()
+        self.path = path
+        self.prefix = prefix
+
+    def render(self):
+        """Return the totals in the Prometheus text format. """
+        timings, counters = self.snapshot()
+        timings = sorted(timings.items())
+        counters = sorted(counters.items())
+        lines = []
+        metrics = (
+            ('calls_total', 'The number of calls.'),
+            ('seconds_total', 'The wall time of the calls in seconds.'),
+            ('allocated_bytes_total', 'The memory allocated by the calls in bytes.'),
+        )
+        for i, (suffix, description) in enumerate(metrics):
+            metric = '{0}_{1}'.format(self.prefix, suffix)
+            lines.append('# HELP {0} {1}'.format(metric, description))
+            lines.append('# TYPE {0} counter'.format(metric))
+            for name, values in timings:
+                lines.append('{0}{{name="{1}"}} {2!r}'.format(
+                    metric, _escape_label(name), values[i]))
+        for name, value in counters:
+            metric = '{0}_{1}_total'.format(self.prefix, re.sub(r'[^a-zA-Z0-9_]', '_', name))
+            lines.append('# TYPE {0} counter'.format(metric))
+            lines.append('{0} {1!r}'.format(metric, value))
+        return '\n'.join(lines) + '\n'
+
+    def flush(self):
+        """Write the totals to `self.path` (atomically -- the file is replaced). """
+        text = self.render()
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix='.nlglib', suffix='.prom')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(text)
+            os.replace(tmp, self.path)
+        except BaseException:
+            os.remove(tmp)
+            raise
+
+
+def _escape_label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def enable(new_sink=None, allocations=False):
+    """Start recording into `new_sink` (a new `MemorySink` by default) and return it.
+
+    :param bool allocations: if True, measure the allocated memory
+        using `tracemalloc` (which is started if it is not tracing yet)
+
+    """
+    global sink, _allocations, _started_tracing
+    if new_sink is None:
+        new_sink = MemorySink()
+    if allocations and not tracemalloc.is_tracing():
+        tracemalloc.start()
+        _started_tracing = True
+    _allocations = allocations
+    sink = new_sink
+    return new_sink
+
+
+def disable():
+    """Stop recording, flush the current sink and return it. """
+    global sink, _allocations, _started_tracing
+    previous, sink = sink, None
+    _allocations = False
+    if _started_tracing:
+        tracemalloc.stop()
+        _started_tracing = False
+    if previous is not None:
+        previous.flush()
+    return previous
+
+
+@contextmanager
+def recording(new_sink=None, allocations=False):
+    """Enable the instrumentation in a with block and yield the sink.
+
+    The previous sink (if any) is restored when the block exits.
+
+    """
+    previous, previous_allocations = sink, _allocations
+    rv = enable(new_sink, allocations)
+    try:
+        yield rv
+    finally:
+        disable()
+        if previous is not None:
+            enable(previous, previous_allocations)
+
+
+def call(name, fn, *args, **kwargs):
+    """Call `fn(*args, **kwargs)` and record the call as `name`.
+
+    The caller is expected to check that the instrumentation is enabled:
+
+        if metrics.sink is not None:
+            return metrics.call('Lexicaliser.element', fn, msg, **kwargs)
+        return fn(msg, **kwargs)
+
+    """
+    try:
+        active = _local.active
+    except AttributeError:
+        active = _local.active = {}
+    depth = active.get(name, 0)
+    active[name] = depth + 1
+    allocations = _allocations and tracemalloc.is_tracing()
+    if allocations:
+        before = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        elapsed = time.perf_counter() - start
+        allocated = tracemalloc.get_traced_memory()[0] - before if allocations else None
+        active[name] = depth
+        current = sink
+        if current is not None:
+            current.observe(name, elapsed, allocated, depth > 0)
+
+
+def increment(name, value=1):
+    """Add `value` to the counter `name` if the instrumentation is enabled. """
+    current = sink
+    if current is not None:
+        current.increment(name, value)
+
+
+def instrumented(fn=None, name=None):
+    """Decorate a function so that its calls are recorded (as `name` or
+    the name of the function) when the instrumentation is enabled.
+
+    """
+    if fn is None:
+        return functools.partial(instrumented, name=name)
+    name = name or fn.__qualname__
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        if sink is None:
+            return fn(*args, **kwargs)
+        return call(name, fn, *args, **kwargs)
+
+    return wrapper
@@ -1,5 +1,6 @@
 """This package contains structures and algorithms for microplanning."""
 
 from nlglib.microplanning.struct import *
+from nlglib.microplanning.traversal import *
 from nlglib.microplanning.visitors import *
 from nlglib.microplanning.factories import *
@@ -5,19 +5,23 @@
 # TODO: create module `element_algebra` and pud add/iadd into it
 
 import collections
+import hashlib
 import json
 
 from copy import deepcopy
 from functools import wraps
+from operator import attrgetter
 
 from nlglib.features import NON_COMPARABLE_FEATURES, TRANSFERABLE_FEATURES
 from nlglib.features import FeatureSet, DISCOURSE_FUNCTION, category
+from nlglib.microplanning.traversal import traverse, iter_elements, LEAVES
 
 _sentinel = object()
 
 __all__ = [
     'Element',
     'ElementList',
+    'ElementIndex',
     'Var',
     'String',
     'Word',
@@ -49,22 +53,106 @@ __all__ = [
 ]
 
 
+# attributes implemented as properties backed by `_<name>` fields
+_PROPERTIES = frozenset([
+    'features', 'id', 'value', 'word', 'pos', 'conj', 'coords',
+    'front_modifiers', 'premodifiers', 'complements', 'postmodifiers',
+])
+
+
+def _hashed_attribute(name):
+    """Return a property that stores its value in `_<name>`
+    and resets the cached hash of the element when set.
+
+    """
+    field = '_' + name
+
+    def fset(self, value):
+        object.__setattr__(self, field, value)
+        if self.hash != -1:
+            self._invalidate_hash()
+
+    return property(attrgetter(field), fset)
+
+
+def _slot_names(cls):
+    """Return the names of the slots of `cls` (including the inherited ones)."""
+    rv = cls.__dict__.get('_slot_names_cache')
+    if rv is None:
+        rv = []
+        for klass in reversed(cls.__mro__):
+            for name in klass.__dict__.get('__slots__', ()):
+                if name not in rv and name != '__dict__':
+                    rv.append(name)
+        rv = tuple(rv)
+        type.__setattr__(cls, '_slot_names_cache', rv)
+    return rv
+
+
 # noinspection PyShadowingBuiltins
 class Element(object):
     """A base class representing an NLG element.
         Aside for providing a base class for other kinds of NLG elements,
         the class also implements basic functionality for elements.
 
+    The element classes use `__slots__` to keep the trees small.
+    Other attributes are stored in a `__dict__`, which is only created
+    when such an attribute is set.
+
     """
 
+    # parent: the element containing this element
+    # hash: cached structural hash; -1 means not computed (CPython never returns -1 from hash)
+    # _cow: True if the constituents may be shared with a clone (see `clone()`)
+    __slots__ = ('_features', 'parent', '_id', 'hash', '_cow', '__dict__')
+
     category = category.ELEMENT
+    # names of the fields holding the constituents (elements or element lists)
+    _constituents = ()
+    # containers are traversed but not yielded (see `nlglib.microplanning.traversal`)
+    _transparent = False
+
+    id = _hashed_attribute('id')
 
     def __init__(self, features=None, parent=None, id=None):
+        self._init_fields()
         self.features = FeatureSet()
         self.features.update(features)
         self.parent = parent
         self.id = id
+
+    def _init_fields(self):
+        """Set the fields to their default values before the element is populated
+        (by `__init__()` or `__setstate__()`).
+
+        """
+        self.parent = None
         self.hash = -1
+        self._cow = False
+        self._id = None
+
+    def __getstate__(self):
+        state = {}
+        for k in _slot_names(type(self)):
+            if k in ('hash', '_cow') or not hasattr(self, k):
+                continue
+            v = getattr(self, k)
+            # use the public names of attributes implemented as properties
+            if k.startswith('_') and k[1:] in _PROPERTIES:
+                k = k[1:]
+            state[k] = v
+        state.update(self.__dict__)
+        return state
+
+    def __setstate__(self, state):
+        self._init_fields()
+        for k, v in state.items():
+            # accept both the attribute names and the names of the underlying fields
+            if k.startswith('_') and k[1:] in _PROPERTIES:
+                k = k[1:]
+            if k in ('hash', '_cow'):
+                continue
+            setattr(self, k, v)
 
     def __copy__(self):
         rv = self.__class__(features=self.features, parent=self.parent, id=self.id)
@@ -78,22 +166,143 @@ class Element(object):
         rv.parent = memo.get(id(self.parent), None)
         return rv
 
+    def clone(self):
+        """Return a copy-on-write copy of the element.
+
+        Only the element itself and its features are copied; the constituents
+        are shared by the copy and the original. Whichever of the two accesses
+        the constituents through the attributes (e.g., `head` or `complements`)
+        or replaces them first gets private clones of its direct constituents,
+        so the copying proceeds lazily, level by level, and the subtrees that
+        are never accessed are never copied. Hashing and comparison
+        do not trigger the copying.
+
+        Note that references to constituents obtained before cloning
+        are not protected: modifying them affects both trees.
+
+        """
+        rv = object.__new__(self.__class__)
+        for k in _slot_names(self.__class__):
+            if hasattr(self, k):
+                object.__setattr__(rv, k, getattr(self, k))
+        if self.__dict__:
+            rv.__dict__.update(self.__dict__)
+        rv.parent = None
+        rv.features = self._features.copy()
+        rv.hash = self.hash
+        if self._constituents:
+            self._cow = rv._cow = True
+        return rv
+
+    def _own_list(self, field):
+        """Return the list stored in `field` after unsharing the element.
+
+        Phrases share one empty list (`_NO_ELEMENTS`) until the list is accessed
+        through the attributes (e.g., `premodifiers`); the shared list
+        is replaced by a new list here.
+
+        """
+        if self._cow:
+            self._unshare()
+        value = getattr(self, field)
+        if value is _NO_ELEMENTS:
+            value = ElementList(parent=self)
+            object.__setattr__(self, field, value)
+        return value
+
+    def _unshare(self):
+        """Replace the constituents shared with a clone by private clones."""
+        self._cow = False
+        for field in self._constituents:
+            value = getattr(self, field)
+            if isinstance(value, ElementList):
+                setattr(self, field, value.clone(parent=self))
+            elif isinstance(value, Element):
+                value = value.clone()
+                value.parent = self
+                setattr(self, field, value)
+
     def __bool__(self):
         """Because Element is abstract, it will evaluate to false. """
         return False
 
     def __eq__(self, other):
+        if self is other:
+            return True
         return (
-            isinstance(other, Element) and self.id == other.id and
-            self.category == other.category and
-            comparable_features(self.features) == comparable_features(other.features)
+            isinstance(other, Element) and hash(self) == hash(other) and
+            self.id == other.id and self.category == other.category and
+            _comparable_features_equal(self.features, other.features)
         )
 
     def __hash__(self):
         if self.hash == -1:
-            self.hash = hash(str(self))
+            self.hash = hash(self._hash_key())
         return self.hash
 
+    def _hash_key(self):
+        """Return a tuple of values that determine the hash of the element.
+
+        Subclasses extend the key with their values and the hashes
+        of their children so that the hash is computed bottom-up.
+        The key has to contain only the values compared by `__eq__`.
+
+        """
+        return self.category, self.id, _features_hash(self._features)
+
+    def fingerprint(self):
+        """Return a canonical digest (a hex string) of the structure of the element.
+
+        Unlike `hash()`, the fingerprint is stable across processes and it is
+        built from all constituents (see `_constituents`) and all features
+        (including the non-comparable ones)
+        but not the ids of the elements (except for `Var`) because they
+        do not affect realisation. Elements with the same fingerprint
+        are realised to the same text.
+
+        """
+        parts = []
+        self._fingerprint(parts)
+        return hashlib.sha1('\x1f'.join(parts).encode('utf-8')).hexdigest()
+
+    def _fingerprint(self, parts):
+        """Append the strings describing the element to `parts`."""
+        parts.append(type(self).__name__)
+        parts.append(self.category)
+        parts.extend(sorted('{0}={1}'.format(f.name, f.value) for f in self._features))
+        for field in self._constituents:
+            parts.append(field)
+            value = getattr(self, field)
+            if isinstance(value, (Element, ElementList)):
+                value._fingerprint(parts)
+            else:
+                parts.append(repr(value))
+        parts.append(')')
+
+    def _invalidate_hash(self):
+        """Reset the cached hash of the element and of all its ancestors.
+
+        The hash is invalidated by changes of the features, by the setters
+        of constituents and by the `ElementList` mutators. An element can have
+        a cached hash only if all its children have one so the walk can stop
+        at the first ancestor without a cached hash.
+
+        """
+        e = self
+        while e is not None and e.hash != -1:
+            e.hash = -1
+            e = e.parent
+
+    @property
+    def features(self):
+        return self._features
+
+    @features.setter
+    def features(self, value):
+        self._features = value
+        value.on_change = self._invalidate_hash
+        self._invalidate_hash()
+
     def __repr__(self):
         from . import visitors
         v = visitors.ReprVisitor()
@@ -143,8 +352,10 @@ class Element(object):
 
     @classmethod
     def from_dict(cls, dct):
-        o = cls(None, None, None)
-        o.__dict__.update(dct)
+        o = cls.__new__(cls)
+        o.__setstate__(dct)
+        if not hasattr(o, '_features'):
+            o.features = FeatureSet()
         return o
 
     @classmethod
@@ -182,12 +393,36 @@ class Element(object):
         :param str itself: yield `self` as one of the elements; values in (None, 'first', 'last')
 
         """
-        if itself or recursive and self.category != category.ELEMENT:
+        if recursive:
+            return iter_elements(self, itself)
+        return self._elements(itself)
+
+    def _elements(self, itself):
+        """Yield the direct constituents of the element (see `elements()`)."""
+        if itself:
             yield self
 
+    def _children(self):
+        """Return the constituents of the element in the order of `elements()`
+        or None if the element is a leaf.
+
+        """
+        if not self._constituents:
+            return None
+        if self._cow:
+            self._unshare()
+        rv = []
+        for field in self._constituents:
+            value = getattr(self, field)
+            if isinstance(value, ElementList):
+                rv.extend(value.data)
+            elif value is not None:
+                rv.append(value)
+        return rv
+
     def arguments(self):
         """Return any arguments (vars) from the element as a list. """
-        return [x for x in self.elements(recursive=True) if x.category == category.VAR]
+        return [x for x in traverse(self, LEAVES) if x.category == category.VAR]
 
     def replace(self, one, another, key=lambda x: x):
         """Replace the first occurrence of `one` by `another`.
@@ -200,14 +435,72 @@ class Element(object):
         """
         return False  # basic implementation does nothing
 
+    def argument_paths(self):
+        """Return the arguments (vars) of the element with their paths
+        as a list of (path, var) pairs in the order of `arguments()`.
+
+        A path is a tuple of (field, index) steps leading from the element
+        to the argument, where `index` is None unless the field holds a list.
+        The paths remain valid for clones of the element and can be passed
+        to `replace_at()` to avoid searching the tree.
+
+        """
+        rv = []
+        self._collect_argument_paths((), rv)
+        return rv
+
+    def _collect_argument_paths(self, path, acc):
+        if self.category == category.VAR:
+            acc.append((path, self))
+            return
+        for field in self._constituents:
+            value = getattr(self, field)
+            if isinstance(value, ElementList):
+                for i, o in enumerate(value):
+                    o._collect_argument_paths(path + ((field, i),), acc)
+            elif isinstance(value, Element):
+                value._collect_argument_paths(path + ((field, None),), acc)
+
+    def replace_at(self, path, another):
+        """Replace the constituent at `path` (see `argument_paths()`) by `another`.
+
+        The replacement follows the same rules as `replace()`
+        but the constituent is not searched for.
+
+        :param path: a path to a constituent of the element
+        :param another: a replacement element; will be raised to element
+        :returns: True if replacement occurred; False otherwise
+
+        """
+        if not path:
+            return False
+        node = self
+        for field, index in path[:-1]:
+            if node._cow:
+                node._unshare()
+            node = getattr(node, field)
+            if index is not None:
+                node = node[index]
+        field, index = path[-1]
+        if node._cow:
+            node._unshare()
+        return node._replace_constituent(field, index, raise_to_element(another))
+
+    def _replace_constituent(self, field, index, another):
+        """Replace the constituent stored in `field` (at `index` if the field
+        holds a list) by `another`.
+
+        """
+        return False  # basic implementation does nothing
+
     def replace_argument(self, id, replacement):
         """Replace an argument with given `id` by `replacement`
         if such argument exists.
 
         """
-        for a in self.arguments():
+        for path, a in self.argument_paths():
             if a.id == id:
-                return self.replace(a, replacement)
+                return self.replace_at(path, replacement)
         return False
 
     def replace_arguments(self, **kwargs):
@@ -215,8 +508,14 @@ class Element(object):
         by the corresponding values. 
         
         """
-        for k, v in kwargs.items():
-            self.replace_argument(k, v)
+        # the first argument with each id; replaced from the last one
+        # so that the replacements do not affect the remaining paths
+        paths = {}
+        for path, a in self.argument_paths():
+            if a.id in kwargs and a.id not in paths:
+                paths[a.id] = path
+        for id, path in sorted(paths.items(), key=lambda x: x[1], reverse=True):
+            self.replace_at(path, kwargs[id])
 
     @property
     def string(self):
@@ -246,8 +545,157 @@ def str_or_element(fn):
     return helper
 
 
+class ElementIndex(object):
+    """An index of the elements of a tree by their ids (including the ids of `Var`s).
+
+    The index allows replacing an element with a given id without searching
+    the tree: the element is looked up by its id and its position is found
+    by following the `parent` links up to the root, which takes time
+    proportional to the depth of the element. Creating the index sets
+    the `parent` links of all elements in the tree.
+
+    The index is kept up to date by its own `replace()` and `replace_argument()`
+    methods. If the tree is modified in other ways, the index can become
+    outdated; when an id is not found in the tree, the index is rebuilt
+    once before giving up (which takes the same time as searching the tree).
+
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self._ids = {}
+        self.rebuild()
+
+    def rebuild(self):
+        """Index the tree again (and reset the `parent` links). """
+        self._ids = {}
+        self._add(self.root, self.root.parent)
+
+    def _add(self, node, parent):
+        ids = self._ids
+        stack = [(node, parent)]
+        while stack:
+            node, parent = stack.pop()
+            if not isinstance(node, ElementList):
+                if parent is not None:
+                    node.parent = parent
+                if node.id is not None:
+                    ids.setdefault(node.id, []).append(node)
+                parent = node
+            children = node._children()
+            if children:
+                stack.extend((child, parent) for child in reversed(children))
+
+    def _remove(self, node):
+        for x in traverse(node):
+            if x.id is not None:
+                elements = self._ids.get(x.id, [])
+                for i, o in enumerate(elements):
+                    if o is x:
+                        del elements[i]
+                        break
+
+    def path(self, element):
+        """Return the path (see `Element.argument_paths()`) from the root
+        to `element` or None if `element` is not in the tree.
+
+        """
+        path = []
+        node = element
+        while node is not self.root:
+            parent = node.parent
+            if parent is None:
+                return None
+            step = _constituent_slot(parent, node)
+            if step is None:
+                return None
+            path.append(step)
+            node = parent
+        path.reverse()
+        return tuple(path)
+
+    def find(self, id, category=None):
+        """Return the first element with `id` (and `category` if given)
+        and its path or (None, None) if there is no such element.
+
+        """
+        rv = self._find(id, category)
+        if rv[0] is None:
+            # the tree could have been modified after indexing
+            self.rebuild()
+            rv = self._find(id, category)
+        return rv
+
+    def _find(self, id, category):
+        for element in self._ids.get(id, ()):
+            if category is not None and element.category != category:
+                continue
+            path = self.path(element)
+            if path is not None:
+                return element, path
+        return None, None
+
+    def get(self, id, default=None):
+        """Return the first element with `id` or `default`. """
+        element, _ = self.find(id)
+        return default if element is None else element
+
+    def __contains__(self, id):
+        return self.find(id)[0] is not None
+
+    def replace(self, id, another, category=None):
+        """Replace the first element with `id` (and `category` if given) by `another`.
+
+        :returns: True if replacement occurred; False otherwise
+
+        """
+        element, path = self.find(id, category)
+        if element is None:
+            return False
+        if not path:  # the root cannot be replaced in place
+            return False
+        parent = element.parent
+        field, index = path[-1]
+        size = None if index is None else len(getattr(parent, field))
+        if not self.root.replace_at(path, another):
+            return False
+        self._remove(element)
+        # index the new occupant of the slot (setters can wrap `another`)
+        new = getattr(parent, field)
+        if index is not None:
+            if len(new) < size:  # e.g., a coordinate replaced by an empty element
+                return True
+            new = new[index]
+        self._add(new, parent)
+        return True
+
+    def replace_argument(self, id, replacement):
+        """Replace the first argument (`Var`) with `id` by `replacement`.
+
+        :returns: True if replacement occurred; False otherwise
+
+        """
+        return self.replace(id, replacement, category.VAR)
+
+
+def _constituent_slot(parent, element):
+    """Return the (field, index) step leading from `parent` to `element` or None."""
+    if parent._cow:
+        return None
+    for field in parent._constituents:
+        value = getattr(parent, field, None)
+        if value is element:
+            return field, None
+        if isinstance(value, ElementList):
+            for i, o in enumerate(value.data):
+                if o is element:
+                    return field, i
+    return None
+
+
 class ElementList(collections.UserList):
     category = category.ELEMENT_LIST
+    _transparent = True
 
     def __init__(self, lst=None, parent=None, features=FeatureSet()):
         super().__init__()
@@ -257,21 +705,55 @@ class ElementList(collections.UserList):
         for o in lst or []:
             self.append(o)
 
+    def _invalidate_hash(self):
+        """Reset the cached hash of the element that owns the list."""
+        parent = self.parent
+        if parent is not None and parent.hash != -1:
+            parent._invalidate_hash()
+
     def append(self, item):
         item = raise_to_element(item)
         item.parent = self.parent
         item.features.update(self.features)
         super().append(item)
+        self._invalidate_hash()
 
     def insert(self, i, item):
         item = raise_to_element(item)
         item.parent = self.parent
         item.features.update(self.features)
         super().insert(i, item)
+        self._invalidate_hash()
 
     def remove(self, item):
         raised_item = raise_to_element(item)
         super().remove(raised_item)
+        self._invalidate_hash()
+
+    def extend(self, other):
+        for item in other:
+            self.append(item)
+
+    def pop(self, i=-1):
+        rv = super().pop(i)
+        self._invalidate_hash()
+        return rv
+
+    def clear(self):
+        super().clear()
+        self._invalidate_hash()
+
+    def reverse(self):
+        super().reverse()
+        self._invalidate_hash()
+
+    def sort(self, *args, **kwargs):
+        super().sort(*args, **kwargs)
+        self._invalidate_hash()
+
+    def __delitem__(self, i):
+        super().__delitem__(i)
+        self._invalidate_hash()
 
     def __contains__(self, item):
         raised_item = raise_to_element(item)
@@ -295,6 +777,26 @@ class ElementList(collections.UserList):
         value.parent = self.parent
         value.features.update(self.features)
         super().__setitem__(i, value)
+        self._invalidate_hash()
+
+    def _fingerprint(self, parts):
+        """Append the strings describing the list to `parts` (see `Element.fingerprint()`)."""
+        parts.append('[')
+        for o in self.data:
+            o._fingerprint(parts)
+        parts.append(']')
+
+    def clone(self, parent=None):
+        """Return a copy of the list containing copy-on-write clones
+        (see `Element.clone()`) of the elements.
+
+        """
+        rv = self.__class__(parent=parent, features=self.features)
+        for o in self.data:
+            o = o.clone()
+            o.parent = parent
+            rv.data.append(o)
+        return rv
 
     # noinspection PyArgumentList
     def __deepcopy__(self, memo):
@@ -330,11 +832,11 @@ class ElementList(collections.UserList):
 
         """
         if recursive:
-            for e in self:
-                yield from e.elements(recursive, itself)
-        else:
-            for e in self:
-                yield e
+            return iter_elements(self, itself)
+        return iter(self.data)
+
+    def _children(self):
+        return list(self.data)
 
     def update_parents(self, parent=_sentinel):
         if parent is not _sentinel:
@@ -343,6 +845,42 @@ class ElementList(collections.UserList):
             x.update_parents(parent=parent)
 
 
+class _NoElements(ElementList):
+    """An empty element list shared by the phrases without modifiers
+    (or complements) until they get a list of their own.
+
+    The list cannot be modified and it has no parent.
+
+    """
+
+    parent = property(lambda self: None, lambda self, value: None)
+
+    def _read_only(self, *args, **kwargs):
+        raise TypeError('The shared empty list of elements cannot be modified.')
+
+    append = insert = remove = extend = pop = clear = reverse = sort = _read_only
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = _read_only
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        # unpickle as the shared instance
+        return '_NO_ELEMENTS'
+
+    def clone(self, parent=None):
+        return self
+
+    def update_parents(self, parent=_sentinel):
+        pass
+
+
+_NO_ELEMENTS = _NoElements()
+
+
 class Var(Element):
     """An element used as a place-holder in a sentence. The purpose of this
         element is to make replacing arguments easier. For example, in a plan
@@ -354,7 +892,10 @@ class Var(Element):
 
     """
 
+    __slots__ = ('_value',)
+
     category = category.VAR
+    _constituents = ('_value',)
 
     def __init__(self, id=None, obj=None, features=None, parent=None):
         super().__init__(features, parent, id)
@@ -366,12 +907,20 @@ class Var(Element):
         return True
 
     def __eq__(self, other):
-        return super().__eq__(other) and self.value == other.value
+        return super().__eq__(other) and self._value == other._value
 
-    def __hash__(self):
-        if self.hash == -1:
-            self.hash = hash(str(self))
-        return self.hash
+    __hash__ = Element.__hash__
+
+    def _hash_key(self):
+        return Element._hash_key(self), hash(self._value)
+
+    def _fingerprint(self, parts):
+        parts.append(repr(self.id))
+        super()._fingerprint(parts)
+
+    def _children(self):
+        # the value is not traversed; vars are the leaves of templates
+        return None
 
     def __copy__(self):
         return self.__class__(self.id, self.value, self.features, self.parent)
@@ -384,6 +933,21 @@ class Var(Element):
         rv.parent = memo.get(id(self.parent), None)
         return rv
 
+    @property
+    def value(self):
+        if self._cow:
+            self._unshare()
+        return self._value
+
+    @value.setter
+    def value(self, value):
+        if self._cow:
+            self._unshare()
+        if isinstance(value, Element):
+            value.parent = self
+        self._value = value
+        self._invalidate_hash()
+
     def set_value(self, val):
         if val is None: val = Word(str(self.id), 'NOUN')
         self.value = String(val) if isinstance(val, str) else val
@@ -397,7 +961,10 @@ class Var(Element):
 class String(Element):
     """String is a basic element representing canned text. """
 
+    __slots__ = ('_value',)
+
     category = category.STRING
+    value = _hashed_attribute('value')
 
     def __init__(self, value='', features=None, parent=None, id=None):
         super().__init__(features, parent, id)
@@ -410,10 +977,14 @@ class String(Element):
     def __eq__(self, other):
         return super().__eq__(other) and self.value == other.value
 
-    def __hash__(self):
-        if self.hash == -1:
-            self.hash = hash(str(self))
-        return self.hash
+    __hash__ = Element.__hash__
+
+    def _hash_key(self):
+        return Element._hash_key(self), self.value
+
+    def _fingerprint(self, parts):
+        super()._fingerprint(parts)
+        parts.append(self.value)
 
     def __copy__(self):
         return self.__class__(self.value, self.features, self.parent, self.id)
@@ -435,7 +1006,11 @@ class String(Element):
 class Word(Element):
     """Word represents word and its corresponding POS (Part-of-Speech) tag. """
 
+    __slots__ = ('_word', '_pos', 'do_inflection')
+
     category = category.WORD
+    word = _hashed_attribute('word')
+    pos = _hashed_attribute('pos')
 
     def __init__(self, word, pos=None, features=None, parent=None, id=None):
         super().__init__(features, parent, id)
@@ -450,10 +1025,15 @@ class Word(Element):
     def __eq__(self, other):
         return super().__eq__(other) and self.word == other.word and self.pos == other.pos
 
-    def __hash__(self):
-        if self.hash == -1:
-            self.hash = hash(str(self))
-        return self.hash
+    __hash__ = Element.__hash__
+
+    def _hash_key(self):
+        return Element._hash_key(self), self.word, self.pos
+
+    def _fingerprint(self, parts):
+        super()._fingerprint(parts)
+        parts.append(self.word)
+        parts.append(self.pos)
 
     def __copy__(self):
         # pos is in features
@@ -483,7 +1063,10 @@ class Coordination(Element):
     
     """
 
+    __slots__ = ('_coords', '_conj', 'coordinate_category')
+
     category = category.COORDINATION
+    _constituents = ('_coords', '_conj')
 
     def __init__(self, *coords, conj=None, features=None, parent=None, id=None):
         super().__init__(features, parent, id)
@@ -496,15 +1079,47 @@ class Coordination(Element):
             self.conj = String('and')
 
     def __len__(self):
-        return len(self.coords)
+        return len(self._coords)
 
     def __eq__(self, other):
-        return super().__eq__(other) and self.coords == other.coords
+        return (
+            super().__eq__(other) and self._conj == other._conj and
+            self._coords == other._coords
+        )
 
-    def __hash__(self):
-        if self.hash == -1:
-            self.hash = hash(str(self))
-        return self.hash
+    __hash__ = Element.__hash__
+
+    def _hash_key(self):
+        return Element._hash_key(self), hash(self._conj), tuple(map(hash, self._coords))
+
+    @property
+    def coords(self):
+        if self._cow:
+            self._unshare()
+        return self._coords
+
+    @coords.setter
+    def coords(self, value):
+        if self._cow:
+            self._unshare()
+        value.parent = self
+        self._coords = value
+        self._invalidate_hash()
+
+    @property
+    def conj(self):
+        if self._cow:
+            self._unshare()
+        return self._conj
+
+    @conj.setter
+    def conj(self, value):
+        if self._cow:
+            self._unshare()
+        if isinstance(value, Element):
+            value.parent = self
+        self._conj = value
+        self._invalidate_hash()
 
     def __copy__(self):
         return self.__class__(
@@ -540,7 +1155,7 @@ class Coordination(Element):
         return self
 
     def __bool__(self):
-        return bool(self.coords)
+        return bool(self._coords)
 
     @property
     def string(self):
@@ -581,31 +1196,25 @@ class Coordination(Element):
             #            'the same lexical category ({} but entering {}).')
             #     raise TypeError(msg.format(cat, self.coords[-1].cat))
 
-    def elements(self, recursive=False, itself=None):
-        """Return a generator yielding elements contained in the element
-
-        :param bool recursive: also include sub-elements of the contained elements
-        :param str itself: yield `self` as one of the elements; values in (None, 'first', 'last')
-
-        """
+    def _elements(self, itself):
         if itself == 'first':
             yield self
-
         for i, e in enumerate(self.coords, start=1):
             if i == len(self.coords) and self.conj:
-                if recursive:
-                    yield from self.conj.elements(recursive, itself)
-                else:
-                    if self.conj:
-                        yield self.conj
-            if recursive:
-                yield from e.elements(recursive, itself)
-            else:
-                yield e
-
+                yield self.conj
+            yield e
         if itself == 'last':
             yield self
 
+    def _children(self):
+        if self._cow:
+            self._unshare()
+        rv = list(self._coords.data)
+        # the conjunction precedes the last coordinate
+        if rv and self._conj:
+            rv.insert(len(rv) - 1, self._conj)
+        return rv
+
     def replace(self, one, another, key=lambda x: x):
         """Replace first occurrence of `one` with `another`.
         
@@ -630,6 +1239,29 @@ class Coordination(Element):
                     return True
         return False
 
+    def _collect_argument_paths(self, path, acc):
+        # the conjunction precedes the last coordinate as in `elements()`
+        last = len(self._coords) - 1
+        for i, o in enumerate(self._coords):
+            if i == last:
+                self._conj._collect_argument_paths(path + (('_conj', None),), acc)
+            o._collect_argument_paths(path + (('_coords', i),), acc)
+
+    def _replace_constituent(self, field, index, another):
+        if field == '_conj':
+            transfer_features(self._conj, another)
+            self.conj = another
+            return True
+        o = self._coords[index]
+        o.parent = None
+        if another:
+            another.parent = self
+            transfer_features(o, another)
+            self._coords[index] = another
+        else:
+            del self._coords[index]
+        return True
+
 
 class Phrase(Element):
     """A base class for all kinds of phrases - elements containing other
@@ -638,31 +1270,85 @@ class Phrase(Element):
 
     """
 
-    _head = Element()
+    __slots__ = ('_premodifiers', '_head', '_complements', '_postmodifiers')
+
     category = category.PHRASE
+    _constituents = ('_premodifiers', '_head', '_complements', '_postmodifiers')
 
     def __init__(self, features=None, parent=None, id=None, **kwargs):
         super().__init__(features, parent, id)
-        self.premodifiers = (ElementList(parent=self) + kwargs.pop('premodifiers', []))
+        for name in ('premodifiers', 'complements', 'postmodifiers'):
+            value = kwargs.pop(name, None)
+            if value:
+                setattr(self, name, ElementList(parent=self) + value)
         self.head = kwargs.pop('head', None)
-        self.complements = (ElementList(parent=self) + kwargs.pop('complements', []))
-        self.postmodifiers = (ElementList(parent=self) + kwargs.pop('postmodifiers', []))
+
+    def _init_fields(self):
+        super()._init_fields()
+        self._head = None
+        self._premodifiers = self._complements = self._postmodifiers = _NO_ELEMENTS
 
     def __bool__(self):
-        """Return True """
-        return any(bool(x) for x in self.elements())
+        """Return True if any of the constituents is True."""
+        for field in self._constituents:
+            value = getattr(self, field)
+            if any(value) if isinstance(value, ElementList) else value:
+                return True
+        return False
 
     def __eq__(self, other):
         return (
-            super().__eq__(other) and self.premodifiers == other.premodifiers and
-            self.head == other.head and self.complements == other.complements and
-            self.postmodifiers == other.postmodifiers
+            super().__eq__(other) and self._premodifiers == other._premodifiers and
+            self._head == other._head and self._complements == other._complements and
+            self._postmodifiers == other._postmodifiers
         )
 
-    def __hash__(self):
-        if self.hash == -1:
-            self.hash = hash(str(self))
-        return self.hash
+    __hash__ = Element.__hash__
+
+    def _hash_key(self):
+        return (
+            Element._hash_key(self),
+            tuple(map(hash, self._premodifiers)),
+            hash(self._head),
+            tuple(map(hash, self._complements)),
+            tuple(map(hash, self._postmodifiers)),
+        )
+
+    @property
+    def premodifiers(self):
+        return self._own_list('_premodifiers')
+
+    @premodifiers.setter
+    def premodifiers(self, value):
+        if self._cow:
+            self._unshare()
+        value.parent = self
+        self._premodifiers = value
+        self._invalidate_hash()
+
+    @property
+    def complements(self):
+        return self._own_list('_complements')
+
+    @complements.setter
+    def complements(self, value):
+        if self._cow:
+            self._unshare()
+        value.parent = self
+        self._complements = value
+        self._invalidate_hash()
+
+    @property
+    def postmodifiers(self):
+        return self._own_list('_postmodifiers')
+
+    @postmodifiers.setter
+    def postmodifiers(self, value):
+        if self._cow:
+            self._unshare()
+        value.parent = self
+        self._postmodifiers = value
+        self._invalidate_hash()
 
     def __copy__(self):
         rv = self.__class__(features=self.features, parent=self.parent, id=self.id)
@@ -674,14 +1360,16 @@ class Phrase(Element):
 
     # noinspection PyArgumentList
     def __deepcopy__(self, memo):
+        if self._cow:
+            self._unshare()
         rv = self.__class__(id=self.id)
         memo[id(self)] = rv
         rv.parent = memo.get(id(self.parent), None)
         rv.features = deepcopy(self.features, memo=memo)
-        rv.premodifiers = deepcopy(self.premodifiers, memo=memo)
-        rv.head = deepcopy(self.head, memo=memo)
-        rv.complements = deepcopy(self.complements, memo=memo)
-        rv.postmodifiers = deepcopy(self.postmodifiers, memo=memo)
+        rv.premodifiers = deepcopy(self._premodifiers, memo=memo)
+        rv.head = deepcopy(self._head, memo=memo)
+        rv.complements = deepcopy(self._complements, memo=memo)
+        rv.postmodifiers = deepcopy(self._postmodifiers, memo=memo)
         return rv
 
     def __iadd__(self, other):
@@ -697,10 +1385,14 @@ class Phrase(Element):
 
     @property
     def head(self):
+        if self._cow:
+            self._unshare()
         return self._head
 
     @head.setter
     def head(self, value):
+        if self._cow:
+            self._unshare()
         if self._head:
             self._head.parent = None
         if value is not None:
@@ -710,26 +1402,18 @@ class Phrase(Element):
         else:
             self._head = Element()
         self._head[DISCOURSE_FUNCTION] = DISCOURSE_FUNCTION.head
+        self._invalidate_hash()
 
-    def elements(self, recursive=False, itself=None):
-        """Return a generator yielding elements contained in the element
-
-        :param bool recursive: also include sub-elements of the contained elements
-        :param str itself: yield `self` as one of the elements; values in (None, 'first', 'last')
-
-        """
+    def _elements(self, itself):
+        if self._cow:
+            self._unshare()
         if itself == 'first':
             yield self
-
-        yield from self.premodifiers.elements(recursive, itself)
-        if recursive:
-            yield from self.head.elements(recursive, itself)
-        else:
-            if self.head != Element():
-                yield self.head
-        yield from self.complements.elements(recursive, itself)
-        yield from self.postmodifiers.elements(recursive, itself)
-
+        yield from self._premodifiers
+        if self._head != Element():
+            yield self._head
+        yield from self._complements
+        yield from self._postmodifiers
         if itself == 'last':
             yield self
 
@@ -779,18 +1463,33 @@ class Phrase(Element):
             return True
         return False
 
+    def _replace_constituent(self, field, index, another):
+        if index is not None:
+            lst = getattr(self, field)
+            another.parent = self
+            transfer_features(lst[index], another)
+            lst[index] = another
+            return True
+        if field == '_head':
+            head = self._head
+            head.parent = None
+            for k in head.features.keys():
+                if k in self.features:
+                    del self.features[k]
+            transfer_features(head, another)
+            self.head = another
+            self.features.update(another.features)
+            return True
+        return False
+
     def update_parents(self, parent=_sentinel):
         if parent is not _sentinel:
             self.parent = parent
-        to_update = [
-            self.premodifiers,
-            self.head,
-            self.complements,
-            self.postmodifiers,
-        ]
+        if self._cow:
+            self._unshare()
         new_parent = None if parent is None else self
-        for o in to_update:
-            o.update_parents(parent=new_parent)
+        for field in self._constituents:
+            getattr(self, field).update_parents(parent=new_parent)
 
 
 class NounPhrase(Phrase):
@@ -803,8 +1502,10 @@ class NounPhrase(Phrase):
      
      """
 
-    _spec = Element()
+    __slots__ = ('_spec',)
+
     category = category.NOUN_PHRASE
+    _constituents = ('_spec',) + Phrase._constituents
 
     def __init__(self, head=None, specifier=None, features=None, parent=None, id=None, **kwargs):
         super().__init__(features, parent, id, **kwargs)
@@ -813,13 +1514,17 @@ class NounPhrase(Phrase):
 
     def __eq__(self, other):
         return (
-            super().__eq__(other) and self.specifier == other.specifier and self.head == other.head
+            super().__eq__(other) and self._spec == other._spec and self._head == other._head
         )
 
-    def __hash__(self):
-        if self.hash == -1:
-            self.hash = hash(str(self))
-        return self.hash
+    __hash__ = Element.__hash__
+
+    def _init_fields(self):
+        super()._init_fields()
+        self._spec = None
+
+    def _hash_key(self):
+        return Phrase._hash_key(self), hash(self._spec)
 
     def __copy__(self):
         rv = self.__class__(
@@ -833,16 +1538,20 @@ class NounPhrase(Phrase):
     # noinspection PyArgumentList
     def __deepcopy__(self, memo):
         rv = super().__deepcopy__(memo=memo)
-        rv.specifier = deepcopy(self.specifier, memo=memo)
+        rv.specifier = deepcopy(self._spec, memo=memo)
         return rv
 
     @property
     def specifier(self):
+        if self._cow:
+            self._unshare()
         return self._spec
 
     @specifier.setter
     def specifier(self, value):
-        if self.specifier:
+        if self._cow:
+            self._unshare()
+        if self._spec:
             self._spec.parent = None
         if value:
             new_value = raise_to_element(value)
@@ -851,31 +1560,20 @@ class NounPhrase(Phrase):
         else:
             self._spec = Element()
         self._spec[DISCOURSE_FUNCTION] = DISCOURSE_FUNCTION.specifier
+        self._invalidate_hash()
 
-    def elements(self, recursive=False, itself=None):
-        """Return a generator yielding elements contained in the element
-
-        :param bool recursive: also include sub-elements of the contained elements
-        :param str itself: yield `self` as one of the elements; values in (None, 'first', 'last')
-
-        """
+    def _elements(self, itself):
+        if self._cow:
+            self._unshare()
         if itself == 'first':
             yield self
-
-        if recursive:
-            yield from self.specifier.elements(recursive, itself)
-        else:
-            if self.specifier != Element():
-                yield self.specifier
-        yield from self.premodifiers.elements(recursive, itself)
-        if recursive:
-            yield from self.head.elements(recursive, itself)
-        else:
-            if self.head != Element():
-                yield self.head
-        yield from self.complements.elements(recursive, itself)
-        yield from self.postmodifiers.elements(recursive, itself)
-
+        if self._spec != Element():
+            yield self._spec
+        yield from self._premodifiers
+        if self._head != Element():
+            yield self._head
+        yield from self._complements
+        yield from self._postmodifiers
         if itself == 'last':
             yield self
 
@@ -897,12 +1595,14 @@ class NounPhrase(Phrase):
             return True
         return super().replace(one, another, key)
 
-    def update_parents(self, parent=_sentinel):
-        if parent is not _sentinel:
-            self.parent = parent
-        new_parent = None if parent is None else self
-        self.specifier.update_parents(new_parent)
-        super().update_parents(parent)
+    def _replace_constituent(self, field, index, another):
+        if field == '_spec':
+            self._spec.parent = None
+            another.parent = self
+            transfer_features(self._spec, another)
+            self.specifier = another
+            return True
+        return super()._replace_constituent(field, index, another)
 
 
 class VerbPhrase(Phrase):
@@ -915,12 +1615,15 @@ class VerbPhrase(Phrase):
 
      """
 
+    __slots__ = ()
+
     category = category.VERB_PHRASE
 
     def __init__(self, head=None, *compl, features=None, parent=None, **kwargs):
         super().__init__(features, parent, **kwargs)
         self.head = head
-        self.complements += compl
+        if compl:
+            self.complements += compl
         if 'object' in kwargs:
             self.object = kwargs.pop('object')
         if 'indirect_object' in kwargs:
@@ -971,30 +1674,39 @@ class VerbPhrase(Phrase):
 
 
 class PrepositionPhrase(Phrase):
+    __slots__ = ()
+
     category = category.PREPOSITION_PHRASE
 
     def __init__(self, head=None, *compl, features=None, parent=None, **kwargs):
         super().__init__(features, parent, **kwargs)
         self.head = head
-        self.complements += compl
+        if compl:
+            self.complements += compl
 
 
 class AdverbPhrase(Phrase):
+    __slots__ = ()
+
     category = category.ADVERB_PHRASE
 
     def __init__(self, head=None, *compl, features=None, parent=None, **kwargs):
         super().__init__(features, parent, **kwargs)
         self.head = head
-        self.complements += compl
+        if compl:
+            self.complements += compl
 
 
 class AdjectivePhrase(Phrase):
+    __slots__ = ()
+
     category = category.ADJECTIVE_PHRASE
 
     def __init__(self, head=None, *compl, features=None, parent=None, **kwargs):
         super().__init__(features, parent, **kwargs)
         self.head = head
-        self.complements += compl
+        if compl:
+            self.complements += compl
 
 
 class Clause(Phrase):
@@ -1014,16 +1726,21 @@ class Clause(Phrase):
 
     """
 
-    _subject = None
-    _predicate = None
+    __slots__ = ('_front_modifiers', '_subject', '_predicate')
+
     category = category.CLAUSE
+    _constituents = (
+        '_front_modifiers', '_subject', '_premodifiers',
+        '_predicate', '_complements', '_postmodifiers',
+    )
 
     def __init__(
         self, subject=None, predicate=None, objekt=None, features=None, parent=None, **kwargs
     ):
+        fm = kwargs.pop('front_modifiers', None)
         super().__init__(features, parent=parent, **kwargs)
-        fm = kwargs.pop('front_modifiers', [])
-        self.front_modifiers = ElementList(parent=self) + fm
+        if fm:
+            self.front_modifiers = ElementList(parent=self) + fm
         self.subject = subject
         self.predicate = predicate
         if objekt:
@@ -1031,15 +1748,31 @@ class Clause(Phrase):
 
     def __eq__(self, other):
         return (
-            super().__eq__(other) and self.premodifiers == other.premodifiers and
-            self.subject == other.subject and self.predicate == other.predicate and
-            self.complements == other.complements and self.postmodifiers == other.postmodifiers
+            super().__eq__(other) and self._front_modifiers == other._front_modifiers and
+            self._premodifiers == other._premodifiers and
+            self._subject == other._subject and self._predicate == other._predicate and
+            self._complements == other._complements and
+            self._postmodifiers == other._postmodifiers
         )
 
-    def __hash__(self):
-        if self.hash == -1:
-            self.hash = hash(str(self))
-        return self.hash
+    __hash__ = Element.__hash__
+
+    def _init_fields(self):
+        super()._init_fields()
+        self._front_modifiers = _NO_ELEMENTS
+        self._subject = None
+        self._predicate = None
+
+    def _hash_key(self):
+        return (
+            Element._hash_key(self),
+            tuple(map(hash, self._front_modifiers)),
+            hash(self._subject),
+            tuple(map(hash, self._premodifiers)),
+            hash(self._predicate),
+            tuple(map(hash, self._complements)),
+            tuple(map(hash, self._postmodifiers)),
+        )
 
     def __add__(self, other):
         other_ = deepcopy(other)
@@ -1068,28 +1801,46 @@ class Clause(Phrase):
 
     # noinspection PyArgumentList
     def __deepcopy__(self, memo):
+        if self._cow:
+            self._unshare()
         rv = self.__class__(id=self.id)
         memo[id(self)] = rv
         rv.parent = memo.get(id(self.parent), None)
         rv.features = deepcopy(self.features, memo=memo)
-        rv.front_modifiers = deepcopy(self.front_modifiers, memo=memo)
-        rv.subject = deepcopy(self.subject, memo=memo)
-        rv.premodifiers = deepcopy(self.premodifiers, memo=memo)
-        rv.predicate = deepcopy(self.predicate, memo=memo)
-        rv.complements = deepcopy(self.complements, memo=memo)
-        rv.postmodifiers = deepcopy(self.postmodifiers, memo=memo)
+        rv.front_modifiers = deepcopy(self._front_modifiers, memo=memo)
+        rv.subject = deepcopy(self._subject, memo=memo)
+        rv.premodifiers = deepcopy(self._premodifiers, memo=memo)
+        rv.predicate = deepcopy(self._predicate, memo=memo)
+        rv.complements = deepcopy(self._complements, memo=memo)
+        rv.postmodifiers = deepcopy(self._postmodifiers, memo=memo)
         return rv
 
     @property
     def string(self):
         return self.subject.string or self.predicate.string
 
+    @property
+    def front_modifiers(self):
+        return self._own_list('_front_modifiers')
+
+    @front_modifiers.setter
+    def front_modifiers(self, value):
+        if self._cow:
+            self._unshare()
+        value.parent = self
+        self._front_modifiers = value
+        self._invalidate_hash()
+
     @property
     def subject(self):
+        if self._cow:
+            self._unshare()
         return self._subject
 
     @subject.setter
     def subject(self, value):
+        if self._cow:
+            self._unshare()
         if self._subject:
             self._subject.parent = None
             del self._subject[DISCOURSE_FUNCTION]
@@ -1100,13 +1851,18 @@ class Clause(Phrase):
         else:
             self._subject = Element()
         self._subject[DISCOURSE_FUNCTION] = DISCOURSE_FUNCTION.subject
+        self._invalidate_hash()
 
     @property
     def predicate(self):
+        if self._cow:
+            self._unshare()
         return self._predicate
 
     @predicate.setter
     def predicate(self, value):
+        if self._cow:
+            self._unshare()
         if self._predicate:
             self._predicate.parent = None
             del self._predicate[DISCOURSE_FUNCTION]
@@ -1117,6 +1873,7 @@ class Clause(Phrase):
         else:
             self._predicate = Element()
         self._predicate[DISCOURSE_FUNCTION] = DISCOURSE_FUNCTION.predicate
+        self._invalidate_hash()
 
     @property
     def head(self):
@@ -1160,31 +1917,19 @@ class Clause(Phrase):
             self.predicate = VerbPhrase(parent=self)
         self.predicate.indirect_object = value
 
-    def elements(self, recursive=False, itself=None):
-        """Return a generator yielding elements contained in the element
-
-        :param bool recursive: also include sub-elements of the contained elements
-        :param str itself: yield `self` as one of the elements; values in (None, 'first', 'last')
-
-        """
+    def _elements(self, itself):
+        if self._cow:
+            self._unshare()
         if itself == 'first':
             yield self
-
-        yield from self.front_modifiers.elements(recursive, itself)
-        if recursive:
-            yield from self.subject.elements(recursive, itself)
-        else:
-            if self.subject != NounPhrase(parent=self):
-                yield self.subject
-        yield from self.premodifiers.elements(recursive, itself)
-        if recursive:
-            yield from self.predicate.elements(recursive, itself)
-        else:
-            if self.predicate != VerbPhrase(parent=self):
-                yield self.predicate
-        yield from self.complements.elements(recursive, itself)
-        yield from self.postmodifiers.elements(recursive, itself)
-
+        yield from self._front_modifiers
+        if self._subject != NounPhrase(parent=self):
+            yield self._subject
+        yield from self._premodifiers
+        if self._predicate != VerbPhrase(parent=self):
+            yield self._predicate
+        yield from self._complements
+        yield from self._postmodifiers
         if itself == 'last':
             yield self
 
@@ -1212,14 +1957,16 @@ class Clause(Phrase):
 
         return super().replace(one, another, key)
 
-    def update_parents(self, parent=_sentinel):
-        if parent is not _sentinel:
-            self.parent = parent
-        new_parent = None if parent is None else self
-        to_update = [self.front_modifiers, self.subject, self.predicate]
-        for x in to_update:
-            x.update_parents(new_parent)
-        super().update_parents(parent)
+    def _replace_constituent(self, field, index, another):
+        if field == '_subject':
+            transfer_features(self._subject, another)
+            self.subject = another
+            return True
+        if field == '_predicate':
+            transfer_features(self._predicate, another)
+            self.predicate = another
+            return True
+        return super()._replace_constituent(field, index, another)
 
 
 def is_adjective_type(element, strict=False):
@@ -1303,7 +2050,7 @@ def raise_to_np(element):
     """
     element = raise_to_element(element)
     if isinstance(element, Coordination):
-        element.coords = ElementList([raise_to_np(c) for c in element.coords])
+        element.coords = ElementList([raise_to_np(c) for c in element.coords], parent=element)
         return element
     if isinstance(element, (String, Word)):
         return NounPhrase(head=element)
@@ -1320,7 +2067,7 @@ def raise_to_vp(element):
     """
     element = raise_to_element(element)
     if isinstance(element, Coordination):
-        element.coords = ElementList([raise_to_vp(c) for c in element.coords])
+        element.coords = ElementList([raise_to_vp(c) for c in element.coords], parent=element)
         return element
     if isinstance(element, String):
         return VerbPhrase(head=element)
@@ -1350,7 +2097,9 @@ def raise_to_phrase(element):
         else:
             return NounPhrase(element, features=element.features)
     if isinstance(element, Coordination):
-        element.coords = ElementList([raise_to_phrase(c) for c in element.coords])
+        element.coords = ElementList(
+            [raise_to_phrase(c) for c in element.coords], parent=element
+        )
         return element
     return NounPhrase(element, features=element.features)
 
@@ -1363,7 +2112,9 @@ def raise_to_clause(element):
         if is_noun_type(element): return Clause(subject=element)
         if is_verb_type(element): return Clause(predicate=element)
     if isinstance(element, Coordination):
-        element.coords = ElementList([raise_to_clause(c) for c in element.coords])
+        element.coords = ElementList(
+            [raise_to_clause(c) for c in element.coords], parent=element
+        )
         return element
     return Clause(element)
 
@@ -1380,6 +2131,38 @@ def comparable_features(original_features):
     return rv
 
 
+def _comparable_features_equal(features, other):
+    """Return True if the comparable features of the two feature sets are equal.
+
+    This is equivalent to `comparable_features(features) == comparable_features(other)`
+    but it does not copy the feature sets.
+
+    """
+    excluded = [f.name for f in NON_COMPARABLE_FEATURES]
+    count = 0
+    for f in features:
+        if f.name in excluded:
+            continue
+        if f not in other:
+            return False
+        count += 1
+    return count == sum(1 for f in other if f.name not in excluded)
+
+
+_EMPTY_FEATURES_HASH = hash(frozenset())
+
+
+def _features_hash(features):
+    """Return a hash of the features that are used for equality comparison."""
+    if not features:
+        return _EMPTY_FEATURES_HASH
+    excluded = [f.name for f in NON_COMPARABLE_FEATURES]
+    try:
+        return hash(frozenset((f.name, f.value) for f in features if f.name not in excluded))
+    except TypeError:  # some feature values are not hashable
+        return hash(frozenset(f.name for f in features if f.name not in excluded))
+
+
 def transfer_features(source, target):
     """Copy transferable features from `source` to `target`."""
     if target is None:
@@ -1389,62 +2172,139 @@ def transfer_features(source, target):
             target[f] = source[f]
 
 
+def _json_tag(cls):
+    """Return the tag of `cls` in JSON (see `ElementDecoder.register()`)."""
+    return ElementDecoder.tags.get(cls) or str(cls)
+
+
 class ElementEncoder(json.JSONEncoder):
 
     def default(self, python_object):
-        if isinstance(python_object, (Element, ElementList)):
-            dct = python_object.__dict__
+        if isinstance(python_object, Element):
+            dct = python_object.__getstate__()
             if 'parent' in dct:
                 dct['parent'] = None
-            return {'__class__': str(type(python_object)), '__value__': dct}
+            # decoded trees do not share constituents
+            dct.pop('_cow', None)
+            return {'__class__': _json_tag(type(python_object)), '__value__': dct}
+        elif isinstance(python_object, _NoElements):
+            # decoded trees do not share lists
+            return {'__class__': _json_tag(ElementList), '__value__': {'data': []}}
+        elif isinstance(python_object, ElementList):
+            # do not modify the list itself
+            dct = dict(python_object.__dict__)
+            if 'parent' in dct:
+                dct['parent'] = None
+            return {'__class__': _json_tag(type(python_object)), '__value__': dct}
         elif isinstance(python_object, FeatureSet):
-            return {'__class__': str(type(python_object)), '__value__': python_object.as_dict()}
+            return {'__class__': _json_tag(type(python_object)), '__value__': python_object.as_dict()}
         return super(ElementEncoder, self).default(python_object)
 
 
+def _feature_set_from_dict(dct):
+    rv = FeatureSet()
+    rv.update(dct)
+    return rv
+
+
 class ElementDecoder(json.JSONDecoder):
+    """Decoder of the JSON produced by `ElementEncoder`.
+
+    Each encoded object has a tag (`__class__`) identifying its class.
+    The tags are looked up in `registry`, which maps them to functions
+    creating the objects from their (already decoded) attributes.
+    The parents of the elements are set once the whole document is decoded.
+
+    The classes of the library are registered by default. Other subclasses
+    of `Element` or `ElementList` have to be registered using `register()`.
+
+    """
+
+    # tag -> function creating an object from a dict
+    registry = {}
+    # class -> tag (if different from `str(cls)`)
+    tags = {}
 
     def __init__(self, *args, **kwargs):
         kwargs['object_hook'] = ElementDecoder.from_json
         super(ElementDecoder, self).__init__(*args, **kwargs)
 
+    @classmethod
+    def register(cls, klass, tag=None, factory=None):
+        """Register a class so that its instances can be decoded.
+
+        The method can be used as a class decorator.
+
+        :param klass: a subclass of `Element` or `ElementList`
+        :param tag: the tag identifying the class in JSON (the default is `str(klass)`)
+        :param factory: a function creating an instance from a dict of attributes
+                        (the default is `klass.from_dict`)
+        :return: `klass`
+
+        """
+        if tag is None:
+            tag = str(klass)
+        else:
+            cls.tags[klass] = tag
+        cls.registry[tag] = factory or klass.from_dict
+        return klass
+
+    def decode(self, s, *args, **kwargs):
+        rv = super(ElementDecoder, self).decode(s, *args, **kwargs)
+        _set_parents(rv)
+        return rv
+
     @staticmethod
     def from_json(json_object):
-        prefix = "<class 'nlglib.microplanning.struct."
-        if '__class__' in json_object:
-            cls = json_object['__class__']
-            if cls == ("%sElement'>" % prefix):
-                rv = Element.from_dict(json_object['__value__'])
-            elif cls == ("%sElementList'>" % prefix):
-                rv = ElementList.from_dict(json_object['__value__'])
-            elif cls == ("%sString'>" % prefix):
-                rv = String.from_dict(json_object['__value__'])
-            elif cls == ("%sWord'>" % prefix):
-                rv = Word.from_dict(json_object['__value__'])
-            elif cls == ("%sVar'>" % prefix):
-                rv = Var.from_dict(json_object['__value__'])
-            elif cls == ("%sPhrase'>" % prefix):
-                rv = Phrase.from_dict(json_object['__value__'])
-            elif cls == ("%sNounPhrase'>" % prefix):
-                rv = NounPhrase.from_dict(json_object['__value__'])
-            elif cls == ("%sVerbPhrase'>" % prefix):
-                rv = VerbPhrase.from_dict(json_object['__value__'])
-            elif cls == ("%sPrepositionPhrase'>" % prefix):
-                rv = PrepositionPhrase.from_dict(json_object['__value__'])
-            elif cls == ("%sAdjectivePhrase'>" % prefix):
-                rv = AdjectivePhrase.from_dict(json_object['__value__'])
-            elif cls == ("%sAdverbPhrase'>" % prefix):
-                rv = AdverbPhrase.from_dict(json_object['__value__'])
-            elif cls == ("%sCoordination'>" % prefix):
-                rv = Coordination.from_dict(json_object['__value__'])
-            elif cls == ("%sClause'>" % prefix):
-                rv = Clause.from_dict(json_object['__value__'])
-            elif cls == "<class 'nlglib.features.feature.FeatureSet'>":
-                rv = FeatureSet()
-                rv.update(json_object['__value__'])
-            else:
-                raise TypeError('Unknown class "{}"'.format(cls))
-            if hasattr(rv, 'update_parents'):
-                rv.update_parents()
-            return rv
-        return json_object
+        """Return the object encoded in `json_object` (a dict).
+
+        The function does not set the parents of the constituents;
+        `ElementDecoder.decode()` does that for the whole document.
+
+        """
+        tag = json_object.get('__class__')
+        if tag is None:
+            return json_object
+        try:
+            factory = ElementDecoder.registry[tag]
+        except KeyError:
+            raise TypeError('Unknown class "{}"'.format(tag)) from None
+        return factory(json_object['__value__'])
+
+
+for _cls in (Element, ElementList, String, Word, Var, Phrase, NounPhrase, VerbPhrase,
+             PrepositionPhrase, AdjectivePhrase, AdverbPhrase, Coordination, Clause):
+    ElementDecoder.register(_cls)
+ElementDecoder.register(FeatureSet, factory=_feature_set_from_dict)
+del _cls
+
+
+def _set_parents(obj):
+    """Set the parents of the constituents of the elements in `obj`.
+
+    `obj` can be an element, a list of elements or a list or dict
+    containing them (e.g., decoded JSON).
+
+    """
+    stack = [obj]
+    while stack:
+        o = stack.pop()
+        if isinstance(o, Element):
+            for field in o._constituents:
+                value = getattr(o, field)
+                if isinstance(value, Element):
+                    value.parent = o
+                    stack.append(value)
+                elif isinstance(value, ElementList) and value is not _NO_ELEMENTS:
+                    value.parent = o
+                    for x in value.data:
+                        x.parent = o
+                    stack.extend(value.data)
+        elif isinstance(o, ElementList):
+            for x in o.data:
+                x.parent = o.parent
+            stack.extend(o.data)
+        elif isinstance(o, (list, tuple)):
+            stack.extend(o)
+        elif isinstance(o, dict):
+            stack.extend(o.values())
@@ -0,0 +1,106 @@
+"""This module contains a non-recursive traversal of element trees.
+
+The traversal uses an explicit stack instead of nested generators so its cost
+per node does not depend on the depth of the node and it works for trees
+deeper than the recursion limit. It is used by `Element.elements()`,
+`Element.arguments()` and the visitors that collect elements.
+
+The nodes provide their constituents by the method `_children()`
+that returns a list of nodes in the order of `elements()` or None
+if the node is a leaf (e.g., a `String` or a `Var`). Containers
+(e.g., `ElementList`, `Document` or `RhetRel`) set the attribute
+`_transparent` to True; their constituents are traversed
+but the containers themselves are not yielded.
+
+"""
+
+from nlglib.features import category
+
+__all__ = ['PRE_ORDER', 'POST_ORDER', 'LEAVES', 'traverse', 'iter_elements']
+
+PRE_ORDER = 'pre-order'
+POST_ORDER = 'post-order'
+LEAVES = 'leaves'
+
+
+def _children(node, prune):
+    fn = getattr(node, '_children', None)
+    if fn is None or (prune and getattr(node, 'category', None) in prune):
+        return None
+    return fn()
+
+
+def traverse(root, order=PRE_ORDER, prune=None):
+    """Return a generator yielding the nodes of the tree rooted in `root`.
+
+    :param order: PRE_ORDER yields each node before its constituents,
+                  POST_ORDER yields each node after its constituents
+                  and LEAVES yields only the leaves
+    :param prune: a collection of categories; the elements of these categories
+                  are treated as leaves (their constituents are not visited)
+
+    """
+    if order == POST_ORDER:
+        return _post_order(root, prune)
+    if order == PRE_ORDER:
+        return _pre_order(root, prune, False)
+    if order == LEAVES:
+        return _pre_order(root, prune, True)
+    raise ValueError('Unknown traversal order "{0}".'.format(order))
+
+
+def _pre_order(root, prune, leaves_only):
+    stack = [root]
+    pop = stack.pop
+    extend = stack.extend
+    while stack:
+        node = pop()
+        if node is None:
+            continue
+        children = _children(node, prune)
+        if children is None:
+            yield node
+            continue
+        if not leaves_only and not node._transparent:
+            yield node
+        extend(reversed(children))
+
+
+def _post_order(root, prune):
+    # each entry is a node and a flag indicating that its constituents were pushed
+    stack = [(root, False)]
+    pop = stack.pop
+    append = stack.append
+    while stack:
+        node, expanded = pop()
+        if expanded:
+            yield node
+            continue
+        if node is None:
+            continue
+        children = _children(node, prune)
+        if children is None:
+            yield node
+            continue
+        if not node._transparent:
+            append((node, True))
+        for child in reversed(children):
+            append((child, False))
+
+
+def iter_elements(root, itself=None):
+    """Return a generator yielding the elements in the tree rooted in `root`
+    in the order of `elements(recursive=True, itself=itself)`.
+
+    :param str itself: 'first' yields each phrase before its constituents,
+                       'last' yields it after them and None yields only
+                       the leaves, omitting empty elements
+
+    """
+    if itself == 'first':
+        return traverse(root, PRE_ORDER)
+    if itself == 'last':
+        return traverse(root, POST_ORDER)
+    if itself:
+        return traverse(root, LEAVES)
+    return (x for x in traverse(root, LEAVES) if x.category != category.ELEMENT)
@@ -6,6 +6,7 @@ from nlglib.features import DISCOURSE_FUNCTION, ASPECT, category, FeatureGroup
 from nlglib.features import NON_COMPARABLE_FEATURES
 from nlglib.microplanning.struct import Element, Word, String, Clause
 from nlglib.microplanning.struct import Phrase, Coordination, NounPhrase
+from nlglib.microplanning.traversal import traverse, iter_elements, PRE_ORDER
 
 __all__ = [
     'PrintVisitor',
@@ -22,6 +23,18 @@ __all__ = [
 ]
 
 
+def _constituents(node, attr):
+    """Return the list of constituents `attr` (e.g., 'premodifiers') of `node`.
+
+    Unlike `getattr(node, attr)`, the function does not give the node
+    a list of its own if it shares the empty list (see `Element._own_list()`)
+    so it should be used only for reading.
+
+    """
+    rv = getattr(node, '_' + attr, None)
+    return getattr(node, attr) if rv is None else rv
+
+
 class PrintVisitor:
     """ An abstract visitor class that maintains indentation info. """
 
@@ -64,7 +77,7 @@ class PrintVisitor:
 
         """
         self.enter(name)
-        elts = getattr(node, attr)
+        elts = _constituents(node, attr)
         for e in elts:
             e.accept(self)
         self.exit()
@@ -82,7 +95,14 @@ class PrintVisitor:
 
 
 class XmlVisitor(PrintVisitor):
-    """ Convert an NLG element structure into an XML readable by SimpleNLG. """
+    """ Convert an NLG element structure into an XML readable by SimpleNLG.
+
+    The XML is collected in a list of chunks (joined when `xml` is read)
+    or, if `out` is given, written to `out` (any object with a `write()`
+    method such as a file or `io.StringIO`) as it is generated.
+    In the `compact` mode, the XML is neither indented nor split into lines.
+
+    """
 
     header = '''\
 <?xml version="1.0" encoding="utf-8"?>
@@ -100,27 +120,63 @@ xsi:schemaLocation="http://simplenlg.googlecode.com/svn/trunk/res/xml ">
 </nlg:NLGSpec>
 '''
 
-    def __init__(self, xml='', depth=0, indent='  ', sep='\n'):
+    def __init__(self, xml='', depth=0, indent='  ', sep='\n', out=None, compact=False):
+        if compact:
+            indent, sep = '', ''
         super(XmlVisitor, self).__init__(depth, indent, sep)
-        self.xml = xml
+        self.out = out
+        self._chunks = []
+        self._indents = ['']
         self.ancestors.append('child')
+        if xml:
+            self.write(xml)
+
+    @property
+    def xml(self):
+        """ Return the XML generated so far (empty if written to `out`). """
+        if len(self._chunks) > 1:
+            self._chunks[:] = [''.join(self._chunks)]
+        return self._chunks[0] if self._chunks else ''
+
+    @xml.setter
+    def xml(self, value):
+        self._chunks[:] = [value] if value else []
+
+    def write(self, text):
+        """ Append `text` to the XML. """
+        if self.out is None:
+            self._chunks.append(text)
+        else:
+            self.out.write(text)
+
+    def _indentation(self, depth):
+        indents = self._indents
+        while len(indents) <= depth:
+            indents.append(self.indent * len(indents))
+        return indents[depth]
+
+    def _start_tag(self, attributes):
+        self.write('%s<%s%s>%s' % (
+            self._indentation(self.depth), self.ancestors[-1], attributes, self.sep))
+
+    def _end_tag(self):
+        self.write('%s</%s>%s' % (self._indentation(self.depth), self.ancestors[-1], self.sep))
+
+    def _word_element(self, attributes, word):
+        outer = self._indentation(self.depth)
+        tag = self.ancestors[-1]
+        sep = self.sep
+        self.write('%s<%s xsi:type="WordElement"%s>%s%s<base>%s</base>%s%s</%s>%s' % (
+            outer, tag, attributes, sep,
+            self._indentation(self.depth + 1), quote_plus(word), sep,
+            outer, tag, sep))
 
     def element(self, _):
         pass
 
     def string(self, node):
-        # neg = 'not ' if node.negated == 'true' else ''
-        neg = ''
         features = self.features_to_xml_attributes(node)
-        text = (
-            '{outer}<{tag} xsi:type="WordElement" '
-            'canned="true" {f}>{sep}'
-            '{inner}<base>{neg}{word}</base>{sep}'
-            '{outer}</{tag}>{sep}'
-        ).format(
-            word=quote_plus(node.value), neg=neg, **self._get_args(f=features)
-        )
-        self.xml += text
+        self._word_element(' canned="true" ' + features, node.value)
 
     def word(self, node):
         # a bug in simplenlg treats 'is' differently from 'be'
@@ -130,50 +186,37 @@ xsi:schemaLocation="http://simplenlg.googlecode.com/svn/trunk/res/xml ">
         if word == 'is': word = 'be'
         features = self.features_to_xml_attributes(node)
         id = ' id="{}"'.format(node.id) if node.id else ''
-        text = (
-            '{outer}<{tag} xsi:type="WordElement"{f}{id}>{sep}'
-            '{inner}<base>{word}</base>{sep}'
-            '{outer}</{tag}>{sep}'
-        ).format(
-            word=quote_plus(word), id=id, **self._get_args(f=features)
-        )
-        self.xml += text
+        self._word_element(features + id, word)
 
     def var(self, node):
         node.value.accept(self)
 
     def clause(self, node):
-        features = self.features_to_xml_attributes(node)
-        self.xml += '{outer}<{tag} xsi:type="SPhraseSpec"{f}>{sep}' \
-            .format(**self._get_args(f=features))
+        self._start_tag(' xsi:type="SPhraseSpec"' + self.features_to_xml_attributes(node))
         self._process_elements(node, 'front_modifiers', name='frontMod')
         self._process_element(node, 'subject', name='subj')
         self._process_elements(node, 'premodifiers', name='preMod')
         self._process_element(node, 'predicate', name='vp')
         self._process_elements(node, 'complements', name='compl')
         self._process_elements(node, 'postmodifiers', name='postMod')
-        self.xml += '{outer}</{tag}>{sep}'.format(**self._get_args())
+        self._end_tag()
 
     def noun_phrase(self, node):
-        features = self.features_to_xml_attributes(node)
-        self.xml += '{outer}<{tag} xsi:type="NPPhraseSpec"{f}>{sep}' \
-            .format(**self._get_args(f=features))
+        self._start_tag(' xsi:type="NPPhraseSpec"' + self.features_to_xml_attributes(node))
         self._process_element(node, 'specifier', 'spec')
         self._process_elements(node, 'premodifiers', 'preMod')
         self._process_element(node, 'head')
         self._process_elements(node, 'complements', 'compl')
         self._process_elements(node, 'postmodifiers', 'postMod')
-        self.xml += '{outer}</{tag}>{sep}'.format(**self._get_args())
+        self._end_tag()
 
     def phrase(self, node, typ):
-        features = self.features_to_xml_attributes(node)
-        self.xml += '{outer}<{tag} xsi:type="{type}"{f}>{sep}' \
-            .format(type=typ, **self._get_args(f=features))
+        self._start_tag(' xsi:type="%s"%s' % (typ, self.features_to_xml_attributes(node)))
         self._process_elements(node, 'premodifiers', 'preMod')
         self._process_element(node, 'head')
         self._process_elements(node, 'complements', 'compl')
         self._process_elements(node, 'postmodifiers', 'postMod')
-        self.xml += '{outer}</{tag}>{sep}'.format(**self._get_args())
+        self._end_tag()
 
     def verb_phrase(self, node):
         self.phrase(node, 'VPPhraseSpec')
@@ -189,14 +232,25 @@ xsi:schemaLocation="http://simplenlg.googlecode.com/svn/trunk/res/xml ">
 
     def coordination(self, node):
         features = self.features_to_xml_attributes(node)
-        self.xml += '{outer}<{tag} xsi:type="CoordinatedPhraseElement"{f} conj="{conj}">{sep}' \
-            .format(conj=str(node.conj), **self._get_args(f=features))
+        self._start_tag(' xsi:type="CoordinatedPhraseElement"%s conj="%s"' % (features, node.conj))
         self._process_elements(node, 'coords', 'coord')
-        self.xml += '{outer}</{tag}>{sep}'.format(**self._get_args())
+        self._end_tag()
 
     def to_xml(self):
         return (self.header + self.xml + self.footer).strip()
 
+    @classmethod
+    def dump(cls, element, out, **kwargs):
+        """ Write the XML document (including the header and the footer)
+        for the `element` to `out` without building it in memory.
+
+        :param kwargs: the keyword arguments of `XmlVisitor()`
+
+        """
+        out.write(cls.header)
+        element.accept(cls(out=out, **kwargs))
+        out.write(cls.footer)
+
     def clear(self):
         self.xml = ''
 
@@ -208,7 +262,13 @@ xsi:schemaLocation="http://simplenlg.googlecode.com/svn/trunk/res/xml ">
 
     @staticmethod
     def features_to_xml_attributes(element, feature_map=None):
-        features = ""
+        """ Return the XML attributes (a string starting with a space)
+        that represent the category and the features of `element`.
+
+        The attributes are memoised by `xml_attribute_encoder`
+        if `feature_map` is a `FeatureMap` (e.g., `simplenlg_features`).
+
+        """
         feature_map = simplenlg_features if feature_map is None else feature_map
         if isinstance(element, Word):
             cat = element.pos
@@ -216,25 +276,144 @@ xsi:schemaLocation="http://simplenlg.googlecode.com/svn/trunk/res/xml ">
             cat = category.ANY
         else:
             cat = element.category
-        features_dict = {'cat': cat}
-        for f in element.features:
-            # if feature or feature group is not in dict, just return a dict with K:V
-            value = f.value.lower()
-            default_value = value if value in ('true', 'false') else f.value.upper()
-            converted = feature_map.get(f, {f.name.upper(): default_value})
-            # returned value is either a dict or a lambda taking `f`
-            if hasattr(converted, '__call__'):
-                converted = converted(f)
-            features_dict.update(converted)
-        if features_dict:
-            for k in sorted(features_dict.keys()):
-                features += '%s="%s" ' % (quote_plus(str(k)), quote_plus(str(features_dict[k])))
-            return ' ' + features.strip()
-        return ''
+        return xml_attribute_encoder(cat, element.features, feature_map)
+
+
+def encode_xml_attributes(cat, features, feature_map):
+    """ Return the XML attributes for the category `cat` and the given features
+    converted to SimpleNLG features using `feature_map`.
+
+    """
+    features_dict = {'cat': cat}
+    for f in features:
+        # if feature or feature group is not in dict, just return a dict with K:V
+        value = f.value.lower()
+        default_value = value if value in ('true', 'false') else f.value.upper()
+        converted = feature_map.get(f, {f.name.upper(): default_value})
+        # returned value is either a dict or a lambda taking `f`
+        if hasattr(converted, '__call__'):
+            converted = converted(f)
+        features_dict.update(converted)
+    return ' ' + ' '.join('%s="%s"' % (quote_plus(str(k)), quote_plus(str(features_dict[k])))
+                          for k in sorted(features_dict.keys()))
+
+
+class FeatureMap(dict):
+    """ A dict mapping features to SimpleNLG features that counts its modifications.
+
+    The values are either dicts or callables taking a feature and returning a dict.
+    The attribute `version` changes whenever the map is modified,
+    which allows caching the results of the conversion.
+
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(FeatureMap, self).__init__(*args, **kwargs)
+        self.version = 0
+
+    def _modified(self):
+        self.version += 1
+
+    def __setitem__(self, key, value):
+        super(FeatureMap, self).__setitem__(key, value)
+        self._modified()
+
+    def __delitem__(self, key):
+        super(FeatureMap, self).__delitem__(key)
+        self._modified()
+
+    def clear(self):
+        super(FeatureMap, self).clear()
+        self._modified()
+
+    def pop(self, *args):
+        rv = super(FeatureMap, self).pop(*args)
+        self._modified()
+        return rv
+
+    def popitem(self):
+        rv = super(FeatureMap, self).popitem()
+        self._modified()
+        return rv
+
+    def setdefault(self, key, default=None):
+        rv = super(FeatureMap, self).setdefault(key, default)
+        self._modified()
+        return rv
+
+    def update(self, *args, **kwargs):
+        super(FeatureMap, self).update(*args, **kwargs)
+        self._modified()
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+    def __or__(self, other):
+        if not isinstance(other, dict):
+            return NotImplemented
+        rv = FeatureMap(self)
+        rv.update(other)
+        return rv
+
+    def __ror__(self, other):
+        if not isinstance(other, dict):
+            return NotImplemented
+        rv = FeatureMap(other)
+        rv.update(self)
+        return rv
+
+
+class XmlAttributeEncoder:
+    """ A memoised version of `encode_xml_attributes()`.
+
+    The attributes are cached by the category and the features.
+    At most `maxsize` attribute strings are kept; when the limit is reached,
+    the cache is emptied. The cache is also emptied when a different
+    feature map is used or when the feature map is modified. Feature maps
+    that are not instances of `FeatureMap` cannot be tracked
+    so the attributes for them are not cached.
+
+    """
+
+    def __init__(self, maxsize=4096):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._cache = {}
+        self._feature_map = None
+        self._version = None
+
+    def __call__(self, cat, features, feature_map):
+        version = getattr(feature_map, 'version', None)
+        if version is None:
+            return encode_xml_attributes(cat, features, feature_map)
+        if feature_map is not self._feature_map or version != self._version:
+            self.clear()
+            self._feature_map = feature_map
+            self._version = version
+        # features are interned so the tuple is cheap to hash and compare
+        key = (cat, tuple(features))
+        rv = self._cache.get(key)
+        if rv is None:
+            self.misses += 1
+            rv = encode_xml_attributes(cat, features, feature_map)
+            if len(self._cache) >= self.maxsize:
+                self._cache.clear()
+            self._cache[key] = rv
+        else:
+            self.hits += 1
+        return rv
+
+    def clear(self):
+        self._cache.clear()
+
+    def __len__(self):
+        return len(self._cache)
 
 
 # either a dict or a lambda taking Feature and returning a dict
-simplenlg_features = {
+simplenlg_features = FeatureMap({
     DISCOURSE_FUNCTION: lambda f: {'discourseFunction': f.value},
     ASPECT.progressive: {'PROGRESSIVE': 'true'},
     ASPECT.perfect: {'PERFECT': 'true'},
@@ -243,7 +422,10 @@ simplenlg_features = {
     FeatureGroup('conj'): lambda f: {f.name: f.value},
     FeatureGroup('complementiser'): lambda f: {f.name.upper(): f.value},
     FeatureGroup('COMPLEMENTISER'): lambda f: {f.name: f.value},
-}
+})
+
+# the encoder used by `XmlVisitor`
+xml_attribute_encoder = XmlAttributeEncoder()
 
 
 class ReprVisitor(PrintVisitor):
@@ -259,7 +441,7 @@ class ReprVisitor(PrintVisitor):
         self.do_indent = True
 
     def _process_elements(self, node, name, _=None):
-        attr = getattr(node, name)
+        attr = _constituents(node, name)
         if len(attr) == 0: return
         self.data += ',\n'
         if self.do_indent: self.data += self.indent
@@ -340,8 +522,8 @@ class ReprVisitor(PrintVisitor):
             self.do_indent = True
         else:
             self.do_indent = False
-        i = len(node.complements)
-        for c in node.complements:
+        i = len(_constituents(node, 'complements'))
+        for c in _constituents(node, 'complements'):
             if i > 0:
                 self.data += ',\n'
             i -= 1
@@ -422,7 +604,31 @@ class ReprVisitor(PrintVisitor):
         return 'ReprVisitor({0})'.format(self.data)
 
 
-class StrVisitor(PrintVisitor):
+class _TextBuffer:
+    """ A mixin collecting the output of a visitor in a list of strings
+    that are joined only when `data` is read.
+
+    """
+
+    @property
+    def data(self):
+        if len(self._chunks) > 1:
+            self._chunks[:] = [''.join(self._chunks)]
+        return self._chunks[0] if self._chunks else ''
+
+    @data.setter
+    def data(self, value):
+        self._chunks[:] = [value] if value else []
+
+    def write(self, *parts):
+        """ Append the strings `parts` to the output. """
+        self._chunks.extend(parts)
+
+    def clear(self):
+        self._chunks[:] = []
+
+
+class StrVisitor(_TextBuffer, PrintVisitor):
     """ Create a string representation of an element and its subelements.
     The representation shows only the basic info (no features, mods, etc).
 
@@ -430,62 +636,63 @@ class StrVisitor(PrintVisitor):
 
     def __init__(self, data='', depth=0, indent='', sep=',\n'):
         super(StrVisitor, self).__init__(depth, indent, sep)
+        self._chunks = []
         self.data = data
         self.do_indent = True
 
     def msg_spec(self, node):
-        if self.do_indent: self.data += self.indent
-        self.data += '{0}'.format(node)
+        if self.do_indent: self.write(self.indent)
+        self.write('{0}'.format(node))
 
     def element(self, _):
-        self.data += ''
+        pass
 
     def string(self, node):
-        if self.do_indent: self.data += self.indent
-        self.data += 'String({0})'.format(repr(node.value))
+        if self.do_indent: self.write(self.indent)
+        self.write('String({0})'.format(repr(node.value)))
 
     def word(self, node):
-        if self.do_indent: self.data += self.indent
-        self.data += 'Word({0}, {1})'.format(repr(node.word), repr(node.pos))
+        if self.do_indent: self.write(self.indent)
+        self.write('Word({0}, {1})'.format(repr(node.word), repr(node.pos)))
 
     def var(self, node):
-        if self.do_indent: self.data += self.indent
+        if self.do_indent: self.write(self.indent)
         if node.value == Element():
-            self.data += 'Var({0})'.format(repr(node.id))
+            self.write('Var({0})'.format(repr(node.id)))
         else:
-            self.data += 'Var({0}, {1})'.format(repr(node.id), repr(node.value))
+            self.write('Var({0}, {1})'.format(repr(node.id), repr(node.value)))
 
     def noun_phrase(self, node):
-        if self.do_indent: self.data += self.indent
-        self.data += 'NounPhrase('
+        if self.do_indent: self.write(self.indent)
+        self.write('NounPhrase(')
         self.indent += ' ' * len('NounPhrase(')
         self.do_indent = False
         node.head.accept(self)
         if node.specifier != Element():
-            self.data += ', '
+            self.write(', ')
             node.specifier.accept(self)
-        self.data += ')'
+        self.write(')')
         self.do_indent = True
         self.indent = self.indent[:-len('NounPhrase(')]
 
     def phrase(self, node, name=''):
-        if self.do_indent: self.data += self.indent
+        if self.do_indent: self.write(self.indent)
         self.indent += ' ' * len(name + '(')
-        self.data += name + '('
+        self.write(name + '(')
         if node.head:
             self.do_indent = False
             node.head.accept(self)
             self.do_indent = True
         else:
             self.do_indent = False
-        i = len(node.complements)
-        for c in node.complements:
+        i = len(_constituents(node, 'complements'))
+        for c in _constituents(node, 'complements'):
             if i > 0:
-                self.data += ',\n'
+                self.write(',\n')
             i -= 1
             c.accept(self)
             self.do_indent = True
-        self.data += ')'
+        self.write(')')
         self.indent = self.indent[:-len(name + '(')]
 
     def verb_phrase(self, node):
@@ -501,36 +708,33 @@ class StrVisitor(PrintVisitor):
         self.phrase(node, 'AdverbPhrase')
 
     def clause(self, node):
-        self.data += self.indent
-        self.data += 'Clause('
+        self.write(self.indent)
+        self.write('Clause(')
         self.do_indent = False
         node.subject.accept(self)
         self.do_indent = True
-        self.data += ',\n'
+        self.write(',\n')
         self.indent += ' ' * len('Clause(')
         node.predicate.accept(self)
-        self.data += ')'
+        self.write(')')
         self.indent = self.indent[:-len('Clause(')]
 
     def coordination(self, node):
-        if self.do_indent: self.data += self.indent
-        self.data += 'Coordination('
+        if self.do_indent: self.write(self.indent)
+        self.write('Coordination(')
         self.do_indent = False
         self.indent += ' ' * len('Coordination(')
         i = len(node.coords)
         for c in node.coords:
             i -= 1
             c.accept(self)
-            self.data += ',\n'
+            self.write(',\n')
             self.do_indent = True
-        self.data += self.indent + 'conj={0}'.format(repr(node.conj))
+        self.write(self.indent + 'conj={0}'.format(repr(node.conj)))
         self.do_indent = True
-        self.data += ')'
+        self.write(')')
         self.indent = self.indent[:-len('Coordination(')]
 
-    def clear(self):
-        self.data = ''
-
     def __str__(self):
         return self.data.strip()
 
@@ -538,54 +742,55 @@ class StrVisitor(PrintVisitor):
         return 'StrVisitor({0})'.format(self.data)
 
 
-class SimpleStrVisitor(PrintVisitor):
+class SimpleStrVisitor(_TextBuffer, PrintVisitor):
     """Collect strings of an element and its sub-elements."""
 
     def __init__(self, data='', depth=0, indent='', sep=',\n'):
         super(SimpleStrVisitor, self).__init__(depth, indent, sep)
+        self._chunks = []
         self.data = data
         self.do_indent = True
 
     def msg_spec(self, node):
-        if self.do_indent: self.data += self.indent
-        self.data = ' '.join((self.data, node))
+        if self.do_indent: self.write(self.indent)
+        self.write(' ', node)
 
     def element(self, _):
         pass
 
     def string(self, node):
-        if self.do_indent: self.data += self.indent
-        self.data = ' '.join((self.data, str(node.value)))
+        if self.do_indent: self.write(self.indent)
+        self.write(' ', str(node.value))
 
     def word(self, node):
-        if self.do_indent: self.data += self.indent
-        self.data = ' '.join((self.data, str(node.word)))
+        if self.do_indent: self.write(self.indent)
+        self.write(' ', str(node.word))
 
     def var(self, node):
-        if self.do_indent: self.data += self.indent
+        if self.do_indent: self.write(self.indent)
         if node.value == Element():
-            self.data = ' '.join((self.data, str(node.id)))
+            self.write(' ', str(node.id))
         else:
-            self.data = ' '.join((self.data, str(node.value)))
+            self.write(' ', str(node.value))
 
     def noun_phrase(self, node):
         if node.specifier != Element():
             node.specifier.accept(self)
-        for mod in node.premodifiers:
+        for mod in _constituents(node, 'premodifiers'):
             mod.accept(self)
         node.head.accept(self)
-        for mod in node.complements:
+        for mod in _constituents(node, 'complements'):
             mod.accept(self)
-        for mod in node.postmodifiers:
+        for mod in _constituents(node, 'postmodifiers'):
             mod.accept(self)
 
     def phrase(self, node, _=''):
-        for mod in node.premodifiers:
+        for mod in _constituents(node, 'premodifiers'):
             mod.accept(self)
         node.head.accept(self)
-        for mod in node.complements:
+        for mod in _constituents(node, 'complements'):
             mod.accept(self)
-        for mod in node.postmodifiers:
+        for mod in _constituents(node, 'postmodifiers'):
             mod.accept(self)
 
     def verb_phrase(self, node):
@@ -601,17 +806,17 @@ class SimpleStrVisitor(PrintVisitor):
         self.phrase(node, 'AdverbPhrase')
 
     def clause(self, node):
-        for mod in node.front_modifiers:
+        for mod in _constituents(node, 'front_modifiers'):
             mod.accept(self)
         if node.subject:
             node.subject.accept(self)
-        for mod in node.premodifiers:
+        for mod in _constituents(node, 'premodifiers'):
             mod.accept(self)
         if node.predicate:
             node.predicate.accept(self)
-        for mod in node.complements:
+        for mod in _constituents(node, 'complements'):
             mod.accept(self)
-        for mod in node.postmodifiers:
+        for mod in _constituents(node, 'postmodifiers'):
             mod.accept(self)
 
     def coordination(self, node):
@@ -620,14 +825,11 @@ class SimpleStrVisitor(PrintVisitor):
         for c in node.coords[1:]:
             i -= 1
             if i > 0:
-                self.data += ', '
+                self.write(', ')
             else:
-                self.data += ' ' + str(node.conj)
+                self.write(' ' + str(node.conj))
             c.accept(self)
 
-    def clear(self):
-        self.data = ''
-
     def __str__(self):
         return self.data.strip()
 
@@ -641,113 +843,29 @@ class ElementVisitor:
     def __init__(self):
         self.elements = []
 
-    def _process_elements(self, node, name):
-        attr = getattr(node, name)
-        for o in attr:
-            o.accept(self)
+    def _collect(self, node):
+        self.elements.extend(iter_elements(node))
 
-    def _process_element(self, node, name):
-        o = getattr(node, name)
-        o.accept(self)
-
-    def element(self):
-        pass
-
-    def string(self, node):
-        self.elements.append(node)
-
-    def word(self, node):
-        self.elements.append(node)
-
-    def var(self, node):
-        self.elements.append(node)
-
-    def noun_phrase(self, node):
-        self._process_element(node, 'specifier')
-        self._process_elements(node, 'premodifiers')
-        self._process_element(node, 'head')
-        self._process_elements(node, 'complements')
-        self._process_elements(node, 'postmodifiers')
-
-    def phrase(self, node):
-        self._process_elements(node, 'premodifiers')
-        self._process_element(node, 'head')
-        self._process_elements(node, 'complements')
-        self._process_elements(node, 'postmodifiers')
-
-    def verb_phrase(self, node):
-        self.phrase(node)
-
-    def preposition_phrase(self, node):
-        self.phrase(node)
-
-    def adjective_phrase(self, node):
-        self.phrase(node)
-
-    def adverb_phrase(self, node):
-        self.phrase(node)
-
-    def coordination(self, node):
-        self._process_elements(node, 'coords')
+    element = string = word = var = _collect
+    noun_phrase = phrase = verb_phrase = preposition_phrase = _collect
+    adjective_phrase = adverb_phrase = clause = coordination = _collect
 
 
 class ConstituentVisitor:
-    """ This visitor collects all elements of a syntax tree. """
+    """ This visitor collects all elements of a syntax tree
+    (each element precedes its constituents).
+
+    """
 
     def __init__(self):
         self.elements = []
 
-    def _process_elements(self, node, name):
-        attr = getattr(node, name)
-        for o in attr:
-            o.accept(self)
-
-    def _process_element(self, node, name):
-        o = getattr(node, name)
-        o.accept(self)
-
-    def element(self):
-        pass
-
-    def string(self, node):
-        self.elements.append(node)
-
-    def word(self, node):
-        self.elements.append(node)
-
-    def var(self, node):
-        self.elements.append(node)
-
-    def noun_phrase(self, node):
-        self.elements.append(self)
-        self._process_element(node, 'specifier')
-        self._process_elements(node, 'premodifiers')
-        self._process_element(node, 'head')
-        self._process_elements(node, 'complements')
-        self._process_elements(node, 'postmodifiers')
-
-    def phrase(self, node):
-        self.elements.append(self)
-        self._process_elements(node, 'premodifiers')
-        self._process_element(node, 'head')
-        self._process_elements(node, 'complements')
-        self._process_elements(node, 'postmodifiers')
+    def _collect(self, node):
+        self.elements.extend(x for x in traverse(node, PRE_ORDER) if x.category != category.ELEMENT)
 
-    def verb_phrase(self, node):
-        self.phrase(node)
-
-    def preposition_phrase(self, node):
-        self.phrase(node)
-
-    def adjective_phrase(self, node):
-        self.phrase(node)
-
-    def advp(self, node):
-        self.phrase(node)
-
-    def coordination(self, node):
-        self.elements.append(self)
-        self._process_elements(node, 'coords')
+    element = string = word = var = _collect
+    noun_phrase = phrase = verb_phrase = preposition_phrase = _collect
+    adjective_phrase = adverb_phrase = clause = coordination = _collect
 
 
 def sentence_iterator(sent):
@@ -759,11 +877,11 @@ def sentence_iterator(sent):
         return
 
     if isinstance(sent, Phrase):
-        for o in reversed(sent.postmodifiers):
+        for o in reversed(_constituents(sent, 'postmodifiers')):
             for x in sentence_iterator(o):
                 yield x
 
-        for o in reversed(sent.complements):
+        for o in reversed(_constituents(sent, 'complements')):
             for x in sentence_iterator(o):
                 yield x
 
@@ -771,7 +889,7 @@ def sentence_iterator(sent):
             for x in sentence_iterator(sent.head):
                 yield x
 
-        for o in reversed(sent.premodifiers):
+        for o in reversed(_constituents(sent, 'premodifiers')):
             for x in sentence_iterator(o):
                 yield x
 
@@ -794,15 +912,15 @@ def aggregation_sentence_iterator(sent):
         return
 
     if isinstance(sent, Phrase):
-        for o in reversed(sent.postmodifiers):
+        for o in reversed(_constituents(sent, 'postmodifiers')):
             for x in sentence_iterator(o):
                 yield x
 
-    for o in reversed(sent.complements):
+    for o in reversed(_constituents(sent, 'complements')):
         for x in sentence_iterator(o):
             yield x
 
-    for o in reversed(sent.premodifiers):
+    for o in reversed(_constituents(sent, 'premodifiers')):
         for x in sentence_iterator(o):
             yield x
 
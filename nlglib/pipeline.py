@@ -0,0 +1,355 @@
+"""This module contains a pipeline that runs the stages of generation
+(eg lexicalisation, aggregation and realisation) over a stream of inputs.
+
+The stages are the existing callables of the library:
+
+    pipeline = Pipeline(
+        formula_to_rst,
+        Lexicaliser(templates=templates),
+        SentenceAggregator(),
+        Realiser(),
+    )
+    text = pipeline(expr('Play(john, guitar)'))
+
+    for result in pipeline.run(formulas, executor='process', chunksize=100):
+        if result.error is not None:
+            log.warning('input %d failed: %s', result.index, result.error)
+        else:
+            save(result.output)
+
+`Pipeline.run()` sends the inputs to a pool of processes (or threads)
+in chunks and yields a `PipelineResult` for each input. An input that
+raises an exception in one of the stages produces a result with
+a `StageError` and the remaining inputs are processed as usual.
+
+When the pipeline creates the pool of processes, the stages are sent
+to each worker once (when the worker starts); the chunks contain
+only the inputs. The stages therefore have to be picklable unless the
+processes are started by forking (the default on Linux). Lists of element
+trees and documents are passed between the processes using `nlglib.codec`,
+other values are pickled.
+
+"""
+
+import logging
+import os
+import traceback
+
+from collections import namedtuple, deque
+from concurrent.futures import (
+    Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor, FIRST_COMPLETED, wait,
+)
+from concurrent.futures.process import BrokenProcessPool
+from itertools import islice
+
+from nlglib import codec, metrics
+from nlglib.microplanning.struct import Element
+from nlglib.macroplanning.struct import Document, Paragraph, RhetRel, MsgSpec
+
+__all__ = ['Pipeline', 'PipelineResult', 'StageError']
+
+PipelineResult = namedtuple('PipelineResult', 'index input output error')
+PipelineResult.__doc__ = """The result of processing one input by a pipeline.
+
+`index` is the position of the input in the stream, `output` is the value
+returned by the last stage or None and `error` is a `StageError` or None.
+
+"""
+
+# the values passed between processes using `nlglib.codec`
+_TREES = (Element, Document, Paragraph, RhetRel, MsgSpec)
+
+
+class StageError(Exception):
+    """An exception raised by a stage of a pipeline while processing an input.
+
+    The error keeps the name of the stage, the type and message
+    of the original exception and its formatted traceback
+    so that it can be passed between processes.
+
+    """
+
+    def __init__(self, stage, error_type, message, tb=''):
+        super().__init__(stage, error_type, message, tb)
+        self.stage = stage
+        self.error_type = error_type
+        self.message = message
+        self.traceback = tb
+
+    def __str__(self):
+        return '{0}: {1}: {2}'.format(self.stage, self.error_type, self.message)
+
+    @classmethod
+    def from_exception(cls, stage, exc):
+        tb = ''.join(traceback.format_exception(type(exc), exc, exc.__traceback__))
+        return cls(stage, type(exc).__name__, str(exc), tb)
+
+
+class Pipeline(object):
+    """A sequence of stages applied to each input.
+
+    Each stage is a callable taking one argument (the output
+    of the previous stage). Calling the pipeline runs the stages
+    on a single input; `run()` processes a stream of inputs.
+
+    """
+
+    def __init__(self, *stages, logger=None):
+        """Create a new pipeline running `stages` in the given order. """
+        if not stages:
+            raise ValueError('A pipeline needs at least one stage.')
+        for stage in stages:
+            if not callable(stage):
+                raise TypeError('The stage {0!r} is not callable.'.format(stage))
+        self.stages = stages
+        self.logger = logger or logging.getLogger(__name__)
+
+    def __repr__(self):
+        return '<Pipeline {0}>'.format(' -> '.join(_stage_name(s) for s in self.stages))
+
+    def __call__(self, item):
+        """Run the stages on `item` and return the output of the last one. """
+        for stage in self.stages:
+            if metrics.sink is None:
+                item = stage(item)
+            else:
+                item = metrics.call(_stage_name(stage), stage, item)
+        return item
+
+    def process(self, item):
+        """Run the stages on `item` and return a pair (output, error)
+
+        The error is a `StageError` if one of the stages raised an exception
+        (the output is then None) or None otherwise.
+
+        """
+        stage = None
+        try:
+            for stage in self.stages:
+                if metrics.sink is None:
+                    item = stage(item)
+                else:
+                    item = metrics.call(_stage_name(stage), stage, item)
+            return item, None
+        except Exception as e:
+            return None, StageError.from_exception(_stage_name(stage), e)
+
+    def run(self, items, executor='process', workers=None, chunksize=1,
+            ordered=True, max_pending=None):
+        """Process the inputs from the iterable `items` and yield a `PipelineResult`
+        for each of them.
+
+        :param executor: 'process' or 'thread' to run the stages in a new pool
+            of processes or threads, None to run them in this thread or
+            an instance of `concurrent.futures.Executor` (which is not shut down)
+        :param int workers: the number of workers of a new pool (default os.cpu_count())
+        :param int chunksize: the number of inputs sent to a worker at once
+        :param bool ordered: if True, the results are yielded in the order of
+            the inputs; otherwise they are yielded as soon as they are ready
+        :param int max_pending: the maximum number of chunks submitted
+            and not yet yielded (default twice the number of workers);
+            the inputs are read from `items` only as needed to keep this
+            number of chunks in progress
+
+        An exception raised by a stage is returned as a `StageError` in the
+        result of the particular input. If a chunk fails as a whole
+        (eg the inputs cannot be pickled), all its inputs get the error.
+        If a worker process of a pool created by the pipeline dies, the pool
+        is replaced and the chunks that failed with it are processed again
+        one at a time (and the chunk that kills a worker again one input
+        at a time) so that only the input that kills the worker fails.
+
+        """
+        if chunksize < 1:
+            raise ValueError('The chunksize has to be positive.')
+        if executor is None:
+            for i, item in enumerate(items):
+                output, error = self.process(item)
+                yield PipelineResult(i, item, output, error)
+            return
+
+        owned = not isinstance(executor, Executor)
+        if owned:
+            if executor not in ('process', 'thread'):
+                raise ValueError('Unknown executor {0!r}.'.format(executor))
+            workers = workers or os.cpu_count() or 1
+            pool = self._create_pool(executor, workers)
+        else:
+            pool = executor
+            workers = workers or getattr(pool, '_max_workers', None) or os.cpu_count() or 1
+        max_pending = max_pending or 2 * workers
+        chunks = _chunks(items, chunksize)
+        # (future, index of the first input, inputs)
+        pending = deque()
+        try:
+            while True:
+                for index, chunk in islice(chunks, max_pending - len(pending)):
+                    pending.append((self._submit(pool, chunk, owned), index, chunk))
+                if not pending:
+                    break
+                if ordered:
+                    # `future.result()` below waits for the chunk
+                    done = [pending.popleft()]
+                else:
+                    finished, _ = wait([p[0] for p in pending], return_when=FIRST_COMPLETED)
+                    done = [p for p in pending if p[0] in finished]
+                    pending = deque(p for p in pending if p[0] not in finished)
+                for n, (future, index, chunk) in enumerate(done):
+                    try:
+                        outputs, errors = future.result()
+                        outputs = _unpack(outputs)
+                    except Exception as e:
+                        if owned and isinstance(e, BrokenProcessPool):
+                            # the chunks in progress failed with the pool; run them again
+                            others = done[n + 1:] + list(pending)
+                            pending.clear()
+                            wait([f for f, _, _ in others])
+                            results = []
+                            suspects = [(index, chunk)]
+                            for f, i, c in others:
+                                if f.exception() is None:
+                                    outputs, errors = f.result()
+                                    results.extend(_results(i, c, _unpack(outputs), errors))
+                                else:
+                                    suspects.append((i, c))
+                            pool, recovered = self._recover(pool, executor, workers, suspects)
+                            results.extend(recovered)
+                            results.sort(key=lambda r: r.index)
+                            yield from results
+                            break
+                        self.logger.exception('Processing of inputs %d-%d failed.',
+                                              index, index + len(chunk) - 1)
+                        error = StageError.from_exception(repr(self), e)
+                        outputs, errors = [None] * len(chunk), {i: error for i in range(len(chunk))}
+                    yield from _results(index, chunk, outputs, errors)
+        finally:
+            for future, _, _ in pending:
+                future.cancel()
+            if owned:
+                pool.shutdown(wait=True)
+
+    def _recover(self, pool, kind, workers, chunks):
+        """Replace the broken `pool` and process the chunks that were in progress
+        on it one at a time; return the new pool and a list of results.
+
+        The chunks run alone so that only the chunk that breaks the pool again
+        fails; its inputs are then processed one by one to find the input
+        that breaks the pool.
+
+        """
+        self.logger.warning('A worker process died; processing %d chunks one at a time.',
+                            len(chunks))
+        pool.shutdown(wait=False)
+        pool = self._create_pool(kind, workers)
+        results = []
+        for index, chunk in chunks:
+            pool, outputs, errors = self._process_alone(pool, kind, workers, index, chunk)
+            results.extend(_results(index, chunk, outputs, errors))
+        return pool, results
+
+    def _process_alone(self, pool, kind, workers, index, chunk):
+        """Process a chunk while no other chunk is in progress
+        and return the pool (replaced if it broke), the outputs and the errors.
+
+        """
+        try:
+            outputs, errors = self._submit_chunk(pool, chunk, True).result()
+            return pool, _unpack(outputs), errors
+        except BrokenProcessPool as e:
+            pool.shutdown(wait=False)
+            pool = self._create_pool(kind, workers)
+            if len(chunk) == 1:
+                self.logger.error('Processing of input %d killed a worker process.', index)
+                return pool, [None], {0: StageError.from_exception(repr(self), e)}
+            outputs, errors = [], {}
+            for i, item in enumerate(chunk):
+                pool, output, error = self._process_alone(pool, kind, workers, index + i, [item])
+                outputs.extend(output)
+                if error:
+                    errors[i] = error[0]
+            return pool, outputs, errors
+        except Exception as e:
+            self.logger.exception('Processing of inputs %d-%d failed.',
+                                  index, index + len(chunk) - 1)
+            error = StageError.from_exception(repr(self), e)
+            return pool, [None] * len(chunk), {i: error for i in range(len(chunk))}
+
+    def _create_pool(self, kind, workers):
+        if kind == 'thread':
+            return ThreadPoolExecutor(max_workers=workers)
+        return ProcessPoolExecutor(max_workers=workers,
+                                   initializer=_init_worker, initargs=(self,))
+
+    def _submit(self, pool, chunk, owned):
+        try:
+            return self._submit_chunk(pool, chunk, owned)
+        except Exception as e:  # eg the pool broke; report the error with the chunk
+            future = Future()
+            future.set_exception(e)
+            return future
+
+    def _submit_chunk(self, pool, chunk, owned):
+        if isinstance(pool, ThreadPoolExecutor):
+            return pool.submit(_process_chunk, chunk, self, False)
+        if owned:
+            # the worker already has the pipeline (see `_init_worker()`)
+            return pool.submit(_process_chunk, _pack(chunk))
+        return pool.submit(_process_chunk, _pack(chunk), self)
+
+
+# the pipeline of a worker process created by `Pipeline.run()`
+_worker_pipeline = None
+
+
+def _init_worker(pipeline):
+    global _worker_pipeline
+    _worker_pipeline = pipeline
+
+
+def _process_chunk(chunk, pipeline=None, pack=True):
+    """Process a chunk of inputs and return the outputs and a dict of errors. """
+    pipeline = pipeline or _worker_pipeline
+    outputs = []
+    errors = {}
+    for i, item in enumerate(_unpack(chunk)):
+        output, error = pipeline.process(item)
+        outputs.append(output)
+        if error is not None:
+            errors[i] = error
+    return (_pack(outputs) if pack else outputs), errors
+
+
+def _results(index, chunk, outputs, errors):
+    """Return a list of `PipelineResult` for a chunk starting at input `index`. """
+    return [PipelineResult(index + i, item, output, errors.get(i))
+            for i, (item, output) in enumerate(zip(chunk, outputs))]
+
+
+def _pack(values):
+    """Encode a list containing trees using `nlglib.codec`; return other lists unchanged. """
+    if any(isinstance(v, _TREES) for v in values):
+        try:
+            return codec.dumps(values)
+        except (TypeError, ValueError):  # values not supported by the codec -- pickle them
+            pass
+    return values
+
+
+def _unpack(data):
+    return codec.loads(data) if isinstance(data, bytes) else data
+
+
+def _chunks(items, chunksize):
+    """Yield pairs (index of the first item, list of items) from an iterable. """
+    it = iter(items)
+    index = 0
+    while True:
+        chunk = list(islice(it, chunksize))
+        if not chunk:
+            return
+        yield index, chunk
+        index += len(chunk)
+
+
+def _stage_name(stage):
+    return getattr(stage, '__name__', type(stage).__name__)
@@ -1,7 +1,8 @@
 import logging
 
+from nlglib import metrics
 from nlglib.macroplanning import Document, Paragraph
-from nlglib.microplanning import is_clause_type
+from nlglib.microplanning import Element, is_clause_type
 from nlglib.features import category, NUMBER, GENDER, CASE, TENSE, NEGATED, MODAL, FeatureGroup
 from nlglib.utils import flatten
 
@@ -13,8 +14,15 @@ complementiser = FeatureGroup('complementiser')
 
 class Realiser(object):
 
-    def __init__(self, logger=None):
+    def __init__(self, logger=None, cache=None):
+        """Create a new realiser.
+
+        :param cache: a `nlglib.realisation.cache.RealisationCache` used for
+                      realising elements or None to realise each element anew
+
+        """
         self.logger = logger or logging.getLogger(__name__)
+        self.cache = cache
 
     def __call__(self, msg, **kwargs):
         return self.realise(msg, **kwargs)
@@ -28,9 +36,17 @@ class Realiser(object):
         List, set and tuple are realised by `element_list()`. Lastly,
         if no method matches, return `str(msg)`.
 
+        If the realiser has a cache, the realisations of elements are looked up
+        in the cache first.
+
         """
+        if self.cache is not None and isinstance(msg, Element):
+            return self.cache.realise(msg, self._realise, **kwargs)
+        return self._realise(msg, **kwargs)
+
+    def _realise(self, msg, **kwargs):
         cat = msg.category if hasattr(msg, 'category') else type(msg).__name__
-        self.logger.debug('Realising {0}: {1}'.format(cat, repr(msg)))
+        self.logger.debug('Realising %s: %r', cat, msg)
 
         if msg is None:
             return ''
@@ -42,18 +58,29 @@ class Realiser(object):
         attribute = cat.lower()
         if hasattr(self, attribute):
             fn = getattr(self, attribute)
-            return fn(msg, **kwargs)
         elif cat in category.element_category:
-            return self.element(msg, **kwargs)
+            fn = self.element
         elif isinstance(msg, (list, set, tuple)):
-            return self.element_list(msg, **kwargs)
+            fn = self.element_list
         else:
             return str(msg)
+        if metrics.sink is not None:
+            return metrics.call(type(self).__name__ + '.' + fn.__name__, fn, msg, **kwargs)
+        return fn(msg, **kwargs)
+
+    def realise_many(self, elements, **kwargs):
+        """Realise each of the given elements and return a list of strings.
+
+        Subclasses that use an external realiser can override the method
+        to realise the elements in fewer requests.
+
+        """
+        return [self.realise(x, **kwargs) for x in elements]
 
     # noinspection PyUnusedLocal
     def element(self, elt, **kwargs):
         """ Realise NLG element. """
-        self.logger.debug('Realising element (simple realisation):\n{0}'.format(repr(elt)))
+        self.logger.debug('Realising element (simple realisation):\n%r', elt)
         v = RealisationVisitor()
         elt.accept(v)
         result = str(v).replace(' ,', ',')
@@ -65,22 +92,22 @@ class Realiser(object):
     # noinspection PyUnusedLocal
     def message_specification(self, msg, **kwargs):
         """ Realise message specification - this should not happen """
-        self.logger.error('Realising message spec:\n{0}'.format(repr(msg)))
+        self.logger.error('Realising message spec:\n%r', msg)
         return str(msg).strip()
 
     def element_list(self, elt, **kwargs):
         """ Realise a list. """
-        self.logger.debug('Realising list of elements:\n{0}'.format(repr(elt)))
+        self.logger.debug('Realising list of elements:\n%r', elt)
         return ' '.join(self.realise(x, **kwargs) for x in elt)
 
     def rst_relation(self, msg, **kwargs):
         """ Return a copy of Message with strings. """
-        self.logger.debug('Realising message:\n{0}'.format(repr(msg)))
+        self.logger.debug('Realising message:\n%r', msg)
         if msg is None: return None
         nuclei = [self.realise(n, **kwargs) for n in msg.nuclei]
         satellite = self.realise(msg.satellite, **kwargs)
         sentences = flatten(nuclei + [satellite])
-        self.logger.debug('flattened sentences: %s' % sentences)
+        self.logger.debug('flattened sentences: %s', sentences)
         return ' '.join(sentences).strip()
 
     def document(self, msg, **kwargs):
@@ -0,0 +1,186 @@
+"""This module contains a cache of realisations that can be used by realisers.
+
+The cache maps the fingerprint of an element (see `Element.fingerprint()`)
+to the text the element was realised to. Identical elements are therefore
+realised only once. The cache keeps at most `maxsize` realisations in memory
+(discarding the least recently used ones) for at most `ttl` seconds.
+Optionally, the realisations can be written through to a persistent store
+(e.g., `DiskStore`) that can be shared by several processes.
+
+Example:
+
+    cache = RealisationCache(maxsize=10000, store=DiskStore('realisations.db'))
+    realiser = Realiser(cache=cache)
+
+"""
+
+import dbm
+import threading
+import time
+
+from collections import OrderedDict, namedtuple
+
+__all__ = ['RealisationCache', 'CacheStats', 'DiskStore']
+
+
+CacheStats = namedtuple('CacheStats', 'hits store_hits misses evictions size')
+CacheStats.__doc__ = """Statistics of a `RealisationCache`.
+
+`hits` counts the realisations found in memory, `store_hits` the ones found
+in the persistent store and `misses` the ones that were not found.
+`evictions` counts the realisations removed from memory because of the size
+limit or expiry and `size` is the number of realisations in memory.
+
+"""
+
+
+class RealisationCache(object):
+    """A thread-safe LRU cache of realisations with an optional time to live. """
+
+    def __init__(self, maxsize=1024, ttl=None, store=None, timer=time.monotonic):
+        """Create a new cache.
+
+        :param maxsize: the maximum number of realisations kept in memory
+                        (None for no limit)
+        :param ttl: the number of seconds a realisation is kept in memory
+                    (None for no limit); the persistent store is not affected
+        :param store: a mapping of strings to strings used as a persistent store
+        :param timer: the function returning the current time (in seconds)
+
+        """
+        if maxsize is not None and maxsize < 1:
+            raise ValueError('The size of the cache has to be at least 1.')
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.store = store
+        self.timer = timer
+        self._data = OrderedDict()  # key -> (expiry time or None, realisation)
+        self._lock = threading.RLock()
+        self._hits = 0
+        self._store_hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    @staticmethod
+    def key(element, **kwargs):
+        """Return the key of `element` realised with the given keyword arguments. """
+        rv = element.fingerprint()
+        if kwargs:
+            rv += repr(sorted(kwargs.items()))
+        return rv
+
+    def get(self, key, default=None):
+        """Return the realisation stored under `key` or `default`. """
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                expires, value = entry
+                if expires is None or expires > self.timer():
+                    self._data.move_to_end(key)
+                    self._hits += 1
+                    return value
+                del self._data[key]
+                self._evictions += 1
+            value = self.store.get(key) if self.store is not None else None
+            if value is None:
+                self._misses += 1
+                return default
+            self._store_hits += 1
+            self._insert(key, value)
+            return value
+
+    def put(self, key, value):
+        """Store the realisation `value` under `key`. """
+        with self._lock:
+            self._insert(key, value)
+            if self.store is not None:
+                self.store[key] = value
+
+    def _insert(self, key, value):
+        expires = self.timer() + self.ttl if self.ttl is not None else None
+        self._data[key] = (expires, value)
+        self._data.move_to_end(key)
+        while self.maxsize is not None and len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self._evictions += 1
+
+    def realise(self, element, fn, **kwargs):
+        """Return the cached realisation of `element`;
+        call `fn(element, **kwargs)` and cache the result on a miss.
+
+        """
+        key = self.key(element, **kwargs)
+        rv = self.get(key)
+        if rv is None:
+            rv = fn(element, **kwargs)
+            self.put(key, rv)
+        return rv
+
+    def stats(self):
+        """Return the statistics of the cache as `CacheStats`. """
+        with self._lock:
+            return CacheStats(self._hits, self._store_hits, self._misses,
+                              self._evictions, len(self._data))
+
+    def clear(self):
+        """Remove all realisations from memory and reset the statistics.
+        The persistent store is not affected.
+
+        """
+        with self._lock:
+            self._data.clear()
+            self._hits = self._store_hits = self._misses = self._evictions = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        """Return True if an unexpired realisation of `key` is in memory. """
+        with self._lock:
+            entry = self._data.get(key)
+            return entry is not None and (entry[0] is None or entry[0] > self.timer())
+
+
+class DiskStore(object):
+    """A persistent store of realisations in a `dbm` database.
+
+    The store can be shared by processes that open it one at a time;
+    for concurrent access from several processes or hosts,
+    use any other mapping of strings to strings (e.g., a wrapper of a key-value store).
+
+    """
+
+    def __init__(self, path, encoding='utf-8'):
+        self.path = path
+        self.encoding = encoding
+        self._db = dbm.open(path, 'c')
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            value = self._db.get(key.encode(self.encoding))
+        return default if value is None else value.decode(self.encoding)
+
+    def __getitem__(self, key):
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        with self._lock:
+            self._db[key.encode(self.encoding)] = value.encode(self.encoding)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._db)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -1,4 +1,5 @@
 """This package contains classes for realisation using SimpleNLG (over XML)."""
 
 from nlglib.realisation.simplenlg.client import SimplenlgClient, SimpleNLGServer
+from nlglib.realisation.simplenlg.client import SimpleNLGServerPool
 from nlglib.realisation.simplenlg.realisation import *
@@ -0,0 +1,303 @@
+"""This module contains an asyncio client for the SimpleNLG server
+and a realiser that uses it.
+
+The client uses the same wire format as `SimplenlgClient` (each message
+is preceded by its length as a 4-byte integer in network byte order).
+Requests are pipelined: each connection can have many requests in flight
+and the replies are matched to the requests in the order they were sent.
+
+The module is not imported by `nlglib.realisation.simplenlg` because
+it requires Python 3.5 or later.
+
+"""
+
+import asyncio
+import logging
+import time
+import urllib.parse
+
+from collections import deque
+
+from nlglib import metrics
+from nlglib.features import category
+from nlglib.microplanning import XmlVisitor
+from nlglib.macroplanning import Document, Paragraph
+from nlglib.realisation.simplenlg.client import ServerError, hton, ntoh
+from nlglib.utils import flatten
+
+__all__ = ['AsyncConnection', 'AsyncSimplenlgClient', 'AsyncRealiser']
+
+log = logging.getLogger(__name__)
+
+# a marker for using the default timeout of the client
+_default = object()
+
+
+class AsyncConnection:
+    """ A connection to a SimpleNLG server that pipelines requests. """
+
+    def __init__(self, host, port, encoding='utf-8'):
+        self.host = host
+        self.port = port
+        self.encoding = encoding
+        self._reader = None
+        self._writer = None
+        self._read_task = None
+        self._pending = deque()  # futures waiting for replies, in the order of requests
+        self._connecting = None
+
+    @property
+    def is_connected(self):
+        return self._writer is not None
+
+    @property
+    def outstanding(self):
+        """ Return the number of requests waiting for a reply. """
+        return len(self._pending)
+
+    async def connect(self):
+        """ Connect to the server unless already connected. """
+        if self._writer is not None:
+            return
+        # several requests can ask for the connection at once; connect only once
+        if self._connecting is None:
+            self._connecting = asyncio.ensure_future(self._connect())
+        try:
+            await asyncio.shield(self._connecting)
+        finally:
+            if self._connecting is not None and self._connecting.done():
+                self._connecting = None
+
+    async def _connect(self):
+        log.debug('Connecting to %s:%s', self.host, self.port)
+        self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+        self._read_task = asyncio.ensure_future(self._read_replies(self._reader))
+
+    async def request(self, data):
+        """ Send `data` (a string) and return the reply (a string). """
+        await self.connect()
+        if self._writer is None:
+            raise RuntimeError('Connection lost.')
+        loop = asyncio.get_event_loop()
+        future = loop.create_future()
+        msg = data.encode(self.encoding)
+        # write and enqueue without yielding so that the order is preserved
+        self._writer.write(hton(len(msg)) + msg)
+        self._pending.append(future)
+        metrics.increment('simplenlg.bytes_sent', len(msg) + 4)
+        try:
+            await self._writer.drain()
+            return await future
+        except asyncio.CancelledError:
+            # the reply will still arrive; the cancelled future will be skipped
+            future.cancel()
+            raise
+
+    async def _read_replies(self, reader):
+        """ Read replies and pass them to the pending requests. """
+        try:
+            while True:
+                length = ntoh(await reader.readexactly(4))
+                reply = await reader.readexactly(length)
+                metrics.increment('simplenlg.bytes_received', length + 4)
+                future = self._pending.popleft()
+                if not future.done():
+                    future.set_result(reply.decode(self.encoding))
+        except asyncio.CancelledError:
+            self._fail_pending(RuntimeError('Connection closed.'))
+            raise
+        except (asyncio.IncompleteReadError, ConnectionError, IndexError) as e:
+            log.debug('Connection to %s:%s lost (%s)', self.host, self.port, e)
+            self._fail_pending(RuntimeError('Connection lost.'))
+        finally:
+            self._reset()
+
+    def _fail_pending(self, error):
+        while self._pending:
+            future = self._pending.popleft()
+            if not future.done():
+                future.set_exception(error)
+
+    def _reset(self):
+        if self._writer is not None:
+            self._writer.close()
+        self._reader = self._writer = self._read_task = None
+
+    async def close(self):
+        """ Close the connection; pending requests fail with RuntimeError. """
+        task, writer = self._read_task, self._writer
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        if writer is not None:
+            try:
+                await writer.wait_closed()
+            except (ConnectionError, OSError):
+                pass
+
+
+class AsyncSimplenlgClient:
+    """ An asyncio client to a SimpleNLG server.
+
+    The requests are spread over at most `connections` connections,
+    each request going to the connection with the fewest outstanding requests.
+
+    """
+
+    def __init__(self, host, port, connections=2, timeout=None, retries=1, encoding='utf-8'):
+        """ Create a new client.
+
+        :param connections: the maximum number of connections to the server
+        :param timeout: the default timeout (in seconds) of a request or None
+        :param retries: the number of times a request is re-sent when the connection is lost
+
+        """
+        if connections < 1:
+            raise ValueError('The client needs at least one connection.')
+        self.host = host
+        self.port = int(port)
+        self.timeout = timeout
+        self.retries = retries
+        self.connections = [
+            AsyncConnection(self.host, self.port, encoding) for _ in range(connections)
+        ]
+
+    def _connection(self):
+        """ Return the least busy connection, preferring the open ones. """
+        return min(self.connections, key=lambda c: (c.outstanding, not c.is_connected))
+
+    async def xml_request(self, data, timeout=_default):
+        """ Send the XML `data` to the server and return the realisation.
+
+        :param timeout: the timeout of the request in seconds (None for no timeout);
+                        the default is `self.timeout`
+        :raises asyncio.TimeoutError: if the reply does not arrive in time
+
+        """
+        timeout = self.timeout if timeout is _default else timeout
+        start = time.perf_counter()
+        attempt = 0
+        while True:
+            try:
+                result = await asyncio.wait_for(self._connection().request(data), timeout)
+                break
+            except (RuntimeError, ConnectionError) as e:
+                if attempt >= self.retries:
+                    raise
+                attempt += 1
+                metrics.increment('simplenlg.retries')
+                log.debug('Request to %s:%s failed (%s); retrying.', self.host, self.port, e)
+        sink = metrics.sink
+        if sink is not None:
+            sink.observe('AsyncSimplenlgClient.xml_request', time.perf_counter() - start)
+            sink.increment('simplenlg.requests')
+        if 'Exception: XML unmarshal error' == result:
+            raise ServerError(result)
+        # decode xml symbols
+        return urllib.parse.unquote_plus(result, encoding='utf-8')
+
+    async def close(self):
+        """ Close all connections. """
+        for connection in self.connections:
+            await connection.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+
+class AsyncRealiser:
+    """Realiser that uses SimpleNLG over TCP from asyncio code.
+
+    The methods mirror those of `nlglib.realisation.basic.Realiser`
+    but they are coroutines and the constituents of documents, paragraphs,
+    lists and rhetorical relations are realised concurrently.
+
+    """
+
+    def __init__(self, client=None, host='localhost', port=40000, logger=None, **kwargs):
+        """Create a new realiser.
+
+        :param client: a client to use instead of `AsyncSimplenlgClient(host, port, **kwargs)`
+
+        """
+        self.logger = logger or logging.getLogger(__name__)
+        self.client = client if client else AsyncSimplenlgClient(host, port, **kwargs)
+
+    async def __call__(self, msg, **kwargs):
+        return await self.realise(msg, **kwargs)
+
+    async def realise(self, msg, **kwargs):
+        """Perform surface realisation of the given `msg` (convert to text)
+
+        The dispatch follows `nlglib.realisation.basic.Realiser.realise()`.
+        If `msg.realise()` returns an awaitable, it is awaited.
+
+        """
+        if msg is None:
+            return ''
+
+        if hasattr(msg, 'realise'):
+            rv = msg.realise(self, **kwargs)
+            return (await rv) if hasattr(rv, '__await__') else rv
+
+        cat = msg.category if hasattr(msg, 'category') else type(msg).__name__
+        attribute = cat.lower()
+        if hasattr(self, attribute):
+            fn = getattr(self, attribute)
+            return await fn(msg, **kwargs)
+        elif cat in category.element_category:
+            return await self.element(msg, **kwargs)
+        elif isinstance(msg, (list, set, tuple)):
+            return await self.element_list(msg, **kwargs)
+        else:
+            return str(msg)
+
+    async def _realise_all(self, items, **kwargs):
+        return await asyncio.gather(*[self.realise(x, **kwargs) for x in items])
+
+    # noinspection PyUnusedLocal
+    async def element(self, elt, **kwargs):
+        """ Realise NLG element. """
+        if not elt.string:
+            return ''
+        v = XmlVisitor(compact=True)
+        elt.accept(v)
+        result = await self.client.xml_request(v.to_xml())
+        return result.replace(' ,', ',')
+
+    # noinspection PyUnusedLocal
+    async def message_specification(self, msg, **kwargs):
+        """ Realise message specification - this should not happen """
+        self.logger.error('Realising message spec:\n%r', msg)
+        return str(msg).strip()
+
+    async def element_list(self, elt, **kwargs):
+        """ Realise a list. """
+        return ' '.join(await self._realise_all(elt, **kwargs))
+
+    async def rst_relation(self, msg, **kwargs):
+        """ Realise the nuclei and the satellite of the relation. """
+        if msg is None: return None
+        results = await self._realise_all(list(msg.nuclei) + [msg.satellite], **kwargs)
+        return ' '.join(flatten(results)).strip()
+
+    async def document(self, msg, **kwargs):
+        """ Return a copy of a Document with strings. """
+        if msg is None:
+            return None
+        title, *sections = await self._realise_all([msg.title] + list(msg.sections), **kwargs)
+        if not kwargs.get('keep_title_punctuation') and title.endswith('.'):
+            title = title[:-1]
+        return Document(title, *sections)
+
+    async def paragraph(self, msg, **kwargs):
+        """ Return a copy of a Paragraph with strings. """
+        if msg is None:
+            return None
+        return Paragraph(*(await self._realise_all(msg.sentences, **kwargs)))
@@ -1,4 +1,5 @@
 import os
+import selectors
 import socket
 import struct
 import subprocess
@@ -6,7 +7,11 @@ import threading
 import time
 import logging
 import urllib.parse
+import warnings
 
+from collections import deque
+
+from nlglib import metrics
 from nlglib.utils import LogPipe
 
 log = logging.getLogger(__name__)
@@ -26,6 +31,29 @@ def ntoh(num):
     return struct.unpack('!I', num)[0]
 
 
+def port_is_open(host, port, timeout=1.0):
+    """ Return True if a TCP connection to `host`:`port` can be established."""
+    try:
+        with socket.create_connection((host, int(port)), timeout=timeout):
+            return True
+    except OSError:
+        return False
+
+
+def free_ports(count):
+    """ Return a list of `count` TCP ports that are currently free. """
+    sockets = []
+    try:
+        for _ in range(count):
+            s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            sockets.append(s)
+            s.bind(('', 0))
+        return [s.getsockname()[1] for s in sockets]
+    finally:
+        for s in sockets:
+            s.close()
+
+
 class Socket:
     """ A smarter version of a socket that can send and receive data easily."""
 
@@ -69,14 +97,12 @@ class Socket:
 
     def send_string(self, msg, encoding='utf-8'):
         """ Send a string message. """
-        # first sent the length of the message
-        msg_size = hton(len(msg))
-        self._send(msg_size, len(msg_size))
-
-        # now send the message
         msg_data = bytearray(msg, encoding)
-        length = self._send(msg_data, len(msg_data))
-        return length
+        # the message is preceded by its length (in bytes); send both at once
+        # so that the request is not delayed by Nagle's algorithm
+        packet = hton(len(msg_data)) + msg_data
+        self._send(packet, len(packet))
+        return len(msg_data)
 
     def recv_string(self, encoding='utf-8'):
         """ Read a string from the server. """
@@ -87,6 +113,24 @@ class Socket:
         msg = self._recv(length)
         return msg.decode(encoding)
 
+    def is_alive(self):
+        """ Return True if the socket is connected and the server did not
+        close the connection.
+
+        """
+        if self.socket is None:
+            return False
+        # unlike select.select(), the selectors work with any file descriptor
+        try:
+            with selectors.DefaultSelector() as selector:
+                selector.register(self.socket, selectors.EVENT_READ)
+                readable = selector.select(0)
+        except (OSError, ValueError):
+            return False
+        # an idle connection has nothing to read; a readable socket
+        # means that the server closed it (or sent unexpected data)
+        return not readable
+
     def close(self):
         """ Close the connection, informing the server first."""
         try:
@@ -94,8 +138,9 @@ class Socket:
             # self.socket.shutdown(socket.SHUT_RDWR)
             if self.socket is not None:
                 self.socket.close()
+                self.socket = None
         except OSError as e:
-            log.exception('Socket.close() caught an exception: %s' % str(e))
+            log.exception('Socket.close() caught an exception: %s', e)
             raise
 
     # allow the use in 'with' statement
@@ -107,26 +152,164 @@ class Socket:
         self.close()
 
 
+class ConnectionPool:
+    """ A thread-safe pool of connections (`Socket` instances) to a server.
+
+    At most `size` connections are open at any time; a thread asking for
+    a connection when all of them are in use waits until one is released.
+    Idle connections are reused (the most recently used first) unless
+    they were idle for longer than `idle_timeout` seconds or the server
+    closed them, in which case they are closed and replaced by new ones.
+
+    """
+
+    def __init__(self, host, port, size=4, idle_timeout=60.0):
+        if size < 1:
+            raise ValueError('The size of the pool has to be at least 1.')
+        self.host = host
+        self.port = port
+        self.size = size
+        self.idle_timeout = idle_timeout
+        self._idle = deque()  # (socket, time of release)
+        self._open = 0  # number of connections (idle or in use)
+        self._cv = threading.Condition()
+
+    def acquire(self, timeout=None):
+        """ Return a connected socket from the pool.
+
+        :param timeout: the time to wait for a connection if all are in use;
+                        wait indefinitely if None
+        :raises ServerError: if no connection became available in time
+
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cv:
+            while True:
+                while self._idle:
+                    sock, released = self._idle.pop()
+                    if (time.monotonic() - released <= self.idle_timeout and sock.is_alive()):
+                        return sock
+                    log.debug('Closing stale connection to %s:%s', self.host, self.port)
+                    self._discard(sock)
+                if self._open < self.size:
+                    self._open += 1
+                    break
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise ServerError('Timed out waiting for a connection to {0}:{1}.'
+                                      .format(self.host, self.port))
+                self._cv.wait(remaining)
+        # connect outside of the lock so that other threads are not blocked
+        sock = Socket(self.host, self.port)
+        try:
+            sock.connect()
+        except BaseException:
+            with self._cv:
+                self._open -= 1
+                self._cv.notify()
+            raise
+        return sock
+
+    def release(self, sock, discard=False):
+        """ Return the socket to the pool; close it if `discard` is True. """
+        with self._cv:
+            if discard or sock.socket is None:
+                self._discard(sock)
+            else:
+                self._idle.append((sock, time.monotonic()))
+            self._cv.notify()
+
+    def close(self):
+        """ Close all idle connections. """
+        with self._cv:
+            while self._idle:
+                sock, _ = self._idle.pop()
+                self._discard(sock)
+
+    def _discard(self, sock):
+        self._open -= 1
+        try:
+            sock.close()
+        except OSError:
+            pass
+
+
 class SimplenlgClient:
     """ A class that acts as a client to a simplenlg server.
         The host and port are configured through the settings file.
 
+        The client keeps a pool of connections (see `ConnectionPool`)
+        and can be shared by multiple threads.
+
     """
 
-    def __init__(self, host, port):
-        log.debug('Starting SimplenlgClient(%s:%s)' % (str(host), str(port)))
+    def __init__(self, host, port, pool_size=4, idle_timeout=60.0, retries=1):
+        """ Create a new client.
+
+        :param pool_size: the maximum number of open connections
+        :param idle_timeout: idle connections older than this (in seconds) are closed
+        :param retries: the number of times a request is re-sent over a new connection
+                        when the connection is lost
+
+        """
+        log.debug('Starting SimplenlgClient(%s:%s)', host, port)
         self.host = host
         self.port = int(port)
-        self.socket = Socket(self.host, self.port)
+        self.retries = retries
+        self.pool = ConnectionPool(self.host, self.port, size=pool_size, idle_timeout=idle_timeout)
 
     def xml_request(self, data):
-        with self.socket as sock:
-            sock.send_string(data)
-            result = sock.recv_string()
-            if 'Exception: XML unmarshal error' == result:
-                raise ServerError(result)
-            # decode xml symbols
-            return urllib.parse.unquote_plus(result, encoding='utf-8')
+        """ Send the XML `data` to the server and return the realisation. """
+        if metrics.sink is not None:
+            return metrics.call('SimplenlgClient.xml_request', self._xml_request, data)
+        return self._xml_request(data)
+
+    def _xml_request(self, data):
+        attempt = 0
+        while True:
+            sock = self.pool.acquire()
+            try:
+                sent = sock.send_string(data)
+                result = sock.recv_string()
+            except (RuntimeError, ConnectionError) as e:
+                self.pool.release(sock, discard=True)
+                if attempt >= self.retries:
+                    raise
+                attempt += 1
+                metrics.increment('simplenlg.retries')
+                log.debug('Connection to %s:%s failed (%s); reconnecting.', self.host, self.port, e)
+                continue
+            except BaseException:
+                self.pool.release(sock, discard=True)
+                raise
+            self.pool.release(sock)
+            break
+        if metrics.sink is not None:
+            # each message is preceded by its length (4 bytes); the reply
+            # is URL-encoded (ASCII) so its length is the number of bytes
+            metrics.increment('simplenlg.requests')
+            metrics.increment('simplenlg.bytes_sent', sent + 4)
+            metrics.increment('simplenlg.bytes_received', len(result) + 4)
+        if 'Exception: XML unmarshal error' == result:
+            raise ServerError(result)
+        # decode xml symbols
+        return urllib.parse.unquote_plus(result, encoding='utf-8')
+
+    @property
+    def socket(self):
+        """ Return a new (unconnected) `Socket` to the server.
+
+        Deprecated: the client keeps a pool of connections; use `xml_request()`
+        or `self.pool.acquire()` and `self.pool.release()`.
+
+        """
+        warnings.warn('SimplenlgClient.socket is deprecated; use SimplenlgClient.pool',
+                      DeprecationWarning, stacklevel=2)
+        return Socket(self.host, self.port)
+
+    def close(self):
+        """ Close the idle connections. """
+        self.pool.close()
 
 
 class SimpleNLGServer(threading.Thread):
@@ -138,96 +321,175 @@ class SimpleNLGServer(threading.Thread):
     synchronisation. In particular, the caller should call the start() method
     after creating the object and wait for the startup to finish.
 
+    The server is considered started when it accepts connections on its port
+    (which has to be free when the server is started).
+    The port is probed with an increasing interval (starting at `probe_interval`
+    and multiplied by `backoff` up to `max_probe_interval` seconds) until
+    `startup_timeout` seconds elapse. If the process exits or the timeout
+    expires, waiting for the startup raises `ServerError`. The time the startup
+    took is stored in `startup_time` and recorded as `SimpleNLGServer.startup`
+    if the instrumentation is enabled (see `nlglib.metrics`).
+
     """
 
-    def __init__(self, jar_path, port):
+    def __init__(self, jar_path, port, host='localhost', startup_timeout=30.0,
+                 probe_interval=0.05, max_probe_interval=1.0, backoff=2.0):
         super(SimpleNLGServer, self).__init__()
-        log.debug('Creating simpleNLG server (%s)' % jar_path)
-        log.debug('simpleNLG server port: ' + str(port))
+        log.debug('Creating simpleNLG server (%s)', jar_path)
+        log.debug('simpleNLG server port: %s', port)
         if not os.path.exists(jar_path):
             msg = 'The simpleNLG jar file "{}" does not exist.'
             raise ServerError(msg.format(jar_path))
         self.jar_path = jar_path
         self.port = str(port)
+        self.host = host
+        self.startup_timeout = startup_timeout
+        self.probe_interval = probe_interval
+        self.max_probe_interval = max_probe_interval
+        self.backoff = backoff
+        self.startup_time = None
+        self.process = None
         self.start_cv = threading.Condition()
         self.exit_cv = threading.Condition()
         self._ready = False
+        self._error = None
         self._shutdown = False
         self.error_log = LogPipe(logging.getLogger('nlglib.simplenlg.server').error)
         self.output_log = LogPipe(logging.getLogger('nlglib.simplenlg.server').debug)
 
-    def start(self):
+    def start(self, wait=True):
         """ Start the server (calling run() on a different thread) and wait for
         it to initialise.
-        Note that the caller will block until the thread starts.
+        Note that the caller will block until the thread starts
+        unless `wait` is False (use `wait_for_init()` later).
 
         """
-        log.debug('Starting simpleNLG server (%s)' % self.jar_path)
+        log.debug('Starting simpleNLG server (%s)', self.jar_path)
         super(SimpleNLGServer, self).start()
-        self._wait_for_startup()
-        log.info('Server up and running (%s)', self.port)
+        if wait:
+            self._wait_for_startup()
+            log.info('Server up and running (%s)', self.port)
+
+    def command(self):
+        """ Return the command (list of arguments) that starts the server. """
+        return ['java', '-Xmx512m', '-jar', self.jar_path, self.port]
+
+    def has_exited(self):
+        """ Return True if the server process was started and terminated. """
+        return self.process is not None and self.process.poll() is not None
 
     def run(self):
         """ Start up SimpleNLG server as a subprocess and wait until someone
         signals that the server should be shut down using do_shutdown().
 
         """
-        args = ['java', '-Xmx512m', '-jar', self.jar_path, self.port]
+        args = self.command()
+        started = time.monotonic()
+        if port_is_open(self.host, self.port, timeout=self.max_probe_interval):
+            # the probe would succeed even if the server failed to bind the port
+            msg = 'Could not start SimpleNLG server: the port {0} is already in use.'
+            self._signal_startup_done(ServerError(msg.format(self.port)))
+            return
         with self.error_log, self.output_log:
-            with subprocess.Popen(
-                args,
-                stdin=subprocess.PIPE,
-                stdout=self.output_log,
-                stderr=self.error_log,
-                universal_newlines=True
-            ) as proc:
+            try:
+                proc = subprocess.Popen(
+                    args,
+                    stdin=subprocess.PIPE,
+                    stdout=self.output_log,
+                    stderr=self.error_log,
+                    universal_newlines=True
+                )
+            except OSError as e:
+                self._signal_startup_done(ServerError('Could not start SimpleNLG server: %s' % e))
+                return
+            with proc:
+                self.process = proc
                 # use a condition variable to signal that the process is running
-                time.sleep(1)
-                self._signal_startup_done()
+                error = self._wait_until_listening(proc, started)
+                self._signal_startup_done(error)
+                if error is not None:
+                    proc.kill()
+                    return
                 self._wait_for_shutdown()
                 try:
                     out, errs = proc.communicate('exit\n', timeout=5)
                     if out:
-                        log.debug('Server output: "{0}"'.format(out))
+                        log.debug('Server output: "%s"', out)
                     if errs:
-                        log.error('Server errors: "{0}"'.format(errs))
+                        log.error('Server errors: "%s"', errs)
                 except subprocess.TimeoutExpired:
                     proc.kill()
 
+    def _wait_until_listening(self, proc, started):
+        """ Probe the port until the server accepts connections.
+
+        :return: None if the server started; otherwise a `ServerError`
+
+        """
+        deadline = started + self.startup_timeout
+        interval = self.probe_interval
+        while True:
+            if proc.poll() is not None:
+                msg = 'SimpleNLG server ({0}) exited during startup with code {1}.'
+                return ServerError(msg.format(self.port, proc.returncode))
+            if port_is_open(self.host, self.port, timeout=self.max_probe_interval):
+                if proc.poll() is not None:
+                    # another process accepted the connection
+                    msg = 'SimpleNLG server ({0}) exited during startup with code {1}.'
+                    return ServerError(msg.format(self.port, proc.returncode))
+                self.startup_time = time.monotonic() - started
+                log.info('SimpleNLG server (%s) started in %.3fs', self.port, self.startup_time)
+                sink = metrics.sink
+                if sink is not None:
+                    sink.observe('SimpleNLGServer.startup', self.startup_time)
+                return None
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                msg = 'SimpleNLG server ({0}) did not start within {1}s.'
+                return ServerError(msg.format(self.port, self.startup_timeout))
+            time.sleep(min(interval, remaining))
+            interval = min(interval * self.backoff, self.max_probe_interval)
+
     def is_ready(self):
         """ Return true if the server is initialised. """
         with self.start_cv:
             ready = self._ready
-        log.debug('SimpleNLG server (%s) is ready' % self.jar_path)
+        log.debug('SimpleNLG server (%s) is ready', self.jar_path)
         return ready
 
     def wait_for_init(self):
-        """ Block until server is ready. """
-        log.debug('SimpleNLG server (%s): waiting for init...' % self.jar_path)
+        """ Block until server is ready; raise `ServerError` if it failed to start. """
+        log.debug('SimpleNLG server (%s): waiting for init...', self.jar_path)
         self._wait_for_startup()
-        log.debug('SimpleNLG server (%s): init done.' % self.jar_path)
+        log.debug('SimpleNLG server (%s): init done.', self.jar_path)
 
     def _wait_for_startup(self):
         """ Wait for the subprocess to start. """
-        log.debug('SimpleNLG server (%s): waiting for startup...' % self.jar_path)
+        log.debug('SimpleNLG server (%s): waiting for startup...', self.jar_path)
         with self.start_cv:
-            while not self._ready:
+            while not self._ready and self._error is None:
                 self.start_cv.wait()
-        log.debug('SimpleNLG server (%s): startup done.' % self.jar_path)
+            if self._error is not None:
+                raise self._error
+        log.debug('SimpleNLG server (%s): startup done.', self.jar_path)
 
     def _wait_for_shutdown(self):
         """Block until self._shutdown is set to true (by calling shutdown())."""
-        log.debug('SimpleNLG server (%s): is up and running...' % self.jar_path)
+        log.debug('SimpleNLG server (%s): is up and running...', self.jar_path)
         with self.exit_cv:
             while not self._shutdown:
                 self.exit_cv.wait()
 
-    def _signal_startup_done(self):
-        """ Set self._ready to True to signal that the server is running. """
+    def _signal_startup_done(self, error=None):
+        """ Set self._ready to True to signal that the server is running
+        or store the `error` that prevented it from starting.
+
+        """
         with self.start_cv:
-            self._ready = True
-            self.start_cv.notify()
-        log.debug('SimpleNLG server (%s): signalling startup done.' % self.jar_path)
+            self._ready = error is None
+            self._error = error
+            self.start_cv.notify_all()
+        log.debug('SimpleNLG server (%s): signalling startup done.', self.jar_path)
 
     def _signal_shutdown(self):
         """ Signal to the server that it should shut down the subprocess (the
@@ -237,13 +499,210 @@ class SimpleNLGServer(threading.Thread):
         with self.exit_cv:
             self._shutdown = True
             self.exit_cv.notify()
-        log.debug('SimpleNLG server (%s): signalling shutdown done.' % self.jar_path)
+        log.debug('SimpleNLG server (%s): signalling shutdown done.', self.jar_path)
 
     def shutdown(self):
         """ Signal the server that it should shut down and wait for it.
         Note that the caller of this method will block until the server exits.
 
         """
-        log.debug('Shutting down simpleNLG server (%s)' % self.jar_path)
+        log.debug('Shutting down simpleNLG server (%s)', self.jar_path)
         self._signal_shutdown()
         self.join()
+
+
+class _PoolMember:
+    """ A server in a `SimpleNLGServerPool` with its client. """
+
+    def __init__(self, port):
+        self.port = port
+        self.server = None
+        self.client = None
+        self.outstanding = 0
+        self.ready = False
+        self.lock = threading.Lock()  # serialises restarts
+
+
+class SimpleNLGServerPool:
+    """ A pool of SimpleNLG servers (java processes) that balances requests.
+
+    The pool starts `size` servers on consecutive ports starting at `port`
+    (or on free ports if `port` is None) and sends each request
+    to the server with the fewest outstanding requests among those that
+    are ready. Servers whose process terminated are restarted, both
+    (in a background thread) when a request to them fails and,
+    if `monitor_interval` is set, periodically by a monitoring thread.
+
+    The pool has the same `xml_request()` method as `SimplenlgClient`
+    so it can be used as the client of a `Realiser`::
+
+        with SimpleNLGServerPool(jar_path, size=4) as pool:
+            realiser = Realiser(client=pool)
+
+    """
+
+    def __init__(self, jar_path, size=2, port=None, host='localhost', startup_timeout=30.0,
+                 monitor_interval=5.0, server_factory=SimpleNLGServer, **client_kwargs):
+        """ Create a new pool; the servers are started by `start()`.
+
+        :param startup_timeout: the time (in seconds) a server has to start accepting connections
+        :param monitor_interval: the interval (in seconds) between checks of the processes
+                                 or None to check only when a request fails
+        :param server_factory: a callable creating a server from `jar_path`, a port
+                               and the keyword arguments `host` and `startup_timeout`
+        :param client_kwargs: arguments passed to the `SimplenlgClient` of each server
+
+        """
+        if size < 1:
+            raise ValueError('The pool needs at least one server.')
+        ports = range(int(port), int(port) + size) if port is not None else free_ports(size)
+        self.jar_path = jar_path
+        self.host = host
+        self.startup_timeout = startup_timeout
+        self.monitor_interval = monitor_interval
+        self.server_factory = server_factory
+        self.client_kwargs = client_kwargs
+        self.members = [_PoolMember(p) for p in ports]
+        self._lock = threading.Lock()
+        # notified when a server becomes ready
+        self._ready = threading.Condition(self._lock)
+        self._stopped = threading.Event()
+        self._monitor = None
+
+    @property
+    def ports(self):
+        return [m.port for m in self.members]
+
+    def start(self):
+        """ Start the servers and wait until they accept connections. """
+        self._stopped.clear()
+        for member in self.members:
+            self._start_server(member)
+        for member in self.members:
+            self._wait_until_ready(member)
+        if self.monitor_interval:
+            self._monitor = threading.Thread(target=self._monitor_servers, daemon=True)
+            self._monitor.start()
+        return self
+
+    def shutdown(self):
+        """ Stop the monitoring thread and shut down the servers. """
+        self._stopped.set()
+        with self._lock:
+            self._ready.notify_all()
+        if self._monitor is not None:
+            self._monitor.join()
+            self._monitor = None
+        for member in self.members:
+            with member.lock:
+                self._stop_server(member)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.shutdown()
+
+    def xml_request(self, data):
+        """ Send the request to the least busy server that is ready; if the server
+        fails, try the other servers.
+
+        A server whose process terminated is restarted in the background
+        so the request does not wait for it.
+
+        :raises ServerError: if no server becomes ready within `startup_timeout`
+
+        """
+        tried = []
+        while True:
+            member, client = self._acquire(tried)
+            try:
+                return client.xml_request(data)
+            except (OSError, RuntimeError) as e:
+                log.warning('Request to SimpleNLG server on port %s failed: %s', member.port, e)
+                tried.append(member)
+                self._restart_in_background(member)
+                if len(tried) >= len(self.members):
+                    raise
+            finally:
+                self._release(member)
+
+    def check(self, member=None):
+        """ Restart the server (or all servers) whose process terminated. """
+        for m in [member] if member else self.members:
+            with m.lock:
+                if m.server is not None and m.server.has_exited() and not self._stopped.is_set():
+                    log.warning('SimpleNLG server on port %s exited; restarting.', m.port)
+                    self._stop_server(m)
+                    self._start_server(m)
+                    self._wait_until_ready(m)
+
+    def _acquire(self, tried):
+        """ Return the least busy ready server not in `tried` and its client;
+        wait for a server to become ready if there is none.
+
+        """
+        deadline = time.monotonic() + self.startup_timeout
+        with self._lock:
+            while True:
+                candidates = [m for m in self.members if m.ready and m not in tried]
+                if candidates:
+                    member = min(candidates, key=lambda m: m.outstanding)
+                    member.outstanding += 1
+                    return member, member.client
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or self._stopped.is_set():
+                    raise ServerError('No SimpleNLG server is ready.')
+                self._ready.wait(remaining)
+
+    def _release(self, member):
+        with self._lock:
+            member.outstanding -= 1
+
+    def _restart_in_background(self, member):
+        """ Restart the server in a new thread if its process terminated. """
+        server = member.server
+        if server is None or not server.has_exited():
+            return
+        with self._lock:
+            member.ready = False
+        threading.Thread(target=self._restart, args=(member,), daemon=True).start()
+
+    def _restart(self, member):
+        try:
+            self.check(member)
+        except ServerError as e:
+            log.error('Restarting SimpleNLG server on port %s failed: %s', member.port, e)
+
+    def _start_server(self, member):
+        with self._lock:
+            member.ready = False
+        member.server = self.server_factory(
+            self.jar_path, member.port, host=self.host, startup_timeout=self.startup_timeout)
+        member.server.start(wait=False)
+
+    def _wait_until_ready(self, member):
+        """ Wait until the server accepts connections. """
+        member.server.wait_for_init()
+        client = SimplenlgClient(self.host, member.port, **self.client_kwargs)
+        with self._lock:
+            member.client = client
+            member.ready = True
+            self._ready.notify_all()
+
+    def _stop_server(self, member):
+        with self._lock:
+            member.ready = False
+            client, member.client = member.client, None
+        if client is not None:
+            client.close()
+        if member.server is not None:
+            member.server.shutdown()
+            member.server = None
+
+    def _monitor_servers(self):
+        while not self._stopped.wait(self.monitor_interval):
+            try:
+                self.check()
+            except ServerError as e:
+                log.error('Restarting SimpleNLG server failed: %s', e)
@@ -8,29 +8,159 @@ The input is a document where NLG Elements were already realised to strings.
 """
 
 import logging
+import re
 
 from nlglib.microplanning import *
+from nlglib.macroplanning import Paragraph
 
-from nlglib.realisation.simplenlg.client import SimplenlgClient
+from nlglib.realisation.simplenlg.client import SimplenlgClient, ServerError
 from nlglib.realisation.basic import Realiser as BasicRealiser
 
 __all__ = ['Realiser']
 
+# the elements of a batch are sent as paragraphs of a single document;
+# each element is followed by a paragraph with a numbered marker (canned text)
+_batch_header = XmlVisitor.header.replace('<Document cat="PARAGRAPH">', '<Document cat="DOCUMENT">')
+_batch_item_start = '<child xsi:type="DocumentElement" cat="PARAGRAPH">'
+_batch_item_end = '</child>'
+_batch_marker = 'nlglibbatch{0}'
+# SimpleNLG returns canned text unchanged except that it may capitalise it
+# and end it by a full stop; the marker takes up a whole paragraph
+_batch_marker_re = re.compile(r'^[ \t]*nlglibbatch(\d+)\.?[ \t]*$', re.IGNORECASE | re.MULTILINE)
+
 
 class Realiser(BasicRealiser):
     """Realiser that uses SimpleNLG over TCP (XML serialisation)."""
 
-    def __init__(self, client=None, host='localhost', port=40000, logger=None):
-        self.logger = logger or logging.getLogger(__name__)
+    def __init__(self, client=None, host='localhost', port=40000, logger=None,
+                 batch_size=100, cache=None):
+        """Create a new realiser.
+
+        :param client: a client to use instead of `SimplenlgClient(host, port)`
+        :param batch_size: the maximum number of elements sent in one request
+                           by `realise_many()`
+        :param cache: a `nlglib.realisation.cache.RealisationCache` used for
+                      realising elements or None to realise each element anew
+
+        """
+        super().__init__(logger or logging.getLogger(__name__), cache)
         self.client = client if client else SimplenlgClient(host, port)
+        self.batch_size = batch_size
 
     def element(self, elt, **kwargs):
         """ Realise NLG element. """
-        self.logger.debug('Realising element:\n{0}'.format(repr(elt)))
+        self.logger.debug('Realising element:\n%r', elt)
         if not elt.string:
             return ''
-        v = XmlVisitor()
+        v = XmlVisitor(compact=True)
         elt.accept(v)
-        self.logger.debug('XML for realisation:\n{0}'.format(v.to_xml()))
-        result = self.client.xml_request(v.to_xml())
-        return result.replace(' ,', ',')
+        xml = v.to_xml()
+        self.logger.debug('XML for realisation:\n%s', xml)
+        result = self.client.xml_request(xml)
+        return _normalise(result)
+
+    def paragraph(self, msg, **kwargs):
+        """ Return a copy of a Paragraph with strings.
+
+        The sentences are realised using `realise_many()`.
+
+        """
+        self.logger.debug('Realising paragraph.')
+        if msg is None:
+            return None
+        return Paragraph(*self.realise_many(msg.sentences, **kwargs))
+
+    def realise_many(self, elements, **kwargs):
+        """Realise the given elements using as few requests as possible.
+
+        The elements are sent to the server in batches of at most
+        `self.batch_size` elements. If the server fails to realise a batch,
+        the elements in the batch are realised one by one. Objects that are
+        not elements (e.g., strings) are realised by `realise()`.
+        If the realiser has a cache, only the elements that are not in the cache
+        are sent to the server and each distinct element is sent only once.
+
+        :param elements: an iterable of elements to realise
+        :return: a list with a string for each of the elements
+
+        """
+        elements = list(elements)
+        rv = [''] * len(elements)
+        pending = []
+        # indices of elements with the same key as the pending element (when caching)
+        duplicates = {}
+        for i, elt in enumerate(elements):
+            if not isinstance(elt, Element):
+                rv[i] = self.realise(elt, **kwargs)
+            elif not elt.string:
+                continue
+            elif self.cache is None:
+                pending.append(i)
+            else:
+                key = self.cache.key(elt, **kwargs)
+                if key in duplicates:
+                    duplicates[key].append(i)
+                    continue
+                result = self.cache.get(key)
+                if result is None:
+                    duplicates[key] = [i]
+                    pending.append(i)
+                else:
+                    rv[i] = result
+        for start in range(0, len(pending), self.batch_size):
+            batch = pending[start:start + self.batch_size]
+            results = self._realise_batch([elements[i] for i in batch], **kwargs)
+            for i, result in zip(batch, results):
+                rv[i] = result
+        for key, indices in duplicates.items():
+            result = rv[indices[0]]
+            self.cache.put(key, result)
+            for i in indices[1:]:
+                rv[i] = result
+        return rv
+
+    def _realise_batch(self, elements, **kwargs):
+        """Realise the elements in one request; fall back to one request per element."""
+        if len(elements) == 1:
+            return [self.element(elements[0], **kwargs)]
+        v = XmlVisitor(compact=True)
+        v.write(_batch_header)
+        for i, elt in enumerate(elements):
+            v.write(_batch_item_start)
+            elt.accept(v)
+            v.write(_batch_item_end)
+            v.write(_batch_item_start)
+            String(_batch_marker.format(i)).accept(v)
+            v.write(_batch_item_end)
+        v.write(XmlVisitor.footer)
+        xml = v.xml.strip()
+        self.logger.debug('XML for batch realisation:\n%s', xml)
+        try:
+            results = _split_batch(self.client.xml_request(xml), len(elements))
+        except ServerError as e:
+            self.logger.warning(
+                'Batch realisation of %d elements failed (%s); realising one by one.',
+                len(elements), e)
+            return [self.element(elt, **kwargs) for elt in elements]
+        return [_normalise(x) for x in results]
+
+
+def _split_batch(result, n):
+    """Return the realisations of `n` elements from the reply to a batch request.
+
+    The realisation of each element is the text before its marker
+    so an empty realisation or one with blank lines does not shift
+    the others. Raise `ServerError` if the markers are missing or out of order.
+
+    """
+    parts = _batch_marker_re.split(result)
+    # text, number, text, number, ..., text after the last marker
+    numbers = parts[1::2]
+    if numbers != [str(i) for i in range(n)] or parts[-1].strip():
+        msg = 'Unexpected reply to a batch of {0} elements (markers {1}).'
+        raise ServerError(msg.format(n, ', '.join(numbers) or 'missing'))
+    return parts[0:-1:2]
+
+
+def _normalise(text):
+    return text.strip().replace(' ,', ',')
@@ -3,6 +3,7 @@ import unittest
 from nlglib.features import NUMBER
 from nlglib.microplanning import *
 from nlglib.aggregation import SentenceAggregator
+from nlglib.aggregation import equal_except, replacement_path, skeleton_signature
 
 
 class TestAggregation(unittest.TestCase):
@@ -74,6 +75,78 @@ class TestAggregation(unittest.TestCase):
             VP('wrote', NP('an', 'article')))
         self.assertEqual(expected, c3)
 
+    def test_try_to_aggregate_does_not_modify_arguments(self):
+        c1 = Clause(Male('John'), VP('wrote', NP('an', 'article')))
+        c2 = Clause(Female('Marry'), VP('wrote', NP('an', 'article')))
+        r1, r2 = repr(c1), repr(c2)
+        self.assertIsNotNone(self.aggregator.try_to_aggregate(c1, c2))
+        self.assertEqual(r1, repr(c1))
+        self.assertEqual(r2, repr(c2))
+
+    def test_try_to_aggregate_different(self):
+        c1 = Clause(Male('John'), VP('wrote', NP('an', 'article')))
+        c2 = Clause(Female('Marry'), VP('read', NP('a', 'book')))
+        self.assertIsNone(self.aggregator.try_to_aggregate(c1, c2))
+
+    def test_equal_except(self):
+        c1 = Clause(Male('John'), VP('wrote', NP('an', 'article')))
+        c2 = Clause(Female('Marry'), VP('wrote', NP('an', 'article')))
+        subject = replacement_path(c1, c1.subject)
+        verb = replacement_path(c1, c1.predicate.head)
+        self.assertEqual((('_subject', None),), subject)
+        self.assertTrue(equal_except(c1, c2, subject))
+        self.assertFalse(equal_except(c1, c2, verb))
+
+    def test_equal_except_front_modifiers(self):
+        c1 = Clause(Male('John'), VP('wrote', NP('an', 'article')))
+        c2 = Clause(Female('Marry'), VP('wrote', NP('an', 'article')),
+                    front_modifiers=[Adverb('yesterday')])
+        self.assertFalse(equal_except(c1, c2, replacement_path(c1, c1.subject)))
+        self.assertIsNone(self.aggregator.try_to_aggregate(c1, c2))
+
+    def test_aggregated_coordination_features(self):
+        def clause(name):
+            return Clause(NP('the', 'john'),
+                          VP('eat', NP('the', 'mary'), postmodifiers=[PP('near', NP('the', name))]))
+
+        c3 = self.aggregator.try_to_aggregate(clause('apple'), clause('john'))
+        cc = c3.predicate.postmodifiers[0]
+        self.assertIsInstance(cc, Coordination)
+        # the coordination does not take the discourse function of another constituent
+        self.assertEqual({NUMBER.plural}, set(cc.features))
+        self.assertEqual(['near', 'near'], [str(pp.head) for pp in cc.coords])
+
+    def test_synt_aggregation_bucketed(self):
+        elements = [
+            Clause(Male('John'), VP('wrote', NP('an', 'article'))),
+            Clause(Female('Marry'), VP('wrote', NP('an', 'article'))),
+            Clause(Male('Peter'), VP('wrote', NP('an', 'article'))),
+            Clause(Male('John'), VP('is', AdjP('tall'))),
+        ]
+        expected = self.aggregator.synt_aggregation(elements)
+        actual = self.aggregator.synt_aggregation(elements, bucketed=True)
+        self.assertEqual(2, len(actual))
+        self.assertEqual(expected, actual)
+
+    def test_synt_aggregation_window(self):
+        elements = [
+            Clause(Male('John'), VP('runs')),
+            Clause(Female('Marry'), VP('is', AdjP('tall'))),
+            Clause(Male('John'), VP('walks')),
+        ]
+        actual = self.aggregator.synt_aggregation(elements, bucketed=True)
+        self.assertEqual(3, len(actual))
+        actual = self.aggregator.synt_aggregation(elements, bucketed=True, window=2)
+        self.assertEqual(['John runs and walks', 'Marry is tall'], [str(x) for x in actual])
+
+    def test_skeleton_signature(self):
+        c1 = Clause(Male('John'), VP('wrote', NP('an', 'article')))
+        c2 = Clause(Female('Marry'), VP('wrote', NP('an', 'article')))
+        subject = replacement_path(c1, c1.subject)
+        verb = replacement_path(c1, c1.predicate.head)
+        self.assertEqual(skeleton_signature(c1, subject), skeleton_signature(c2, subject))
+        self.assertNotEqual(skeleton_signature(c1, verb), skeleton_signature(c2, verb))
+
 
 if __name__ == '__main__':
     unittest.main()
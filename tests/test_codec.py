@@ -0,0 +1,154 @@
+import io
+import json
+import unittest
+
+from nlglib import codec
+from nlglib.features import NUMBER, TENSE, FeatureSet
+from nlglib.macroplanning import Document, Paragraph, RhetRel, MsgSpec, StringMsg, PredicateMsg
+from nlglib.microplanning import *
+
+
+class Message(MsgSpec):
+    """ A message defined outside of the library. """
+
+    def __init__(self, name, arg):
+        super().__init__(name)
+        self.arg = arg
+
+
+class TestCodec(unittest.TestCase):
+
+    @staticmethod
+    def get_clause(noun='truck'):
+        return Clause(
+            NP('the', 'big', noun, features={'NUMBER': 'plural'}),
+            VP('move', NP('the', 'crate'), PP('to', NP('the', 'depot')),
+               features={'TENSE': 'past'}),
+            front_modifiers=['yesterday'],
+            postmodifiers=[Adverb('quickly')],
+        )
+
+    def test_round_trip_elements(self):
+        for e in (self.get_clause(), Word('truck', 'NOUN'), String('Hello'),
+                  Var('x', NP('the', 'truck')), Coordination(NP('a', 'dog'), NP('a', 'cat'), conj='or'),
+                  AdjP('very', 'big'), AdvP('quickly'), ElementList([Noun('x'), Noun('y')])):
+            rv = codec.loads(codec.dumps(e))
+            self.assertIsNot(e, rv)
+            self.assertEqual(e, rv)
+            self.assertEqual(repr(e), repr(rv))
+
+    def test_round_trip_values(self):
+        values = [None, True, False, 0, -1, 2 ** 70, -2 ** 70, 0.5, '', 'žluťoučký kůň', b'\x00',
+                  (1, 'a'), {'a': [1, 2], 'b': {}}, [], (), FeatureSet([NUMBER.plural]), TENSE.past]
+        self.assertEqual(values, codec.loads(codec.dumps(values)))
+
+    def test_round_trip_document(self):
+        doc = Document(
+            'Title',
+            Paragraph(self.get_clause(), self.get_clause('car')),
+            RhetRel('Elaboration', self.get_clause(), satellite='and so on'),
+            StringMsg('canned text'),
+            PredicateMsg('sleep', 'john', features={'TENSE': 'past'}),
+            Message('custom', [1, 2]),
+        )
+        rv = codec.loads(codec.dumps(doc))
+        self.assertEqual(doc, rv)
+        self.assertEqual(repr(doc), repr(rv))
+        relation = rv.sections[1]
+        self.assertIs(relation.nuclei[0], relation.order[0])
+        self.assertIs(relation.satellite, relation.order[1])
+        self.assertIsInstance(rv.sections[4], Message)
+        self.assertEqual([1, 2], rv.sections[4].arg)
+
+    def test_parents(self):
+        c = self.get_clause()
+        rv = codec.loads(codec.dumps(c))
+        self.assertIsNone(rv.parent)
+        for e in rv.elements(recursive=True):
+            self.assertIsNotNone(e.parent)
+        self.assertIs(rv, rv.subject.parent)
+        self.assertIs(rv, rv.front_modifiers.parent)
+        self.assertIs(rv, rv.front_modifiers[0].parent)
+        self.assertIs(rv.predicate, rv.predicate.complements[0].parent)
+        coord = codec.loads(codec.dumps(Coordination(Noun('x'), Noun('y'))))
+        self.assertIs(coord, coord.coords.parent)
+        self.assertIs(coord, coord.coords[1].parent)
+
+    def test_no_modification(self):
+        c = self.get_clause()
+        hash(c)
+        clone = c.clone()
+        json_before, hash_before = c.to_json(), c.hash
+        codec.dumps([c, clone])
+        self.assertEqual(json_before, c.to_json())
+        self.assertEqual(hash_before, c.hash)
+        self.assertTrue(clone._cow)
+        self.assertIs(c._subject, clone._subject)
+        self.assertIs(VP('go')._complements, c._subject._complements)
+
+    def test_shared_subtrees(self):
+        np = NP('the', 'truck')
+        payload = codec.dumps([np, np, np])
+        self.assertLess(len(payload), len(codec.dumps([np, NP('the', 'truck'), NP('the', 'truck')])))
+        rv = codec.loads(payload)
+        self.assertIs(rv[0], rv[1])
+        self.assertIs(rv[0], rv[2])
+
+    def test_clones(self):
+        c = self.get_clause()
+        original, clone = codec.loads(codec.dumps([c, c.clone()]))
+        self.assertIs(original._subject, clone._subject)
+        clone.subject = NP('a', 'car')
+        self.assertEqual(self.get_clause(), original)
+        self.assertEqual('a car', str(clone.subject))
+
+    def test_shared_empty_lists(self):
+        rv = codec.loads(codec.dumps(NP('the', 'truck')))
+        self.assertIs(VP('go')._complements, rv._complements)
+        rv.complements.append(Noun('x'))
+        self.assertIs(rv, rv.complements.parent)
+        self.assertEqual(0, len(VP('go').complements))
+
+    def test_extra_attributes(self):
+        c = self.get_clause()
+        c.annotation = {'source': 'test'}
+        self.assertEqual({'source': 'test'}, codec.loads(codec.dumps(c)).annotation)
+
+    def test_deep_tree(self):
+        e = Noun('x')
+        for _ in range(5000):
+            e = PrepositionPhrase(Preposition('in'), e)
+        rv = codec.loads(codec.dumps(e))
+        self.assertEqual(5001, len(list(rv.elements(recursive=True))))
+
+    def test_dump_and_load(self):
+        f = io.BytesIO()
+        codec.dump(self.get_clause(), f)
+        f.seek(0)
+        self.assertEqual(self.get_clause(), codec.load(f))
+
+    def test_size(self):
+        clauses = ElementList([self.get_clause() for _ in range(20)])
+        payload = codec.dumps(clauses)
+        self.assertLess(len(payload) * 10, len(json.dumps(clauses, cls=ElementEncoder)))
+
+    def test_unsupported_values(self):
+        self.assertRaises(TypeError, codec.dumps, object())
+        self.assertRaises(TypeError, codec.dumps, {1, 2})
+        self.assertRaises(TypeError, codec.dumps, Var('x', object()))
+
+    def test_errors(self):
+        payload = codec.dumps(self.get_clause())
+        self.assertRaises(codec.DecodeError, codec.loads, b'')
+        self.assertRaises(codec.DecodeError, codec.loads, b'{"__class__": ""}')
+        self.assertRaises(codec.DecodeError, codec.loads, codec.MAGIC + bytes([99]) + payload[4:])
+        self.assertRaises(codec.DecodeError, codec.loads, payload[:-3])
+        self.assertRaises(codec.DecodeError, codec.loads, payload + b'\x00')
+
+    def test_memoryview(self):
+        payload = codec.dumps(self.get_clause())
+        self.assertEqual(self.get_clause(), codec.loads(memoryview(payload)))
+
+
+if __name__ == '__main__':
+    unittest.main()
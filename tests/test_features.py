@@ -1,5 +1,9 @@
+import gc
+import pickle
 import unittest
 
+from copy import copy, deepcopy
+
 from nlglib.features import Feature, FeatureGroup, FeatureSet
 
 
@@ -24,6 +28,39 @@ class TestFeature(unittest.TestCase):
         singular = Feature('NUMBER', 'singular')
         self.assertEqual('<Feature NUMBER: singular>', repr(singular))
 
+    def test_interned(self):
+        number = FeatureGroup('NUMBER', 'singular', 'plural')
+        self.assertIs(number.plural, Feature('NUMBER', 'plural'))
+        self.assertIs(Feature('NUMBER', 'plural'), Feature('NUMBER', 'plural'))
+        self.assertIsNot(Feature('NUMBER', 'plural'), Feature('NUMBER', 'singular'))
+        self.assertIsNot(Feature('NUMBER', 'plural'), Feature('number', 'plural'))
+        self.assertIsNot(Feature('FOO', 1), Feature('FOO', True))
+
+    def test_interned_released(self):
+        size = len(Feature._registry)
+        features = [Feature('ID', i) for i in range(1000)]
+        self.assertIs(features[10], Feature('ID', 10))
+        self.assertEqual(size + 1000, len(Feature._registry))
+        del features
+        gc.collect()
+        self.assertEqual(size, len(Feature._registry))
+
+    def test_immutable(self):
+        singular = Feature('NUMBER', 'singular')
+        with self.assertRaises(AttributeError):
+            singular.value = 'plural'
+        self.assertEqual('singular', singular.value)
+
+    def test_copy_and_pickle(self):
+        singular = Feature('NUMBER', 'singular')
+        self.assertIs(singular, copy(singular))
+        self.assertIs(singular, deepcopy(singular))
+        self.assertIs(singular, pickle.loads(pickle.dumps(singular)))
+
+    def test_unhashable_value(self):
+        f = Feature('FOO', ['bar'])
+        self.assertEqual(Feature('FOO', ['bar']), f)
+
 
 # noinspection PyUnresolvedReferences
 class TestFeatureGroup(unittest.TestCase):
@@ -148,6 +185,41 @@ class TestFeatureSet(unittest.TestCase):
         expected = FeatureSet([self.number.plural, self.person.first])
         self.assertEqual(expected, fs)
 
+    def test_multiple_values_in_group(self):
+        fs = FeatureSet([self.number.singular, self.number.plural, self.person.first])
+        self.assertEqual(3, len(fs))
+        self.assertIn(self.number.singular, fs)
+        self.assertIn(self.number.plural, fs)
+        self.assertEqual(self.number.singular, fs[self.number])
+        fs.replace(self.number.plural)
+        self.assertEqual(FeatureSet([self.number.plural, self.person.first]), fs)
+
+    def test_discard(self):
+        fs = FeatureSet([self.number.singular, self.number.plural, self.person.first])
+        removed = fs.discard(self.number.singular)
+        self.assertEqual({self.number.singular, self.number.plural}, removed)
+        self.assertEqual(FeatureSet([self.person.first]), fs)
+        self.assertEqual(set(), fs.discard('NUMBER'))
+        del fs['PERSON']
+        self.assertFalse(fs)
+
+    def test_copy(self):
+        fs = FeatureSet([self.number.singular, self.person.first])
+        cp = fs.copy()
+        cp.add(self.number.plural)
+        cp[self.person] = self.person.third
+        self.assertEqual(FeatureSet([self.number.singular, self.person.first]), fs)
+        self.assertEqual(3, len(cp))
+
+    def test_empty_sets_do_not_share_features(self):
+        fs1, fs2 = FeatureSet(), FeatureSet()
+        fs1.add(self.number.plural)
+        self.assertEqual(0, len(fs2))
+        cp = fs2.copy()
+        cp[self.person] = self.person.first
+        self.assertFalse(fs2)
+        self.assertEqual(FeatureSet([self.person.first]), cp)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -1,9 +1,12 @@
+import os
+import pickle
+import tempfile
 import unittest
 
 from nlglib.macroplanning import MsgSpec, RhetRel, Document, StringMsg, Paragraph
-from nlglib.microplanning import Var, Clause, NounPhrase
+from nlglib.microplanning import Var, Clause, Coordination, NounPhrase
 
-from nlglib.lexicalisation import Lexicaliser
+from nlglib.lexicalisation import Lexicaliser, TemplateLibrary
 
 from nlglib.realisation.basic import Realiser
 
@@ -41,6 +44,48 @@ class TestLexicalisation(unittest.TestCase):
         expected = list(Clause('Boris', 'is', 'fast').elements(recursive=True))
         self.assertEqual(expected, list(res.elements(recursive=True)))
 
+    def test_template_is_not_modified(self):
+        """ Test that instantiating a template leaves the template intact. """
+        template = lex.templates['dummy']
+        expected = repr(template)
+        res = lex.message_specification(DummyMsg())
+        res.subject.head['NUMBER'] = 'plural'
+        self.assertEqual(expected, repr(template))
+        self.assertEqual(1, len(template.arguments()))
+
+    def test_template_is_recompiled(self):
+        """ Test that changing a registered template updates its argument paths. """
+        lexicaliser = Lexicaliser(templates={
+            'dummy': Clause(Var('arg_subject'), 'is', 'fast')
+        })
+        expected = Clause('Boris', 'is', 'fast')
+        self.assertEqual(expected, lexicaliser.message_specification(DummyMsg()))
+        lexicaliser.templates['dummy'].predicate.premodifiers.append(Var('arg_subject'))
+        expected.predicate.premodifiers.append(NounPhrase('Boris'))
+        self.assertEqual(expected, lexicaliser.message_specification(DummyMsg()))
+        lexicaliser.templates['dummy'] = Clause('Boris', 'is', Var('arg_subject'))
+        expected = Clause('Boris', 'is', NounPhrase('Boris'))
+        self.assertEqual(expected, lexicaliser.message_specification(DummyMsg()))
+
+    def test_template_is_recompiled_after_any_change(self):
+        """ Test that the argument paths follow changes of front modifiers and conjunctions. """
+        lexicaliser = Lexicaliser(templates={
+            'dummy': Clause(Var('arg_subject'), 'is', 'fast'),
+            'pair': Coordination(Var('arg_subject'), NounPhrase('Sam')),
+        })
+        msg = DummyMsg()
+        lexicaliser.message_specification(msg)
+        lexicaliser.templates['dummy'].front_modifiers.append(Var('arg_subject'))
+        result = lexicaliser.message_specification(msg)
+        self.assertEqual([NounPhrase('Boris')], list(result.front_modifiers))
+        self.assertEqual([], result.arguments())
+        msg.name = 'pair'
+        lexicaliser.message_specification(msg)
+        lexicaliser.templates['pair'].conj = Var('arg_subject')
+        result = lexicaliser.message_specification(msg)
+        self.assertEqual(NounPhrase('Boris'), result.conj)
+        self.assertEqual([], result.arguments())
+
     def test_lexicalise_rst_relation(self):
         """ Test lexicalisation of RhetRel. """
         # a rhet relation with 3 nuclei
@@ -77,5 +122,81 @@ class TestLexicalisation(unittest.TestCase):
         self.assertEqual(expected, str(actual))
 
 
+class TestTemplateLibrary(unittest.TestCase):
+
+    @staticmethod
+    def get_templates():
+        return {
+            'dummy': Clause(Var('arg_subject'), 'is', 'fast'),
+            'slow': Clause(Var('arg_subject'), 'is', 'slow'),
+        }
+
+    def test_freeze(self):
+        library = TemplateLibrary(self.get_templates())
+        self.assertFalse(library.frozen)
+        library['other'] = Clause('Boris', 'runs')
+        self.assertIs(library, library.freeze())
+        self.assertTrue(library.frozen)
+        self.assertEqual(3, len(library))
+        self.assertEqual({'dummy', 'slow', 'other'}, set(library))
+        self.assertIn('slow', library)
+        self.assertNotIn('fast', library)
+        self.assertIsNone(library.get('fast'))
+        self.assertEqual(self.get_templates()['slow'], library['slow'])
+        self.assertRaises(TypeError, library.__setitem__, 'x', Clause())
+        self.assertRaises(TypeError, library.__delitem__, 'slow')
+
+    def test_lazy_decoding(self):
+        library = TemplateLibrary(self.get_templates()).freeze()
+        self.assertEqual({}, library._decoded)
+        template = library['dummy']
+        self.assertIs(template, library['dummy'])
+        self.assertEqual(['dummy'], list(library._decoded))
+
+    def test_callable_template(self):
+        library = TemplateLibrary({'f': lambda msg, **kwargs: Clause('Boris', 'runs')})
+        self.assertRaises(TypeError, library.freeze)
+
+    def test_save_and_load(self):
+        fd, path = tempfile.mkstemp()
+        os.close(fd)
+        try:
+            TemplateLibrary(self.get_templates()).save(path)
+            for use_mmap in (False, True):
+                library = TemplateLibrary.load(path, mmap=use_mmap)
+                self.assertTrue(library.frozen)
+                self.assertEqual(self.get_templates(), dict(library.items()))
+                library.close()
+        finally:
+            os.remove(path)
+
+    def test_pickle(self):
+        library = TemplateLibrary(self.get_templates()).freeze()
+        self.assertEqual(self.get_templates()['dummy'], library['dummy'])
+        copy = pickle.loads(pickle.dumps(library))
+        self.assertTrue(copy.frozen)
+        self.assertEqual({}, copy._decoded)
+        self.assertEqual(library.to_bytes(), copy.to_bytes())
+        self.assertEqual(self.get_templates()['dummy'], copy['dummy'])
+
+    def test_invalid_data(self):
+        self.assertRaises(ValueError, TemplateLibrary.from_bytes, b'')
+        self.assertRaises(ValueError, TemplateLibrary.from_bytes, b'NLGX\x01\x00\x00\x00\x00')
+
+    def test_lexicaliser(self):
+        library = TemplateLibrary(self.get_templates()).freeze()
+        lexicaliser = Lexicaliser(templates=library)
+        self.assertIs(library, lexicaliser.templates)
+        expected = Clause('Boris', 'is', 'fast')
+        self.assertEqual(expected, lexicaliser.message_specification(DummyMsg()))
+        self.assertEqual(['dummy'], list(library._decoded))
+        # the template is not modified
+        self.assertEqual(expected, lexicaliser.message_specification(DummyMsg()))
+        self.assertEqual(self.get_templates()['dummy'], library['dummy'])
+        # the default templates are still available
+        expected = Clause(subject='this is some text')
+        self.assertEqual(expected, lexicaliser.message_specification(StringMsg('this is some text')))
+
+
 if __name__ == '__main__':
     unittest.main()
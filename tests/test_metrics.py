@@ -0,0 +1,164 @@
+import logging
+import os
+import tempfile
+import tracemalloc
+import unittest
+
+from nlglib import metrics
+from nlglib.aggregation import SentenceAggregator
+from nlglib.lexicalisation import Lexicaliser
+from nlglib.macroplanning import (
+    preprocess_content, select_content, aggregate_content, structure_content,
+)
+from nlglib.microplanning import Clause, NP, VP, Var
+from nlglib.pipeline import Pipeline
+from nlglib.realisation.basic import Realiser
+import nlglib.realisation.simplenlg as snlg
+
+from tests.test_simplenlg import EchoServer
+
+templates = {
+    'Play': Clause(NP(Var(0)), VP('play', NP(Var(1)))),
+    'Happy': Clause(NP(Var(0)), VP('be', 'happy')),
+    'john': NP('John'),
+    'guitar': NP('a', 'guitar'),
+}
+
+
+def countdown(n):
+    if n:
+        metrics.call('countdown', countdown, n - 1)
+    return n
+
+
+def generate(data):
+    lex = Lexicaliser(templates=templates)
+    content = structure_content(aggregate_content(select_content(preprocess_content(data))))
+    return str(Realiser()(SentenceAggregator()(lex(content))))
+
+
+class TestMetrics(unittest.TestCase):
+
+    def tearDown(self):
+        metrics.disable()
+
+    def test_disabled(self):
+        self.assertIsNone(metrics.sink)
+        self.assertEqual('John play a guitar.', generate('Play(john, guitar)'))
+        metrics.increment('nothing')
+        self.assertIsNone(metrics.disable())
+
+    def test_stages(self):
+        with metrics.recording() as sink:
+            text = generate('Play(john, guitar) & Happy(john)')
+        self.assertIsNone(metrics.sink)
+        self.assertEqual('John play a guitar and is happy.', text)
+        timings, _ = sink.snapshot()
+        for name in ('preprocess_content', 'select_content', 'aggregate_content',
+                     'structure_content', 'Lexicaliser.document', 'Lexicaliser.rst_relation',
+                     'Lexicaliser.message_specification', 'SentenceAggregator.document',
+                     'Realiser.document', 'Realiser.element'):
+            self.assertIn(name, timings)
+            self.assertGreater(timings[name][1], 0)
+        self.assertEqual(2, timings['Lexicaliser.message_specification'][0])
+        self.assertIn('Lexicaliser.rst_relation', sink.report())
+
+    def test_recursion(self):
+        with metrics.recording() as sink:
+            metrics.call('countdown', countdown, 5)
+            outer = sink.timings['countdown'].seconds
+        self.assertEqual(6, sink.timings['countdown'].calls)
+        # the time of the nested calls is included in the outermost one only
+        sink.clear()
+        with metrics.recording(sink):
+            metrics.call('countdown', countdown, 0)
+        self.assertEqual(1, sink.timings['countdown'].calls)
+        self.assertGreater(outer, sink.timings['countdown'].seconds)
+
+    def test_errors(self):
+        with metrics.recording() as sink:
+            self.assertRaises(ZeroDivisionError, metrics.call, 'divide', lambda: 1 / 0)
+            self.assertRaises(ZeroDivisionError, metrics.call, 'divide', lambda: 1 / 0)
+        self.assertEqual(2, sink.timings['divide'].calls)
+
+    def test_allocations(self):
+        self.assertFalse(tracemalloc.is_tracing())
+        with metrics.recording(allocations=True) as sink:
+            data = metrics.call('allocate', lambda: [[] for _ in range(1000)])
+        self.assertFalse(tracemalloc.is_tracing())
+        self.assertGreater(sink.timings['allocate'].allocated, 1000 * 32)
+        self.assertEqual(1000, len(data))
+        with metrics.recording() as sink:
+            metrics.call('allocate', lambda: [[] for _ in range(1000)])
+        self.assertEqual(0, sink.timings['allocate'].allocated)
+
+    def test_nested_recording(self):
+        outer = metrics.enable()
+        with metrics.recording() as inner:
+            metrics.increment('inner')
+        self.assertIs(outer, metrics.sink)
+        metrics.increment('outer')
+        self.assertEqual({'inner': 1}, inner.counters)
+        self.assertEqual({'outer': 1}, outer.counters)
+
+    def test_pipeline(self):
+        pipeline = Pipeline(preprocess_content, select_content, Lexicaliser(templates=templates))
+        with metrics.recording() as sink:
+            list(pipeline.run(['Play(john, guitar)', 'Happy(john)'], executor=None))
+        self.assertEqual(2, sink.timings['Lexicaliser'].calls)
+        # the decorated functions keep their names
+        self.assertEqual(4, sink.timings['select_content'].calls)
+
+    def test_simplenlg_round_trips(self):
+        server = EchoServer()
+        server.start()
+        client = snlg.SimplenlgClient('127.0.0.1', server.port)
+        try:
+            with metrics.recording() as sink:
+                for i in range(3):
+                    client.xml_request('request %d' % i)
+        finally:
+            client.close()
+            server.stop()
+        self.assertEqual(3, sink.timings['SimplenlgClient.xml_request'].calls)
+        self.assertEqual({'simplenlg.requests': 3,
+                          'simplenlg.bytes_sent': 3 * (4 + 9),
+                          'simplenlg.bytes_received': 3 * (4 + 9)}, sink.counters)
+
+    def test_logging_sink(self):
+        logger = logging.getLogger('nlglib.test_metrics')
+        with self.assertLogs(logger, logging.DEBUG) as logs:
+            with metrics.recording(metrics.LoggingSink(logger, logging.DEBUG)):
+                metrics.call('countdown', countdown, 1)
+                metrics.increment('simplenlg.requests', 2)
+        self.assertEqual(3, len(logs.records))
+        self.assertIn('countdown took', logs.output[0])
+        self.assertIn('(recursive)', logs.output[0])
+        self.assertNotIn('(recursive)', logs.output[1])
+        self.assertIn('simplenlg.requests += 2', logs.output[2])
+
+    def test_prometheus_sink(self):
+        fd, path = tempfile.mkstemp()
+        os.close(fd)
+        try:
+            with metrics.recording(metrics.PrometheusSink(path)) as sink:
+                metrics.call('Realiser.element', countdown, 0)
+                metrics.call('say "hi"', countdown, 0)
+                metrics.increment('simplenlg.bytes_sent', 10)
+            with open(path) as f:
+                text = f.read()
+        finally:
+            os.remove(path)
+        self.assertEqual(sink.render(), text)
+        lines = text.splitlines()
+        self.assertIn('# TYPE nlglib_calls_total counter', lines)
+        self.assertIn('nlglib_calls_total{name="Realiser.element"} 1', lines)
+        self.assertIn('nlglib_calls_total{name="say \\"hi\\""} 1', lines)
+        self.assertIn('nlglib_allocated_bytes_total{name="Realiser.element"} 0', lines)
+        self.assertIn('nlglib_simplenlg_bytes_sent_total 10', lines)
+        self.assertTrue(any(line.startswith('nlglib_seconds_total{name="Realiser.element"} ')
+                            for line in lines))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,9 @@
+import io
 import unittest
 
+from nlglib.features import Feature, FeatureSet
 from nlglib.microplanning import *
+from nlglib.microplanning import visitors
 
 
 class TestXmlFormatting(unittest.TestCase):
@@ -210,6 +213,73 @@ class TestXmlFormatting(unittest.TestCase):
         actual = v.xml
         self.assertEqual(expected, actual)
 
+    def test_compact(self):
+        s = Clause(NP(Noun('Arthur')), VP(Verb('smiled'), features={'TENSE': 'PAST'}))
+        v = XmlVisitor(compact=True)
+        s.accept(v)
+        expected = XmlVisitor(indent='', sep='')
+        s.accept(expected)
+        self.assertEqual(expected.xml, v.xml)
+        self.assertNotIn('\n', v.xml)
+
+    def test_output_stream(self):
+        s = Clause(NP(Noun('Arthur')), VP(Verb('smiled')))
+        out = io.StringIO()
+        v = XmlVisitor(out=out)
+        s.accept(v)
+        self.assertEqual('', v.xml)
+        expected = XmlVisitor()
+        s.accept(expected)
+        self.assertEqual(expected.xml, out.getvalue())
+
+        out = io.StringIO()
+        XmlVisitor.dump(s, out)
+        self.assertEqual(expected.to_xml(), out.getvalue().strip())
+
+    def test_write(self):
+        v = XmlVisitor('<a>')
+        String('hello').accept(v)
+        v.write('</a>')
+        self.assertTrue(v.xml.startswith('<a><child'))
+        self.assertTrue(v.xml.endswith('</child>\n</a>'))
+        v.clear()
+        self.assertEqual('', v.xml)
+
+
+    def test_attribute_cache_is_invalidated(self):
+        s = Word('smile', 'VERB', features={'TENSE': 'PAST'})
+        self.assertIn(' TENSE="PAST" cat="VERB"', s.to_xml())
+        simplenlg_features = visitors.simplenlg_features
+        simplenlg_features[Feature('TENSE', 'PAST')] = {'TENSE': 'PRESENT'}
+        try:
+            self.assertIn(' TENSE="PRESENT" cat="VERB"', s.to_xml())
+        finally:
+            del simplenlg_features[Feature('TENSE', 'PAST')]
+        self.assertIn(' TENSE="PAST" cat="VERB"', s.to_xml())
+        simplenlg_features |= {Feature('TENSE', 'PAST'): {'TENSE': 'FUTURE'}}
+        try:
+            self.assertIn(' TENSE="FUTURE" cat="VERB"', s.to_xml())
+        finally:
+            del simplenlg_features[Feature('TENSE', 'PAST')]
+        self.assertIn(' TENSE="PAST" cat="VERB"', s.to_xml())
+        self.assertIsInstance(simplenlg_features | {}, visitors.FeatureMap)
+        self.assertIsInstance({} | simplenlg_features, visitors.FeatureMap)
+
+    def test_attribute_encoder(self):
+        encoder = visitors.XmlAttributeEncoder(maxsize=2)
+        feature_map = visitors.FeatureMap()
+        features = FeatureSet([Feature('NUMBER', 'plural')])
+        expected = ' NUMBER="PLURAL" cat="NOUN"'
+        self.assertEqual(expected, encoder('NOUN', features, feature_map))
+        self.assertEqual(expected, encoder('NOUN', features, feature_map))
+        self.assertEqual((1, 1), (encoder.hits, encoder.misses))
+        encoder('VERB', features, feature_map)
+        encoder('ADJECTIVE', features, feature_map)
+        self.assertEqual(1, len(encoder))
+        # maps that do not track modifications are not cached
+        self.assertEqual(expected, encoder('NOUN', features, {}))
+        self.assertEqual(3, encoder.misses)
+
 
 class TestRepresentation(unittest.TestCase):
 
@@ -328,6 +398,40 @@ VerbPhrase(Word('put', 'VERB'),
         self.assertEqual(expected, actual)
 
 
+class TestStrVisitors(unittest.TestCase):
+
+    def test_simple_str(self):
+        s = Clause(NP('the', 'truck'), VP('move', NP('the', 'bike')))
+        v = SimpleStrVisitor()
+        s.accept(v)
+        self.assertEqual('the truck move the bike', str(v))
+        self.assertEqual('the truck move the bike', str(s))
+        c = Coordination(Noun('truck'), Noun('bike'), Noun('car'))
+        self.assertEqual('truck and bike and car', str(c))
+
+    def test_str(self):
+        s = Clause(NP('the', 'truck'), VP('move', NP('the', 'bike')))
+        expected = ("Clause(NounPhrase(Word('truck', 'NOUN'), Word('the', 'DETERMINER')),\n"
+                    "       VerbPhrase(Word('move', 'VERB'),\n"
+                    "                  NounPhrase(Word('bike', 'NOUN'), Word('the', 'DETERMINER'))))")
+        v = StrVisitor()
+        s.accept(v)
+        self.assertEqual(expected, str(v))
+        v.clear()
+        self.assertEqual('', v.data)
+
+    def test_long_coordination(self):
+        words = ['word%d' % i for i in range(2000)]
+        c = Coordination(*[Noun(w) for w in words])
+        text = str(c)
+        self.assertTrue(text.startswith('word0,'))
+        self.assertTrue(text.endswith(' and word1999'))
+        self.assertEqual(words, [w.strip(',') for w in text.split() if w != 'and'])
+        v = StrVisitor()
+        c.accept(v)
+        self.assertEqual(2000, str(v).count('Word('))
+
+
 class TestElementVisitor(unittest.TestCase):
 
     def test_string(self):
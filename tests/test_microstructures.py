@@ -1,4 +1,5 @@
 import json
+import pickle
 import unittest
 
 from copy import copy, deepcopy
@@ -959,6 +960,57 @@ xsi:schemaLocation="http://simplenlg.googlecode.com/svn/trunk/res/xml ">
         self.assertEqual(False, Var('arg_place') in list(p.elements()))
 
 
+class Sentence(Clause):
+    """ A clause defined outside of the library. """
+    __slots__ = ('source',)
+
+
+class TestJson(unittest.TestCase):
+
+    def test_unknown_class(self):
+        s = Sentence(NP('the', 'truck'), VP('move')).to_json()
+        self.assertRaises(TypeError, json.loads, s, cls=ElementDecoder)
+
+    def test_register(self):
+        try:
+            ElementDecoder.register(Sentence, tag='sentence')
+            c = Sentence(NP('the', 'truck'), VP('move'))
+            c.source = 'test'
+            s = c.to_json()
+            self.assertIn('"__class__": "sentence"', s)
+            c2 = json.loads(s, cls=ElementDecoder)
+            self.assertIsInstance(c2, Sentence)
+            self.assertEqual(c, c2)
+            self.assertEqual('test', c2.source)
+            self.assertIs(c2, c2.subject.parent)
+        finally:
+            ElementDecoder.registry.pop('sentence', None)
+            ElementDecoder.tags.pop(Sentence, None)
+
+    def test_parents(self):
+        np = NP('the', 'truck')
+        np.complements.append(PP('in', NP('the', 'depot')))
+        c = Clause(np, VP('move', NP('the', 'crate')), front_modifiers=['yesterday'])
+        lst = json.loads(json.dumps([c, {'clause': c}], cls=ElementEncoder), cls=ElementDecoder)
+        for c2 in (lst[0], lst[1]['clause']):
+            self.assertEqual(c, c2)
+            self.assertIsNone(c2.parent)
+            for e in c2.elements(recursive=True):
+                self.assertIsNotNone(e.parent)
+            self.assertIs(c2, c2.front_modifiers.parent)
+            self.assertIs(c2, c2.front_modifiers[0].parent)
+            pp = c2.subject.complements[0]
+            self.assertIs(c2.subject, pp.parent)
+            self.assertIs(pp, pp.complements[0].parent)
+
+    def test_encoder_does_not_modify(self):
+        c = Coordination(NP('the', 'truck'), NP('the', 'car'))
+        c.to_json()
+        json.dumps(c.coords, cls=ElementEncoder)
+        self.assertIs(c, c.coords.parent)
+        self.assertIs(c, c.coords[0].parent)
+
+
 class TestUtils(unittest.TestCase):
 
     def test_raise_to_element(self):
@@ -968,5 +1020,362 @@ class TestUtils(unittest.TestCase):
         self.assertEqual(expected, actual)
 
 
+class TestHashing(unittest.TestCase):
+
+    @staticmethod
+    def get_clause():
+        return Clause(NP('the', 'small', 'child'),
+                      VP('put', NP('the', 'piano'), PP('into', NP('the', 'truck'))))
+
+    def test_equal_trees_hash_equal(self):
+        c1 = self.get_clause()
+        c2 = self.get_clause()
+        self.assertEqual(hash(c1), hash(c2))
+        self.assertEqual(c1, c2)
+        self.assertEqual(hash(deepcopy(c1)), hash(c1))
+
+    def test_discourse_function_ignored(self):
+        w1 = Word('foo', 'NOUN')
+        w2 = Word('foo', 'NOUN', features={'DISCOURSE_FUNCTION': 'subject'})
+        self.assertEqual(hash(w1), hash(w2))
+        self.assertEqual(w1, w2)
+
+    def test_feature_change_invalidates(self):
+        c1 = self.get_clause()
+        c2 = self.get_clause()
+        self.assertEqual(c1, c2)
+        c2.subject.head['NUMBER'] = 'plural'
+        self.assertNotEqual(hash(c1), hash(c2))
+        self.assertNotEqual(c1, c2)
+        del c2.subject.head['NUMBER']
+        self.assertEqual(c1, c2)
+
+    def test_list_change_invalidates(self):
+        c1 = self.get_clause()
+        c2 = self.get_clause()
+        self.assertEqual(c1, c2)
+        c2.predicate.complements[0].premodifiers.append(Adjective('black'))
+        self.assertNotEqual(c1, c2)
+        del c2.predicate.complements[0].premodifiers[0]
+        self.assertEqual(c1, c2)
+
+    def test_extended_list_change_invalidates(self):
+        vp = VP('move')
+        vp.complements.extend([NP('the', 'crate')])
+        self.assertIs(vp, vp.complements[0].parent)
+        hash(vp)
+        vp2 = deepcopy(vp)
+        self.assertEqual(vp, vp2)
+        vp.complements[0]['NUMBER'] = 'plural'
+        self.assertNotEqual(vp, vp2)
+        vp2.complements[0]['NUMBER'] = 'plural'
+        self.assertEqual(vp, vp2)
+        vp.complements.extend(['fast'])
+        self.assertIsInstance(vp.complements[1], String)
+        self.assertNotEqual(vp, vp2)
+
+    def test_front_modifiers_and_conjunction_compared(self):
+        c1 = self.get_clause()
+        c2 = self.get_clause()
+        hash(c2)
+        c2.front_modifiers.append(Adverb('yesterday'))
+        self.assertNotEqual(hash(c1), hash(c2))
+        self.assertNotEqual(c1, c2)
+        c1.front_modifiers = ElementList([Adverb('yesterday')])
+        self.assertEqual(c1, c2)
+        and_ = Coordination(NP('apples'), NP('pears'))
+        or_ = Coordination(NP('apples'), NP('pears'), conj='or')
+        self.assertNotEqual(hash(and_), hash(or_))
+        self.assertNotEqual(and_, or_)
+        and_.conj.value = 'or'
+        self.assertEqual(and_, or_)
+        and_.conj = String('but')
+        self.assertNotEqual(and_, or_)
+
+    def test_setter_change_invalidates(self):
+        c1 = self.get_clause()
+        c2 = self.get_clause()
+        self.assertEqual(c1, c2)
+        c2.subject.specifier = 'a'
+        self.assertNotEqual(c1, c2)
+        c2.subject.specifier = Word('the', 'DETERMINER')
+        self.assertEqual(c1, c2)
+        c2.predicate.head.word = 'place'
+        self.assertNotEqual(c1, c2)
+
+    def test_replace_invalidates(self):
+        c1 = self.get_clause()
+        c2 = self.get_clause()
+        self.assertEqual(c1, c2)
+        self.assertTrue(c2.replace(Noun('piano'), Noun('drum')))
+        self.assertNotEqual(c1, c2)
+        c1.replace(Noun('piano'), Noun('drum'))
+        self.assertEqual(c1, c2)
+
+    def test_var_value_invalidates(self):
+        v1 = Var('x', 'foo')
+        v2 = Var('x', 'foo')
+        self.assertEqual(v1, v2)
+        v2.value['NUMBER'] = 'plural'
+        self.assertNotEqual(v1, v2)
+        v2.set_value('foo')
+        self.assertEqual(v1, v2)
+
+    def test_pickle(self):
+        c1 = self.get_clause()
+        hash(c1)
+        c2 = pickle.loads(pickle.dumps(c1))
+        self.assertEqual(c1, c2)
+        c2.subject.head['NUMBER'] = 'plural'
+        self.assertNotEqual(c1, c2)
+
+
+class TestClone(unittest.TestCase):
+
+    @staticmethod
+    def get_clause():
+        return Clause(NP('the', 'small', 'child'),
+                      VP('put', NP('the', 'piano'), PP('into', NP('the', 'truck'))))
+
+    def test_clone_is_equal(self):
+        c1 = self.get_clause()
+        c2 = c1.clone()
+        self.assertIsNot(c1, c2)
+        self.assertIsNone(c2.parent)
+        self.assertEqual(c1, c2)
+        self.assertEqual(hash(c1), hash(c2))
+        self.assertEqual(repr(c1), repr(c2))
+
+    def test_constituents_are_shared_until_accessed(self):
+        c1 = self.get_clause()
+        c2 = c1.clone()
+        self.assertIs(c1._predicate, c2._predicate)
+        vp = c2.predicate
+        self.assertIsNot(vp, c1._predicate)
+        self.assertIs(vp.parent, c2)
+        # the nested constituents are shared until accessed as well
+        self.assertIs(vp._head, c1._predicate._head)
+
+    def test_modifying_clone_keeps_original(self):
+        c1 = self.get_clause()
+        expected = deepcopy(c1)
+        c2 = c1.clone()
+        c2.subject.head['NUMBER'] = 'plural'
+        c2.predicate.complements[0].premodifiers.append(Adjective('black'))
+        self.assertTrue(c2.replace(Noun('truck'), Noun('van')))
+        self.assertEqual(expected, c1)
+        self.assertEqual(repr(expected), repr(c1))
+        self.assertNotEqual(c1, c2)
+        self.assertEqual('plural', c2.subject.head['NUMBER'].value)
+
+    def test_modifying_original_keeps_clone(self):
+        c1 = self.get_clause()
+        c2 = c1.clone()
+        expected = deepcopy(c1)
+        c1.subject.specifier = 'a'
+        c1.predicate.head = 'place'
+        self.assertEqual(expected, c2)
+        self.assertNotEqual(c1, c2)
+
+    def test_clone_features(self):
+        w1 = Word('house', 'NOUN', features={'NUMBER': 'plural'})
+        w2 = w1.clone()
+        w2['NUMBER'] = 'singular'
+        self.assertEqual('plural', w1['NUMBER'].value)
+        self.assertEqual('singular', w2['NUMBER'].value)
+
+    def test_clone_var_and_coordination(self):
+        v1 = Var('x', NP('the', 'cat'))
+        v2 = v1.clone()
+        v2.value.head = 'dog'
+        self.assertEqual('cat', v1.value.head.word)
+        cc1 = Coordination(Noun('cat'), Noun('dog'), conj='or')
+        cc2 = cc1.clone()
+        cc2.coords.append(Noun('mouse'))
+        cc2.conj['NUMBER'] = 'plural'
+        self.assertEqual(2, len(cc1))
+        self.assertEqual(3, len(cc2))
+        self.assertIsNone(cc1.conj['NUMBER'])
+        self.assertIs(cc2, cc2.coords[2].parent)
+
+    def test_clone_to_json(self):
+        c1 = self.get_clause()
+        c2 = c1.clone()
+        self.assertEqual(c1.to_json(), c2.to_json())
+        self.assertEqual(c1, Clause.from_json(c2.to_json()))
+
+
+class TestArgumentPaths(unittest.TestCase):
+
+    @staticmethod
+    def get_clause(front_modifiers=(Var('when'),)):
+        return Clause(NP(Var('det'), Var('subj')),
+                      VP(Var('verb'), NP('the', Var('obj')), Adverb('quickly')),
+                      front_modifiers=list(front_modifiers))
+
+    def test_argument_paths_order(self):
+        c = self.get_clause()
+        paths = c.argument_paths()
+        self.assertEqual(c.arguments(), [var for _, var in paths])
+        self.assertEqual((('_subject', None), ('_spec', None)), paths[1][0])
+        cc = Coordination(Var('a'), Var('b'), Var('c'), conj=Var('conj'))
+        self.assertEqual(cc.arguments(), [var for _, var in cc.argument_paths()])
+
+    def test_replace_at_matches_replace(self):
+        # Clause.replace() does not look into front modifiers
+        c1 = self.get_clause(front_modifiers=())
+        c2 = self.get_clause(front_modifiers=())
+        values = {'det': 'a', 'subj': Noun('child'), 'verb': Verb('put'), 'obj': Noun('piano')}
+        for arg in c1.arguments():
+            c1.replace(arg, values[arg.id])
+        for path, arg in reversed(c2.argument_paths()):
+            self.assertTrue(c2.replace_at(path, values[arg.id]))
+        self.assertEqual(c1, c2)
+        self.assertEqual(repr(c1), repr(c2))
+        self.assertEqual([], c2.arguments())
+
+    def test_replace_at_clone(self):
+        c1 = self.get_clause()
+        paths = c1.argument_paths()
+        c2 = c1.clone()
+        for path, arg in paths:
+            c2.replace_at(path, Noun(arg.id))
+        self.assertEqual(5, len(c1.arguments()))
+        self.assertEqual(0, len(c2.arguments()))
+
+    def test_replace_at_copies_path_only(self):
+        c1 = Clause(NP('the', 'child'), VP(Var('verb'), NP('the', 'piano')))
+        c2 = c1.clone()
+        (path, _), = c2.argument_paths()
+        c2.replace_at(path, Verb('play'))
+        self.assertEqual(Var('verb'), c1.predicate.head)
+        self.assertEqual(Verb('play'), c2.predicate.head)
+        # constituents off the path were not accessed so they are still shared
+        self.assertIs(c1._subject._head, c2._subject._head)
+        self.assertIs(c1._predicate._complements[0]._spec, c2._predicate._complements[0]._spec)
+
+    def test_replace_at_root(self):
+        v = Var('x')
+        self.assertEqual([((), v)], v.argument_paths())
+        self.assertFalse(v.replace_at((), Noun('x')))
+
+
+class TestTraversal(unittest.TestCase):
+
+    @staticmethod
+    def get_clause():
+        return Clause(NP('the', 'truck'), VP('move', Coordination(Var('x'), 'y')))
+
+    def test_orders(self):
+        c = self.get_clause()
+        names = lambda xs: [type(x).__name__ for x in xs if x.category != category.ELEMENT]
+        self.assertEqual(['Clause', 'NounPhrase', 'Word', 'Word', 'VerbPhrase', 'Word',
+                          'Coordination', 'Var', 'String', 'String'],
+                         names(traverse(c, PRE_ORDER)))
+        self.assertEqual(['Word', 'Word', 'NounPhrase', 'Word', 'Var', 'String', 'String',
+                          'Coordination', 'VerbPhrase', 'Clause'],
+                         names(traverse(c, POST_ORDER)))
+        self.assertEqual(list(c.elements(recursive=True)),
+                         [x for x in traverse(c, LEAVES) if x.category != category.ELEMENT])
+        self.assertEqual(list(c.elements(recursive=True, itself='first')), list(traverse(c)))
+        self.assertRaises(ValueError, traverse, c, 'in-order')
+
+    def test_prune(self):
+        c = self.get_clause()
+        leaves = list(traverse(c, LEAVES, prune={category.NOUN_PHRASE, category.COORDINATION}))
+        self.assertEqual(['NounPhrase', 'Word', 'Coordination'],
+                         [type(x).__name__ for x in leaves])
+
+    def test_element_list_is_not_yielded(self):
+        lst = ElementList(['a', 'b'])
+        self.assertEqual([String('a'), String('b')], list(traverse(lst)))
+
+    def test_deep_tree(self):
+        e = Noun('x')
+        for _ in range(5000):
+            e = PrepositionPhrase(Preposition('in'), e)
+        self.assertEqual(5001, len(list(e.elements(recursive=True))))
+        self.assertEqual(10001, len(list(traverse(e, POST_ORDER))))
+        self.assertEqual([], e.arguments())
+
+
+class TestSlots(unittest.TestCase):
+
+    def test_no_instance_dict(self):
+        np = NP('the', 'truck')
+        self.assertEqual({}, np.__dict__)
+        for e in np.elements(recursive=True, itself='first'):
+            self.assertNotIn('_head', e.__dict__)
+        np.annotation = 'x'
+        self.assertEqual('x', np.clone().annotation)
+        self.assertEqual('x', pickle.loads(pickle.dumps(np)).annotation)
+
+    def test_shared_empty_lists(self):
+        p1, p2 = VP('move'), VP('run')
+        self.assertIs(p1._complements, p2._complements)
+        self.assertEqual('move', str(p1))
+        self.assertIs(p1._complements, p2._complements)
+        p1.complements.append(NP('the', 'truck'))
+        self.assertIsNot(p1._complements, p2._complements)
+        self.assertEqual(0, len(p2.complements))
+        self.assertIs(p1, p1.complements.parent)
+        self.assertRaises(TypeError, p2._postmodifiers.append, Word('x'))
+
+    def test_shared_empty_lists_copy(self):
+        c = Clause(NP('the', 'truck'), VP('move'))
+        for cp in (deepcopy(c), c.clone(),
+                   pickle.loads(pickle.dumps(c)), Clause.from_json(c.to_json())):
+            self.assertEqual(c, cp)
+            cp.front_modifiers.append(Adverb('now'))
+            cp.predicate.complements.append(NP('it'))
+            self.assertEqual(0, len(c.front_modifiers))
+            self.assertEqual(0, len(c.predicate.complements))
+
+
+class TestElementIndex(unittest.TestCase):
+
+    @staticmethod
+    def get_coordination():
+        return Coordination(Clause(Var('x'), 'be', Var('y')),
+                            Clause(NP('the', 'truck', id='truck'), 'move', PP('to', Var('z'))))
+
+    def test_replace_argument(self):
+        c = self.get_coordination()
+        expected = self.get_coordination()
+        expected.replace_arguments(x='Tom', z='the depot')
+        index = ElementIndex(c)
+        self.assertTrue(index.replace_argument('x', 'Tom'))
+        self.assertTrue(index.replace_argument('z', 'the depot'))
+        self.assertFalse(index.replace_argument('x', 'Tom'))
+        self.assertFalse(index.replace_argument('w', 'Tom'))
+        self.assertEqual(expected, c)
+        self.assertEqual([Var('y')], c.arguments())
+
+    def test_replace_by_id(self):
+        c = self.get_coordination()
+        index = ElementIndex(c)
+        self.assertIn('truck', index)
+        self.assertEqual(('_coords', 1), index.path(index.get('truck'))[0])
+        self.assertTrue(index.replace('truck', NP('the', 'lorry', id='lorry')))
+        self.assertNotIn('truck', index)
+        self.assertEqual('lorry', c.coords[1].subject.id)
+        self.assertIs(c.coords[1].subject, index.get('lorry'))
+
+    def test_outdated_index(self):
+        c = self.get_coordination()
+        index = ElementIndex(c)
+        c.coords[0].subject = Var('w')
+        self.assertIsNone(index.path(Var('x')))
+        self.assertFalse(index.replace_argument('x', 'Tom'))
+        self.assertTrue(index.replace_argument('w', 'Tom'))
+        self.assertEqual(String('Tom'), c.coords[0].subject.head)
+
+    def test_replace_arguments(self):
+        c = Clause(Var('x'), 'see', Var('x'), front_modifiers=[Var('y')])
+        c.replace_arguments(x='Tom', y='yesterday')
+        self.assertEqual([Var('x')], c.arguments())
+        self.assertEqual('yesterday Tom see x', str(c))
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,166 @@
+import os
+import pickle
+import threading
+import time
+import unittest
+
+from concurrent.futures import ThreadPoolExecutor
+
+from nlglib.aggregation import SentenceAggregator
+from nlglib.lexicalisation import Lexicaliser
+from nlglib.macroplanning import expr, formula_to_rst, MsgSpec
+from nlglib.microplanning import Clause, NP, VP, Var
+from nlglib.pipeline import Pipeline, PipelineResult, StageError
+from nlglib.realisation.basic import Realiser
+
+
+def square(x):
+    return x * x
+
+
+def check(x):
+    if x % 5 == 3:
+        raise ValueError('bad input %d' % x)
+    return x
+
+
+def slow_down(x):
+    # later inputs finish sooner
+    time.sleep(0.01 * (10 - x) if x < 10 else 0)
+    return x
+
+
+def exit_process(x):
+    if x == 3:
+        os._exit(1)
+    return x
+
+
+class Greeting(MsgSpec):
+    def __init__(self, person):
+        super().__init__('greeting')
+        self.person = person
+
+    def arg_person(self):
+        return NP(self.person)
+
+
+templates = {
+    'greeting': Clause(Var('arg_person'), VP('say', 'hello')),
+    'Play': Clause(NP(Var(0)), VP('play', NP(Var(1)))),
+    'john': NP('John'),
+    'guitar': NP('a', 'guitar'),
+}
+
+
+class TestPipeline(unittest.TestCase):
+
+    def test_call(self):
+        pipeline = Pipeline(square, str)
+        self.assertEqual('9', pipeline(3))
+        self.assertEqual('<Pipeline square -> str>', repr(pipeline))
+        self.assertRaises(ValueError, Pipeline)
+        self.assertRaises(TypeError, Pipeline, square, 'str')
+
+    def test_generation(self):
+        pipeline = Pipeline(formula_to_rst, Lexicaliser(templates=templates),
+                            SentenceAggregator(), Realiser())
+        self.assertEqual('John play a guitar.', pipeline(expr('Play(john, guitar)')))
+
+    def test_serial(self):
+        results = list(Pipeline(square).run(range(5), executor=None))
+        self.assertEqual([PipelineResult(i, i, i * i, None) for i in range(5)], results)
+
+    def test_threads(self):
+        for chunksize in (1, 3, 100):
+            results = Pipeline(square).run(range(20), executor='thread', workers=3, chunksize=chunksize)
+            self.assertEqual([i * i for i in range(20)], [r.output for r in results])
+
+    def test_processes(self):
+        results = Pipeline(square).run(range(20), executor='process', workers=2, chunksize=3)
+        self.assertEqual([(i, i * i) for i in range(20)], [(r.index, r.output) for r in results])
+
+    def test_trees(self):
+        pipeline = Pipeline(Lexicaliser(templates=templates))
+        names = ['Boris', 'Sam', 'Nina']
+        for executor in ('process', 'thread', None):
+            results = list(pipeline.run([Greeting(n) for n in names], executor=executor,
+                                        workers=2, chunksize=2))
+            self.assertEqual(['%s say hello.' % n for n in names],
+                             [Realiser()(r.output) for r in results])
+            self.assertEqual(names, [r.input.person for r in results])
+
+    def test_unordered(self):
+        results = list(Pipeline(slow_down).run(range(10), executor='thread', workers=10,
+                                               ordered=False))
+        self.assertEqual(list(range(10)), sorted(r.index for r in results))
+        self.assertNotEqual(list(range(10)), [r.index for r in results])
+        for r in results:
+            self.assertEqual(r.index, r.output)
+
+    def test_errors(self):
+        for executor in ('process', 'thread', None):
+            results = list(Pipeline(check, square).run(range(10), executor=executor, chunksize=4))
+            self.assertEqual([0, 1, 4, None, 16, 25, 36, 49, None, 81], [r.output for r in results])
+            error = results[3].error
+            self.assertIsInstance(error, StageError)
+            self.assertEqual('check', error.stage)
+            self.assertEqual('ValueError', error.error_type)
+            self.assertEqual('check: ValueError: bad input 3', str(error))
+            self.assertIn('bad input 3', error.traceback)
+            self.assertEqual(2, sum(1 for r in results if r.error))
+
+    def test_error_pickle(self):
+        error = StageError('check', 'ValueError', 'bad input', 'Traceback')
+        rv = pickle.loads(pickle.dumps(error))
+        self.assertEqual((error.stage, error.error_type, error.message, error.traceback),
+                         (rv.stage, rv.error_type, rv.message, rv.traceback))
+
+    def test_broken_process(self):
+        for workers, chunksize, ordered in ((1, 2, True), (2, 2, True), (2, 3, False),
+                                            (3, 1, True)):
+            results = Pipeline(exit_process).run(range(12), executor='process', workers=workers,
+                                                 chunksize=chunksize, ordered=ordered)
+            results = sorted(results, key=lambda r: r.index)
+            # only the input that kills the worker fails
+            self.assertEqual([0, 1, 2, None, 4, 5, 6, 7, 8, 9, 10, 11],
+                             [r.output for r in results])
+            self.assertEqual([3], [r.index for r in results if r.error])
+            self.assertEqual('BrokenProcessPool', results[3].error.error_type)
+
+    def test_back_pressure(self):
+        consumed = []
+
+        def items():
+            for i in range(1000):
+                consumed.append(i)
+                yield i
+
+        results = Pipeline(square).run(items(), executor='thread', workers=2,
+                                       chunksize=5, max_pending=3)
+        self.assertEqual(0, next(results).output)
+        self.assertLessEqual(len(consumed), 3 * 5 + 1)
+        results.close()
+        self.assertLess(len(consumed), 1000)
+
+    def test_external_executor(self):
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            results = Pipeline(square).run(range(10), executor=pool, chunksize=3)
+            self.assertEqual([i * i for i in range(10)], [r.output for r in results])
+            # the pool is still usable
+            self.assertEqual(4, pool.submit(square, 2).result())
+
+    def test_worker_threads(self):
+        names = set()
+
+        def record(x):
+            names.add(threading.current_thread().name)
+            time.sleep(0.01)
+            return x
+
+        list(Pipeline(record).run(range(10), executor='thread', workers=2))
+        self.assertEqual(2, len(names))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,8 +1,11 @@
+import os
+import tempfile
 import unittest
 
 from nlglib.microplanning import *
 from nlglib.macroplanning import *
 from nlglib.realisation.basic import Realiser, RealisationVisitor
+from nlglib.realisation.cache import RealisationCache, DiskStore
 
 
 def get_clause():
@@ -236,6 +239,81 @@ class TestStringRealisation(unittest.TestCase):
         self.assertEqual(expected, actual)
 
 
+class TestRealisationCache(unittest.TestCase):
+
+    def test_realiser_uses_cache(self):
+        cache = RealisationCache()
+        realiser = Realiser(cache=cache)
+        self.assertEqual('You say hello.', realiser(get_clause()))
+        self.assertEqual('You say hello.', realiser(get_clause()))
+        self.assertEqual((1, 0, 1, 0, 1), tuple(cache.stats()))
+
+    def test_fingerprint(self):
+        self.assertEqual(get_clause().fingerprint(), get_clause().fingerprint())
+        c = get_clause()
+        c.id = 'some id'
+        self.assertEqual(get_clause().fingerprint(), c.fingerprint())
+        c.features['TENSE'] = 'PAST'
+        self.assertNotEqual(get_clause().fingerprint(), c.fingerprint())
+        self.assertNotEqual(Var('x').fingerprint(), Var('y').fingerprint())
+        self.assertNotEqual(String('x').fingerprint(), Word('x').fingerprint())
+
+    def test_conjunction_and_front_modifiers(self):
+        cache = RealisationCache()
+        realiser = Realiser(cache=cache)
+        self.assertEqual('Apples and pears.', realiser(Coordination('apples', 'pears')))
+        self.assertEqual('Apples or pears.', realiser(Coordination('apples', 'pears', conj='or')))
+        self.assertEqual(2, len(cache))
+        c = get_clause()
+        realiser(c)
+        c.front_modifiers.append(Adverb('today'))
+        self.assertNotEqual(cache.key(get_clause()), cache.key(c))
+        self.assertEqual('Today you say hello.', realiser(c))
+        self.assertEqual(4, len(cache))
+
+    def test_lru(self):
+        cache = RealisationCache(maxsize=2)
+        cache.put('a', 'A')
+        cache.put('b', 'B')
+        self.assertEqual('A', cache.get('a'))
+        cache.put('c', 'C')
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual('A', cache.get('a'))
+        self.assertEqual('C', cache.get('c'))
+        stats = cache.stats()
+        self.assertEqual((3, 1, 1, 2), (stats.hits, stats.misses, stats.evictions, stats.size))
+
+    def test_ttl(self):
+        now = [0]
+        cache = RealisationCache(ttl=10, timer=lambda: now[0])
+        cache.put('a', 'A')
+        now[0] = 5
+        self.assertEqual('A', cache.get('a'))
+        self.assertIn('a', cache)
+        now[0] = 10
+        self.assertNotIn('a', cache)
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(0, len(cache))
+
+    def test_store(self):
+        store = {}
+        cache = RealisationCache(maxsize=1, store=store)
+        cache.put('a', 'A')
+        cache.put('b', 'B')
+        self.assertEqual({'a': 'A', 'b': 'B'}, store)
+        self.assertEqual('A', cache.get('a'))
+        self.assertEqual(1, cache.stats().store_hits)
+
+    def test_disk_store(self):
+        path = os.path.join(tempfile.mkdtemp(), 'cache')
+        with DiskStore(path) as store:
+            RealisationCache(store=store).put('key', 'Realisation \u00e9.')
+        with DiskStore(path) as store:
+            cache = RealisationCache(store=store)
+            self.assertEqual('Realisation \u00e9.', cache.get('key'))
+            self.assertIsNone(cache.get('other'))
+
+
 # main
 if __name__ == '__main__':
     unittest.main()
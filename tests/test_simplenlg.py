@@ -1,7 +1,18 @@
 import logging
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
 import unittest
+import xml.etree.ElementTree as ET
 
+from nlglib import metrics
 from nlglib.microplanning import Clause, CC, PP
+from nlglib.macroplanning import Paragraph
+from nlglib.realisation.cache import RealisationCache
+from nlglib.realisation.simplenlg.realisation import Realiser
 import nlglib.realisation.simplenlg.client as snlg
 
 
@@ -116,6 +127,460 @@ class TestSimplenlgClient(unittest.TestCase):
         self.assertEqual(expected, actual)
 
 
+class EchoServer(threading.Thread):
+    """A local server using the SimpleNLG framing that replies
+    with the upper-cased request.
+
+    """
+
+    def __init__(self, close_after_request=False):
+        super().__init__(daemon=True)
+        self.close_after_request = close_after_request
+        self.listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.listener.bind(('127.0.0.1', 0))
+        self.listener.listen(16)
+        self.port = self.listener.getsockname()[1]
+        self.connections = 0
+
+    def run(self):
+        while True:
+            try:
+                conn, _ = self.listener.accept()
+            except OSError:
+                return
+            self.connections += 1
+            threading.Thread(target=self.serve, args=(conn,), daemon=True).start()
+
+    def serve(self, conn):
+        with conn:
+            while True:
+                header = conn.recv(4, socket.MSG_WAITALL)
+                if len(header) < 4:
+                    return
+                data = conn.recv(snlg.ntoh(header), socket.MSG_WAITALL)
+                reply = data.decode('utf-8').upper().encode('utf-8')
+                conn.sendall(snlg.hton(len(reply)) + reply)
+                if self.close_after_request:
+                    return
+
+    def stop(self):
+        self.listener.close()
+
+
+class TestConnectionPool(unittest.TestCase):
+
+    def setUp(self):
+        self.server = EchoServer()
+        self.server.start()
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_connections_are_reused(self):
+        client = snlg.SimplenlgClient('127.0.0.1', self.server.port)
+        for i in range(5):
+            self.assertEqual('REQUEST %d' % i, client.xml_request('request %d' % i))
+        self.assertEqual(1, self.server.connections)
+        client.close()
+
+    def test_non_ascii_request(self):
+        client = snlg.SimplenlgClient('127.0.0.1', self.server.port)
+        self.assertEqual('ŽLUŤOUČKÝ KŮŇ', client.xml_request('žluťoučký kůň'))
+        self.assertEqual('AND AGAIN', client.xml_request('and again'))
+
+    def test_concurrent_requests(self):
+        client = snlg.SimplenlgClient('127.0.0.1', self.server.port, pool_size=3)
+        results = {}
+
+        def work(n):
+            for i in range(20):
+                results[(n, i)] = client.xml_request('thread %d request %d' % (n, i))
+
+        threads = [threading.Thread(target=work, args=(n,)) for n in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(160, len(results))
+        for (n, i), result in results.items():
+            self.assertEqual('THREAD %d REQUEST %d' % (n, i), result)
+        self.assertLessEqual(self.server.connections, 3)
+
+    def test_reconnect(self):
+        self.server.close_after_request = True
+        client = snlg.SimplenlgClient('127.0.0.1', self.server.port)
+        for i in range(3):
+            self.assertEqual('REQUEST %d' % i, client.xml_request('request %d' % i))
+        self.assertEqual(3, self.server.connections)
+
+    def test_idle_timeout(self):
+        client = snlg.SimplenlgClient('127.0.0.1', self.server.port, idle_timeout=0)
+        client.xml_request('one')
+        client.xml_request('two')
+        self.assertEqual(2, self.server.connections)
+
+    def test_high_file_descriptor(self):
+        try:
+            import resource
+            if resource.getrlimit(resource.RLIMIT_NOFILE)[0] <= 1500:
+                self.skipTest('the limit of open files is too low')
+        except ImportError:
+            self.skipTest('no resource module')
+        sock = snlg.Socket('127.0.0.1', self.server.port)
+        sock.connect()
+        # select.select() cannot handle descriptors above 1023
+        fd = os.dup2(sock.socket.fileno(), 1500)
+        sock.socket.close()
+        sock.socket = socket.socket(fileno=fd)
+        try:
+            self.assertTrue(sock.is_alive())
+            sock.send_string('still here')
+            self.assertEqual('STILL HERE', sock.recv_string())
+        finally:
+            sock.close()
+
+    def test_deprecated_socket(self):
+        client = snlg.SimplenlgClient('127.0.0.1', self.server.port)
+        with self.assertWarns(DeprecationWarning):
+            sock = client.socket
+        with sock:
+            sock.send_string('old api')
+            self.assertEqual('OLD API', sock.recv_string())
+
+    def test_acquire_timeout(self):
+        pool = snlg.ConnectionPool('127.0.0.1', self.server.port, size=1)
+        sock = pool.acquire()
+        self.assertRaises(snlg.ServerError, pool.acquire, timeout=0.01)
+        pool.release(sock)
+        self.assertIs(sock, pool.acquire(timeout=0.01))
+
+
+# a python script standing in for the SimpleNLG jar; replies with "<port>:<REQUEST>"
+fake_server_script = """\
+import socket, struct, sys, threading
+
+port = int(sys.argv[1])
+listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+listener.bind(('127.0.0.1', port))
+listener.listen(16)
+
+def serve(conn):
+    with conn:
+        while True:
+            header = conn.recv(4, socket.MSG_WAITALL)
+            if len(header) < 4:
+                return
+            data = conn.recv(struct.unpack('!I', header)[0], socket.MSG_WAITALL)
+            reply = ('%d:' % port + data.decode('utf-8').upper()).encode('utf-8')
+            conn.sendall(struct.pack('!I', len(reply)) + reply)
+
+def accept():
+    while True:
+        conn, _ = listener.accept()
+        threading.Thread(target=serve, args=(conn,), daemon=True).start()
+
+threading.Thread(target=accept, daemon=True).start()
+sys.stdin.readline()
+"""
+
+
+class FakeServer(snlg.SimpleNLGServer):
+
+    def command(self):
+        return [sys.executable, self.jar_path, self.port]
+
+
+class TestSimpleNLGServerPool(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        fd, cls.jar_path = tempfile.mkstemp(suffix='.py')
+        with os.fdopen(fd, 'w') as f:
+            f.write(fake_server_script)
+
+    @classmethod
+    def tearDownClass(cls):
+        os.remove(cls.jar_path)
+
+    def get_pool(self, **kwargs):
+        kwargs.setdefault('monitor_interval', None)
+        kwargs.setdefault('server_factory', FakeServer)
+        return snlg.SimpleNLGServerPool(self.jar_path, host='127.0.0.1', **kwargs)
+
+    def test_requests_are_balanced(self):
+        with self.get_pool(size=3) as pool:
+            results = []
+
+            def work():
+                for i in range(10):
+                    results.append(pool.xml_request('request %d' % i))
+
+            threads = [threading.Thread(target=work) for _ in range(6)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+        self.assertEqual(60, len(results))
+        used_ports = {int(r.split(':')[0]) for r in results}
+        self.assertTrue(used_ports <= set(pool.ports))
+        self.assertGreater(len(used_ports), 1)
+        self.assertTrue(all(r.split(':')[1].startswith('REQUEST') for r in results))
+
+    def test_consecutive_ports(self):
+        port = snlg.free_ports(1)[0]
+        pool = self.get_pool(size=2, port=port)
+        self.assertEqual([port, port + 1], pool.ports)
+
+    def test_crashed_server_is_restarted(self):
+        with self.get_pool(size=2) as pool:
+            crashed = pool.members[0]
+            crashed.server.process.kill()
+            crashed.server.process.wait()
+            for i in range(4):
+                self.assertTrue(pool.xml_request('x').endswith(':X'))
+            pool.check()
+            self.assertFalse(crashed.server.has_exited())
+            self.assertTrue(snlg.port_is_open('127.0.0.1', crashed.port))
+
+    def test_request_waits_for_restarted_server(self):
+        with self.get_pool(size=1) as pool:
+            member = pool.members[0]
+            member.server.process.kill()
+            member.server.process.wait()
+            self.assertRaises((OSError, RuntimeError), pool.xml_request, 'x')
+            # the server is restarted in the background and the request waits for it
+            self.assertEqual('%d:X' % member.port, pool.xml_request('x'))
+
+    def test_failed_restart_uses_other_servers(self):
+        servers = []
+
+        def factory(jar_path, port, **kwargs):
+            server = FakeServer(jar_path, port, **kwargs)
+            if len(servers) >= 2:
+                server.command = lambda: [sys.executable, '-c', 'pass']
+            servers.append(server)
+            return server
+
+        with self.get_pool(size=2, server_factory=factory, startup_timeout=2) as pool:
+            crashed, healthy = pool.members
+            crashed.server.process.kill()
+            crashed.server.process.wait()
+            for i in range(6):
+                self.assertEqual('%d:X' % healthy.port, pool.xml_request('x'))
+            self.assertFalse(crashed.ready)
+
+    def test_monitor_restarts_server(self):
+        with self.get_pool(size=1, monitor_interval=0.05) as pool:
+            member = pool.members[0]
+            old_server = member.server
+            old_server.process.kill()
+            deadline = time.monotonic() + 10
+            while member.server is old_server or not member.ready:
+                self.assertLess(time.monotonic(), deadline)
+                time.sleep(0.05)
+            self.assertEqual('%d:X' % member.port, pool.xml_request('x'))
+
+    def test_realiser_with_pool(self):
+        with self.get_pool(size=2) as pool:
+            realiser = Realiser(client=pool)
+            result = realiser(Clause('x', 'equal', 'y'))
+        self.assertIn('XSI:TYPE="SPHRASESPEC"', result)
+
+
+class TestServerStartup(unittest.TestCase):
+
+    def get_server(self, code, **kwargs):
+        server = FakeServer(sys.executable, snlg.free_ports(1)[0], host='127.0.0.1', **kwargs)
+        server.command = lambda: [sys.executable, '-c', code]
+        return server
+
+    def test_exited_server_raises(self):
+        server = self.get_server('import sys; sys.exit(3)')
+        started = time.monotonic()
+        with self.assertRaises(snlg.ServerError):
+            server.start()
+        self.assertLess(time.monotonic() - started, 5)
+        self.assertIsNone(server.startup_time)
+
+    def test_port_in_use(self):
+        other = EchoServer()
+        other.start()
+        try:
+            server = self.get_server('import sys; sys.exit(1)')
+            server.port = str(other.port)
+            with self.assertRaises(snlg.ServerError):
+                server.start()
+            self.assertIsNone(server.process)
+            self.assertIsNone(server.startup_time)
+        finally:
+            other.stop()
+
+    def test_startup_timeout(self):
+        server = self.get_server('import time; time.sleep(30)', startup_timeout=0.2)
+        with self.assertRaises(snlg.ServerError):
+            server.start()
+        server.join(5)
+        self.assertFalse(server.is_alive())
+        self.assertIsNotNone(server.process.poll())
+
+    def test_startup_time(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.py', delete=False) as f:
+            f.write(fake_server_script)
+        try:
+            server = FakeServer(f.name, snlg.free_ports(1)[0], host='127.0.0.1')
+            with metrics.recording() as sink:
+                server.start()
+            try:
+                self.assertTrue(server.is_ready())
+                self.assertLess(server.startup_time, 1)
+                timing = sink.timings['SimpleNLGServer.startup']
+                self.assertEqual(1, timing.calls)
+                self.assertEqual(server.startup_time, timing.seconds)
+                self.assertTrue(snlg.port_is_open('127.0.0.1', server.port))
+            finally:
+                server.shutdown()
+        finally:
+            os.remove(f.name)
+
+
+class FakeClient:
+    """A client that realises each paragraph of a request as
+    'Sentence <number of words> , done.' without connecting to a server.
+    Canned text is capitalised and ended by a full stop like SimpleNLG does.
+
+    """
+
+    def __init__(self, fail_batches=False, separator='\n\n'):
+        self.fail_batches = fail_batches
+        self.separator = separator
+        self.requests = []
+
+    def xml_request(self, data):
+        root = ET.fromstring(data)  # the request has to be a valid xml
+        self.requests.append(data)
+        document = root.find('{*}Request/{*}Document')
+        paragraphs = document.findall('{*}child') if document.get('cat') == 'DOCUMENT' else [document]
+        if len(paragraphs) > 1 and self.fail_batches:
+            raise snlg.ServerError('Exception: XML unmarshal error')
+        results = []
+        for p in paragraphs:
+            words = p.findall('.//{*}base')
+            if len(words) == 1 and words[0].text.startswith('nlglibbatch'):
+                results.append(words[0].text.capitalize() + '.')
+            else:
+                results.append('Sentence {} , done.'.format(len(words)))
+        return self.separator.join(results)
+
+
+class ReplayClient:
+    """A client that returns the given replies in order. """
+
+    def __init__(self, *replies):
+        self.replies = list(replies)
+        self.requests = []
+
+    def xml_request(self, data):
+        self.requests.append(data)
+        return self.replies.pop(0)
+
+
+class TestBatchRealisation(unittest.TestCase):
+
+    @staticmethod
+    def get_clauses():
+        return [Clause('x', 'equal', 'y'), Clause('p', 'be', PP('at', 'location x')),
+                Clause(), Clause('it', 'rain')]
+
+    def test_realise_many(self):
+        client = FakeClient()
+        realiser = Realiser(client=client)
+        expected = ['Sentence 3, done.', 'Sentence 4, done.', '', 'Sentence 2, done.']
+        self.assertEqual(expected, realiser.realise_many(self.get_clauses()))
+        self.assertEqual(1, len(client.requests))
+
+    def test_batch_size(self):
+        client = FakeClient()
+        realiser = Realiser(client=client, batch_size=2)
+        expected = ['Sentence 3, done.', 'Sentence 4, done.', '', 'Sentence 2, done.']
+        self.assertEqual(expected, realiser.realise_many(self.get_clauses()))
+        self.assertEqual(2, len(client.requests))
+
+    def test_fallback_on_error(self):
+        client = FakeClient(fail_batches=True)
+        realiser = Realiser(client=client)
+        expected = ['Sentence 3, done.', 'Sentence 4, done.', '', 'Sentence 2, done.']
+        self.assertEqual(expected, realiser.realise_many(self.get_clauses()))
+        self.assertEqual(4, len(client.requests))
+
+    def test_fallback_on_unexpected_reply(self):
+        client = FakeClient(separator=' ')
+        realiser = Realiser(client=client)
+        expected = ['Sentence 3, done.', 'Sentence 4, done.', '', 'Sentence 2, done.']
+        self.assertEqual(expected, realiser.realise_many(self.get_clauses()))
+        self.assertEqual(4, len(client.requests))
+
+    def test_recorded_reply(self):
+        # a reply with an empty realisation and one with a blank line
+        client = ReplayClient('It rains , today.\n\nNlglibbatch0.\n\n\n\nNlglibbatch1.\n\n'
+                              'Title\n\nText.\n\nNlglibbatch2.\n\n')
+        realiser = Realiser(client=client)
+        self.assertEqual(['It rains, today.', '', 'Title\n\nText.'],
+                         realiser.realise_many(self.get_clauses()[:2] + [Clause('it', 'rain')]))
+        self.assertEqual(1, len(client.requests))
+
+    def test_fallback_on_misaligned_reply(self):
+        client = ReplayClient('Sentence 3.\n\nNlglibbatch1.\n\nSentence 4.\n\nNlglibbatch0.',
+                              'A.', 'B.')
+        realiser = Realiser(client=client)
+        self.assertEqual(['A.', 'B.'], realiser.realise_many(self.get_clauses()[:2]))
+        self.assertEqual(3, len(client.requests))
+
+    def test_single_and_batch_results_agree(self):
+        clauses = [Clause('x', 'equal', 'y'), Clause('it', 'rain')]
+        single = Realiser(client=ReplayClient(' It rains.\n\n', ' It rains.\n\n'),
+                          batch_size=1).realise_many(clauses)
+        self.assertEqual(['It rains.', 'It rains.'], single)
+        client = ReplayClient(' It rains.\n\nnlglibbatch0\n\n It rains.\n\nNlglibbatch1.\n\n')
+        self.assertEqual(single, Realiser(client=client).realise_many(clauses))
+
+    def test_fallback_keeps_arguments(self):
+        calls = []
+
+        class RecordingRealiser(Realiser):
+            def element(self, elt, **kwargs):
+                calls.append(kwargs)
+                return super().element(elt, **kwargs)
+
+        for client, batch_size in ((FakeClient(fail_batches=True), 100),
+                                   (FakeClient(separator=' '), 100),
+                                   (FakeClient(), 1)):
+            del calls[:]
+            realiser = RecordingRealiser(client=client, batch_size=batch_size)
+            realiser.realise_many(self.get_clauses(), style='formal')
+            self.assertEqual([{'style': 'formal'}] * 3, calls)
+
+    def test_paragraph(self):
+        client = FakeClient()
+        realiser = Realiser(client=client)
+        para = Paragraph(*self.get_clauses())
+        expected = Paragraph('Sentence 3, done.', 'Sentence 4, done.', '', 'Sentence 2, done.')
+        self.assertEqual(expected, realiser(para))
+        self.assertEqual(1, len(client.requests))
+
+    def test_cache(self):
+        client = FakeClient()
+        realiser = Realiser(client=client, cache=RealisationCache())
+        clauses = self.get_clauses() + self.get_clauses()
+        expected = ['Sentence 3, done.', 'Sentence 4, done.', '', 'Sentence 2, done.'] * 2
+        self.assertEqual(expected, realiser.realise_many(clauses))
+        self.assertEqual(1, len(client.requests))
+        self.assertEqual(3, client.requests[0].count('SPhraseSpec'))
+        self.assertEqual(expected, realiser.realise_many(clauses))
+        self.assertEqual('Sentence 3, done.', realiser(Clause('x', 'equal', 'y')))
+        self.assertEqual(1, len(client.requests))
+
+
 test_data = """\
 <?xml version="1.0" encoding="utf-8"?>
 <nlg:NLGSpec xmlns="http://simplenlg.googlecode.com/svn/trunk/res/xml"
@@ -0,0 +1,154 @@
+import asyncio
+import unittest
+
+from nlglib.microplanning import Clause, PP
+from nlglib.macroplanning import Document, Paragraph
+from nlglib.realisation.simplenlg.client import ServerError, hton, ntoh
+from nlglib.realisation.simplenlg.aio import AsyncSimplenlgClient, AsyncRealiser
+
+
+class LocalServer:
+    """An asyncio server using the SimpleNLG framing.
+
+    The reply is computed by `respond` (upper-case request by default).
+    A request starting with 'sleep' is answered after a delay
+    and a request 'close' closes the connection.
+
+    """
+
+    def __init__(self, respond=str.upper):
+        self.respond = respond
+        self.connections = 0
+        self.requests = []
+        self.handlers = []
+        self.server = None
+        self.port = None
+
+    async def start(self):
+        self.server = await asyncio.start_server(self.serve, '127.0.0.1', 0)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+        # the handlers finish when the clients close the connections
+        await asyncio.wait_for(asyncio.gather(*self.handlers), 1)
+
+    async def serve(self, reader, writer):
+        self.connections += 1
+        self.handlers.append(asyncio.current_task())
+        try:
+            while True:
+                length = ntoh(await reader.readexactly(4))
+                data = (await reader.readexactly(length)).decode('utf-8')
+                self.requests.append(data)
+                if data == 'close':
+                    break
+                if data.startswith('sleep'):
+                    await asyncio.sleep(0.2)
+                reply = self.respond(data).encode('utf-8')
+                writer.write(hton(len(reply)) + reply)
+                await writer.drain()
+        except asyncio.IncompleteReadError:
+            pass
+        writer.close()
+
+
+def run(coroutine):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+class TestAsyncClient(unittest.TestCase):
+
+    def test_pipelined_requests(self):
+        async def test():
+            server = LocalServer()
+            await server.start()
+            async with AsyncSimplenlgClient('127.0.0.1', server.port, connections=2) as client:
+                requests = ['request %d' % i for i in range(50)]
+                results = await asyncio.gather(*[client.xml_request(r) for r in requests])
+            await server.stop()
+            return server, requests, results
+
+        server, requests, results = run(test())
+        self.assertEqual([r.upper() for r in requests], results)
+        self.assertLessEqual(server.connections, 2)
+
+    def test_timeout_keeps_order(self):
+        async def test():
+            server = LocalServer()
+            await server.start()
+            async with AsyncSimplenlgClient('127.0.0.1', server.port, connections=1) as client:
+                with self.assertRaises(asyncio.TimeoutError):
+                    await client.xml_request('sleep', timeout=0.05)
+                # the late reply to the first request must not be returned here
+                result = await client.xml_request('after')
+            await server.stop()
+            return result
+
+        self.assertEqual('AFTER', run(test()))
+
+    def test_reconnect(self):
+        async def test():
+            server = LocalServer()
+            await server.start()
+            async with AsyncSimplenlgClient('127.0.0.1', server.port, connections=1) as client:
+                first = await client.xml_request('first')
+                with self.assertRaises(RuntimeError):
+                    await client.xml_request('close', timeout=1)
+                second = await client.xml_request('second')
+            await server.stop()
+            return server, first, second
+
+        server, first, second = run(test())
+        self.assertEqual(('FIRST', 'SECOND'), (first, second))
+        self.assertEqual(3, server.connections)
+
+    def test_server_error(self):
+        async def test():
+            server = LocalServer(respond=lambda _: 'Exception: XML unmarshal error')
+            await server.start()
+            try:
+                async with AsyncSimplenlgClient('127.0.0.1', server.port) as client:
+                    await client.xml_request('<broken>')
+            finally:
+                await server.stop()
+
+        self.assertRaises(ServerError, run, test())
+
+
+class TestAsyncRealiser(unittest.TestCase):
+
+    @staticmethod
+    def respond(xml):
+        return 'Sentence {} , done.'.format(xml.count('<base>'))
+
+    def test_realise_document(self):
+        async def test():
+            server = LocalServer(self.respond)
+            await server.start()
+            realiser = AsyncRealiser(host='127.0.0.1', port=server.port, connections=2)
+            doc = Document(
+                Clause('title'),
+                Paragraph(Clause('x', 'equal', 'y'), Clause('p', 'be', PP('at', 'location x'))),
+                Paragraph(Clause(), Clause('it', 'rain')),
+            )
+            result = await realiser(doc)
+            await realiser.client.close()
+            await server.stop()
+            return result
+
+        expected = Document(
+            'Sentence 1, done',
+            Paragraph('Sentence 3, done.', 'Sentence 4, done.'),
+            Paragraph('', 'Sentence 2, done.'),
+        )
+        self.assertEqual(expected, run(test()))
+
+
+if __name__ == '__main__':
+    unittest.main()